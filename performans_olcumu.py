@@ -0,0 +1,240 @@
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+import xml_olusturucu as xo
+
+# =========================================================================
+# SENTETİK İŞ YÜKÜ İLE PERFORMANS ÖLÇÜMÜ
+# =========================================================================
+# Gerçek sayım dosyalarına benzeyen sentetik Excel'ler üretir ve hattın üç fazını
+# (okuma, hesaplama, XML yazma) ayrı ayrı ölçer. Sonuçlar JSON olarak yazılır ve
+# isteğe bağlı olarak kayıtlı bir temel (baseline) ölçümle karşılaştırılır.
+#
+# Örnek:
+#   python performans_olcumu.py --satir 5000 --sayfa 12 --hastane 4 --cikti olcum.json
+#   python performans_olcumu.py --baseline olcum_temel.json --tolerans 0.25
+
+IHTIYAC_SUTUNLARI = [
+    "2 AYLIK İHTİYAÇ MİKTARI (TEST)",
+    "2,5 AYLIK İHTİYAÇ MİKTARI (TEST)",
+    "3 AYLIK İHTİYAÇ MİKTARI (TEST)",
+]
+
+FAZLAR = ("okuma", "hesaplama", "xml")
+
+
+def _test_adlari():
+    """Sentetik satırlarda kullanılacak test adları: STOK_MAP anahtarları, eşleştirme adları ve birkaç eşleşmeyen ad."""
+    adlar = set(xo.STOK_MAP)
+    for config in xo.HASTANE_CONFIGS:
+        adlar.update(xo.kit_eslestirmelerini_birlestir(config))
+    return sorted(adlar) + ["Tanımsız Test", "Hemogram", "Sedimantasyon"]
+
+
+def sentetik_excel_olustur(yol, sheet_prefix, satir_sayisi, sayfa_sayisi, rastgele):
+    """
+    Gerçek sayım dosyası biçiminde bir Excel oluşturur: her ay için "{prefix} {AY} SAYIM" sayfası,
+    TEST ADI sütunu ve üç ihtiyaç sütunu. Bazı ihtiyaç hücreleri boş, sıfır veya negatif bırakılır.
+    """
+    adlar = _test_adlari()
+    aylar = [xo.TURKISH_MONTHS[(i % 12) + 1] for i in range(sayfa_sayisi)]
+
+    # write_only modu <dimension> etiketi yazmaz ve okuyucuyu gerçek dosyalardan daha yavaş gösterir;
+    # Excel'in kaydettiği dosyalara benzemesi için normal mod kullanılır.
+    wb = Workbook()
+    wb.remove(wb.active)
+    for i, ay in enumerate(aylar):
+        # 12'den fazla sayfa istenirse ay adları yıl ekiyle tekrarlanır
+        ad = f"{sheet_prefix} {ay} SAYIM" if i < 12 else f"{sheet_prefix} {ay} SAYIM {i // 12}"
+        ws = wb.create_sheet(ad)
+        ws.append(["SIRA", xo.TEST_ADI_SUTUNU, "MEVCUT STOK (TEST)"] + IHTIYAC_SUTUNLARI)
+        for sira in range(1, satir_sayisi + 1):
+            ihtiyaclar = []
+            for _ in IHTIYAC_SUTUNLARI:
+                zar = rastgele.random()
+                if zar < 0.05:
+                    ihtiyaclar.append(None)
+                elif zar < 0.08:
+                    ihtiyaclar.append(0)
+                elif zar < 0.10:
+                    ihtiyaclar.append(-rastgele.randint(1, 50))
+                else:
+                    ihtiyaclar.append(rastgele.randint(1, 6000))
+            ws.append([sira, rastgele.choice(adlar), rastgele.randint(0, 5000)] + ihtiyaclar)
+    wb.save(yol)
+    return aylar
+
+
+def sentetik_hastaneler(klasor, hastane_sayisi, satir_sayisi, sayfa_sayisi, tohum):
+    """HASTANE_CONFIGS'ten türetilmiş, girdi yolu sentetik Excel'lere yönlendirilmiş konfigürasyonlar üretir."""
+    rastgele = random.Random(tohum)
+    configs = []
+    for i in range(hastane_sayisi):
+        config = dict(xo.HASTANE_CONFIGS[i % len(xo.HASTANE_CONFIGS)])
+        config["output_prefix"] = f"{config['output_prefix']}_{i}"
+        config["input_path"] = os.path.join(klasor, f"sentetik_{i}.xlsx")
+        aylar = sentetik_excel_olustur(config["input_path"], config["sheet_prefix"],
+                                       satir_sayisi, sayfa_sayisi, rastgele)
+        config["override_month_name"] = aylar[-1]
+        configs.append(config)
+    return configs
+
+
+def _sure(fonksiyon):
+    """Fonksiyonu çalıştırır; (sonuç, geçen süre saniye) döndürür."""
+    baslangic = time.perf_counter()
+    sonuc = fonksiyon()
+    return sonuc, time.perf_counter() - baslangic
+
+
+def olc(configs, klasor, tekrar):
+    """
+    Her hastane için okuma, hesaplama ve XML yazma fazlarını ölçer.
+    Her faz için tekrarların en iyisi alınır (gürültüyü azaltmak için).
+    """
+    toplam = {faz: 0.0 for faz in FAZLAR}
+    satir_sayisi = 0
+    eslesen_satir = 0
+    yazilan_bayt = 0
+
+    for config in configs:
+        sayfa_adi, _ = xo.get_dynamic_sheet_name(config["sheet_prefix"], config["override_month_name"])
+        kit_tablosu = xo.hastane_kit_tablosu(config)
+        cikti_yolu = os.path.join(klasor, f"{config['output_prefix']}.xml")
+
+        en_iyi = {faz: float("inf") for faz in FAZLAR}
+        for _ in range(tekrar):
+            satirlar, sure = _sure(lambda: list(
+                xo.excel_satirlarini_oku(config["input_path"], sayfa_adi, config["ihtiyac_sutunu"])))
+            en_iyi["okuma"] = min(en_iyi["okuma"], sure)
+
+            lines, sure = _sure(lambda: xo.xml_satirlarina_cevir(
+                xo.siparis_satirlarini_hesapla(satirlar, kit_tablosu, config["apply_min_roundup"])))
+            en_iyi["hesaplama"] = min(en_iyi["hesaplama"], sure)
+
+            bayt, sure = _sure(lambda: xo.xml_dosyasina_yaz(
+                cikti_yolu, lines, config["cari_id"], config["CARI_ADI"]))
+            en_iyi["xml"] = min(en_iyi["xml"], sure)
+
+        for faz in FAZLAR:
+            toplam[faz] += en_iyi[faz]
+        satir_sayisi += len(satirlar)
+        eslesen_satir += len(lines)
+        yazilan_bayt += bayt
+
+    fazlar = {}
+    for faz in FAZLAR:
+        # Okuma ve hesaplama taranan satıra, XML yazma ise üretilen satıra göre ölçeklenir
+        birim = eslesen_satir if faz == "xml" else satir_sayisi
+        fazlar[faz] = {
+            "sure_s": round(toplam[faz], 6),
+            "ns_per_satir": round(toplam[faz] / max(birim, 1) * 1e9, 1),
+            "satir_per_s": round(birim / toplam[faz], 1) if toplam[faz] > 0 else None,
+        }
+
+    return {
+        "fazlar": fazlar,
+        "taranan_satir": satir_sayisi,
+        "eslesen_satir": eslesen_satir,
+        "yazilan_bayt": yazilan_bayt,
+    }
+
+
+def baseline_karsilastir(sonuc, baseline, tolerans):
+    """
+    Her fazın satır başına süresini baseline ile karşılaştırır.
+    (1 + tolerans) katından yavaş olan fazların listesini döndürür.
+    """
+    gerilemeler = []
+    for faz in FAZLAR:
+        once = baseline.get("fazlar", {}).get(faz, {}).get("ns_per_satir")
+        simdi = sonuc["fazlar"][faz]["ns_per_satir"]
+        if not once:
+            continue
+        oran = simdi / once
+        sonuc["fazlar"][faz]["baseline_orani"] = round(oran, 3)
+        if oran > 1 + tolerans:
+            gerilemeler.append(f"{faz}: {once:.0f} ns/satır -> {simdi:.0f} ns/satır (x{oran:.2f})")
+    return gerilemeler
+
+
+def argumanlari_oku(argv=None):
+    parser = argparse.ArgumentParser(description="Sentetik iş yüküyle okuma/hesaplama/XML fazlarının performans ölçümü.")
+    parser.add_argument("--satir", type=int, default=2000, help="Sayfa başına satır sayısı.")
+    parser.add_argument("--sayfa", type=int, default=12, help="Excel başına aylık sayfa sayısı.")
+    parser.add_argument("--hastane", type=int, default=3, help="Sentetik hastane (Excel) sayısı.")
+    parser.add_argument("--tekrar", type=int, default=3, help="Her faz için tekrar sayısı (en iyisi alınır).")
+    parser.add_argument("--tohum", type=int, default=2025, help="Rastgele veri tohumu (tekrarlanabilirlik için).")
+    parser.add_argument("--cikti", default="performans_sonuclari.json", help="Sonuçların yazılacağı JSON dosyası.")
+    parser.add_argument("--baseline", help="Karşılaştırılacak önceki ölçüm (JSON).")
+    parser.add_argument("--tolerans", type=float, default=0.25,
+                        help="Baseline'a göre izin verilen yavaşlama oranı (0.25 = %%25).")
+    parser.add_argument("--baseline-kaydet", action="store_true",
+                        help="Sonucu --baseline ile verilen dosyaya yeni temel ölçüm olarak yazar.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = argumanlari_oku(argv)
+
+    with tempfile.TemporaryDirectory(prefix="xml_performans_") as klasor:
+        print(f"[INFO] Sentetik Excel'ler oluşturuluyor: {args.hastane} hastane x {args.sayfa} sayfa x {args.satir} satır")
+        configs = sentetik_hastaneler(klasor, args.hastane, args.satir, args.sayfa, args.tohum)
+
+        print("[INFO] Ölçüm yapılıyor...")
+        # Fazların kendi içindeki hastane bazlı bilgi mesajları ölçüme karışmasın
+        with open(os.devnull, 'w', encoding='utf-8') as bos, contextlib.redirect_stdout(bos):
+            olcum = olc(configs, klasor, args.tekrar)
+
+    sonuc = {
+        "zaman": datetime.datetime.now().isoformat(timespec="seconds"),
+        "parametreler": {"satir": args.satir, "sayfa": args.sayfa, "hastane": args.hastane,
+                         "tekrar": args.tekrar, "tohum": args.tohum},
+        "ortam": {"python": platform.python_version(), "pandas": pd.__version__,
+                  "numpy": np.__version__, "platform": platform.platform()},
+        **olcum,
+    }
+
+    gerilemeler = []
+    if args.baseline and not args.baseline_kaydet:
+        try:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                gerilemeler = baseline_karsilastir(sonuc, json.load(f), args.tolerans)
+        except (OSError, ValueError) as e:
+            print(f"UYARI: Baseline okunamadı: {e}")
+
+    for faz, degerler in sonuc["fazlar"].items():
+        print(f"  {faz:<10} {degerler['sure_s']:>9.3f} s   {degerler['ns_per_satir']:>10.0f} ns/satır"
+              + (f"   (baseline x{degerler['baseline_orani']})" if "baseline_orani" in degerler else ""))
+
+    with open(args.cikti, 'w', encoding='utf-8') as f:
+        json.dump(sonuc, f, ensure_ascii=False, indent=2)
+    print(f"[INFO] Sonuçlar yazıldı: {args.cikti}")
+
+    if args.baseline and args.baseline_kaydet:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(sonuc, f, ensure_ascii=False, indent=2)
+        print(f"[INFO] Yeni baseline kaydedildi: {args.baseline}")
+
+    if gerilemeler:
+        print("[GERİLEME] Baseline'a göre yavaşlayan fazlar:")
+        for satir in gerilemeler:
+            print(f"  - {satir}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+import os
+import sys
+
+import pytest
+
+# Betikler paket değildir; testler depo kökündeki modülleri doğrudan içe aktarır.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import xml_olusturucu as xo  # noqa: E402
+
+IHTIYAC_SUTUNU = "3 AYLIK İHTİYAÇ MİKTARI (TEST)"
+
+
+@pytest.fixture(autouse=True)
+def dogrudan_gunluk():
+    """Testler GUNLUK çıktısını capsys ile okur; günlük, alt komutlardaki gibi doğrudan stdout'a yazar."""
+    xo.gunlugu_ayarla(dogrudan=True)
+
+
+@pytest.fixture
+def calisma_dizini(tmp_path, monkeypatch):
+    """
+    Testi geçici bir çalışma dizininde çalıştırır: XML_Ciktilar (manifest, içerik deposu, talep geçmişi)
+    ve önbellek oraya yazılır. Yeni bir çalıştırma klasörü açılır; çalışma ayarları test sonunda geri alınır.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(xo, "CALISMA_AYARLARI", dict(xo.CALISMA_AYARLARI))
+    monkeypatch.setattr(xo, "CALISMA_ZAMANI", None)
+    monkeypatch.setattr(xo, "TUM_CIKTILAR_YOLU", None)
+    monkeypatch.setattr(xo, "_OKUNMUS_AY_SAYFALARI", {})
+    xo.yeni_calisma_klasoru()
+    os.makedirs(xo.TUM_CIKTILAR_YOLU)
+    return tmp_path
+
+
+@pytest.fixture
+def sayim_exceli(tmp_path):
+    """{sayfa adı: [(test_adi, ihtiyac), ...]} içeriğiyle bir sayım Excel'i yazan fabrika; yolu döndürür."""
+    from openpyxl import Workbook
+
+    def yaz(ad, sayfalar, sutun=IHTIYAC_SUTUNU, mtime_ns=None):
+        wb = Workbook()
+        wb.remove(wb.active)
+        for sayfa_adi, satirlar in sayfalar.items():
+            ws = wb.create_sheet(sayfa_adi)
+            ws.append(["SIRA", xo.TEST_ADI_SUTUNU, sutun])
+            for sira, (test_adi, ihtiyac) in enumerate(satirlar, 1):
+                ws.append([sira, test_adi, ihtiyac])
+        yol = str(tmp_path / ad)
+        wb.save(yol)
+        if mtime_ns is not None:
+            os.utime(yol, ns=(mtime_ns, mtime_ns))
+        return yol
+
+    return yaz
+
+
+@pytest.fixture
+def deneme_configi():
+    """Verilen Excel için HASTANE_CONFIGS biçiminde bir hastane konfigürasyonu üreten fabrika."""
+
+    def uret(input_path, onek, ay="EKİM", **ek):
+        config = {
+            "CARI_ADI": f"{onek.upper()} DENEME HASTANESİ",
+            "input_path": input_path,
+            "output_prefix": f"{onek}_islenmis_veri",
+            "cari_id": onek.upper(),
+            "sheet_prefix": onek.upper(),
+            "override_month_name": ay,
+            "ihtiyac_sutunu": IHTIYAC_SUTUNU,
+            "apply_min_roundup": True,
+            "kit_eslestirme": [{"Alanin aminotransferaz (ALT)": "ALT_1200"}],
+        }
+        config.update(ek)
+        return config
+
+    return uret
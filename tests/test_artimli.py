@@ -0,0 +1,110 @@
+import os
+
+import pytest
+
+import xml_olusturucu as xo
+
+# =========================================================================
+# ARTIMLI ÇALIŞMA (--incremental): girdileri değişmeyen hastane atlanır, değişen yeniden işlenir
+# =========================================================================
+
+SATIRLAR = [("TSH_2000", 2600), ("Glukoz (Serum/Plazma)", 1200), ("Alanin aminotransferaz (ALT)", 450)]
+MTIME = 1_700_000_000_000_000_000
+
+
+@pytest.fixture
+def hastane(calisma_dizini, sayim_exceli, deneme_configi):
+    """Excel'i yazılmış, çıktısı üretilmiş ve manifest kaydı alınmış bir deneme hastanesi."""
+    yol = sayim_exceli("a.xlsx", {"A EKİM SAYIM": SATIRLAR}, mtime_ns=MTIME)
+    config = deneme_configi(yol, "a")
+    kayit = xo.manifest_kaydi_olustur(config)
+    cikti = os.path.join(xo.TUM_CIKTILAR_YOLU, "a.xml")
+    with open(cikti, "w", encoding="utf-8") as f:
+        f.write("<Fis/>")
+    kayit["cikti"] = cikti
+    return config, kayit
+
+
+def test_degismeyen_hastane_atlanir(hastane):
+    config, kayit = hastane
+    assert xo._degismedi_mi(xo.manifest_kaydi_olustur(config), kayit)
+
+
+def test_birlikte_istenen_aylar_kaydi_degistirmez(hastane):
+    config, kayit = hastane
+    assert xo._degismedi_mi(xo.manifest_kaydi_olustur(dict(config, grup_aylari=["EKİM", "KASIM"])), kayit)
+
+
+def test_degisen_excel_yeniden_islenir(hastane, sayim_exceli):
+    config, kayit = hastane
+    sayim_exceli("a.xlsx", {"A EKİM SAYIM": SATIRLAR[:2]}, mtime_ns=MTIME + 1)
+    assert not xo._degismedi_mi(xo.manifest_kaydi_olustur(config), kayit)
+
+
+def test_yalnizca_zamani_degisen_excel_yeniden_islenir(hastane, sayim_exceli):
+    # Parmak izi boyut ve değişiklik zamanını da içerir; kaydedilen dosya yeniden işlenir
+    config, kayit = hastane
+    os.utime(config["input_path"], ns=(MTIME + 5, MTIME + 5))
+    assert not xo._degismedi_mi(xo.manifest_kaydi_olustur(config), kayit)
+
+
+@pytest.mark.parametrize("alan, deger", [
+    ("apply_min_roundup", False),
+    ("ihtiyac_sutunu", "2 AYLIK İHTİYAÇ MİKTARI (TEST)"),
+    ("kit_eslestirme", [{"Alanin aminotransferaz (ALT)": "ALT_3960"}]),
+    ("CARI_ADI", "BAŞKA AD"),
+    ("override_month_name", "KASIM"),
+])
+def test_degisen_konfigurasyon_yeniden_islenir(hastane, alan, deger):
+    config, kayit = hastane
+    assert not xo._degismedi_mi(xo.manifest_kaydi_olustur(dict(config, **{alan: deger})), kayit)
+
+
+@pytest.mark.parametrize("ayar", xo.CIKTIYI_ETKILEYEN_AYARLAR)
+def test_ciktiyi_etkileyen_ayar_yeniden_isletir(hastane, ayar):
+    config, kayit = hastane
+    xo.CALISMA_AYARLARI[ayar] = not xo.CALISMA_AYARLARI[ayar]
+    assert not xo._degismedi_mi(xo.manifest_kaydi_olustur(config), kayit)
+
+
+def test_degisen_stok_map_yeniden_isletir(hastane, monkeypatch):
+    config, kayit = hastane
+    tsh = xo.STOK_MAP["TSH_2000"]
+    monkeypatch.setitem(xo.STOK_MAP, "TSH_2000", tsh[:9] + (tsh[9] * 2, tsh[10]))
+    assert not xo._degismedi_mi(xo.manifest_kaydi_olustur(config), kayit)
+
+
+def test_silinen_cikti_yeniden_isletir(hastane):
+    config, kayit = hastane
+    os.remove(kayit["cikti"])
+    assert not xo._degismedi_mi(xo.manifest_kaydi_olustur(config), kayit)
+
+
+def test_erisilemeyen_excel_veya_kayit_yok(hastane):
+    config, kayit = hastane
+    assert not xo._degismedi_mi(xo.manifest_kaydi_olustur(config), None)
+    os.remove(config["input_path"])
+    assert xo.manifest_kaydi_olustur(config) is None
+    assert not xo._degismedi_mi(None, kayit)
+
+
+def test_ikinci_artimli_calistirma_atlar(calisma_dizini, sayim_exceli, deneme_configi):
+    configs = [deneme_configi(sayim_exceli("a.xlsx", {"A EKİM SAYIM": SATIRLAR}), "a"),
+               deneme_configi(sayim_exceli("b.xlsx", {"B EKİM SAYIM": SATIRLAR[1:]}), "b")]
+    manifest = {"hastaneler": {}}
+
+    ilk = xo.hastaneleri_isle(configs, artimli=True, manifest=manifest)
+    assert [s["durum"] for s in ilk] == ["BAŞARILI", "BAŞARILI"]
+    xo.manifesti_guncelle(manifest, configs, ilk)
+
+    ikinci = xo.hastaneleri_isle(configs, artimli=True, manifest=manifest)
+    assert [s["durum"] for s in ikinci] == ["ATLANDI", "ATLANDI"]
+    assert [s["cikti"] for s in ikinci] == [s["cikti"] for s in ilk]
+
+    # Yalnızca değişen Excel'in hastanesi yeniden işlenir
+    sayim_exceli("b.xlsx", {"B EKİM SAYIM": SATIRLAR}, mtime_ns=MTIME)
+    ucuncu = xo.hastaneleri_isle(configs, artimli=True, manifest=manifest)
+    assert [s["durum"] for s in ucuncu] == ["ATLANDI", "BAŞARILI"]
+
+    # artimli kapalıyken hiçbiri atlanmaz
+    assert [s["durum"] for s in xo.hastaneleri_isle(configs, manifest=manifest)] == ["BAŞARILI", "BAŞARILI"]
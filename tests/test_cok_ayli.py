@@ -0,0 +1,124 @@
+import pytest
+
+import xml_olusturucu as xo
+
+# =========================================================================
+# ÇOK AYLI ÇALIŞMA (--months / --all-months): aylara genişletme ve aylık sayfaların tek okumada alınması
+# =========================================================================
+
+SUTUN = "3 AYLIK İHTİYAÇ MİKTARI (TEST)"
+SAYFALAR = {
+    "A EYLÜL SAYIM": [("TSH_2000", 1000)],
+    "a ekim sayım": [("TSH_2000", 2600), ("Glukoz (Serum/Plazma)", 1200)],
+    "A KASIM SAYIM": [("Üre (Serum/Plazma)", 900)],
+    "ÖZET": [("TSH_2000", 1)],
+}
+
+
+@pytest.fixture
+def okumalar(calisma_dizini, monkeypatch):
+    """Önbellek kapalıyken Excel'in kaç kez, hangi sayfalar için açıldığını sayar."""
+    xo.CALISMA_AYARLARI["onbellek"] = False
+    okunan = []
+    asil_sayfalar, asil_satirlar = xo.excel_sayfalarini_oku, xo.excel_satirlarini_oku
+
+    def sayfalari_oku(kaynak, sheet_names, ihtiyac_sutunu):
+        okunan.append(list(sheet_names))
+        return asil_sayfalar(kaynak, sheet_names, ihtiyac_sutunu)
+
+    def satirlari_oku(kaynak, sheet_name, ihtiyac_sutunu):
+        okunan.append([sheet_name])
+        return asil_satirlar(kaynak, sheet_name, ihtiyac_sutunu)
+
+    monkeypatch.setattr(xo, "excel_sayfalarini_oku", sayfalari_oku)
+    monkeypatch.setattr(xo, "excel_satirlarini_oku", satirlari_oku)
+    return okunan
+
+
+def test_istenen_aylara_genisletilir():
+    configs = [{"CARI_ADI": "A", "input_path": "a.xlsx", "sheet_prefix": "A", "override_month_name": None},
+               {"CARI_ADI": "B", "input_path": "b.xlsx", "sheet_prefix": "B", "override_month_name": "MART"}]
+    genisletilmis = xo.aylara_genislet(configs, aylar=["EKİM", "EYLÜL"])
+    assert [(c["CARI_ADI"], c["ay"], c["override_month_name"]) for c in genisletilmis] == [
+        ("A", "EKİM", "EKİM"), ("A", "EYLÜL", "EYLÜL"), ("B", "EKİM", "EKİM"), ("B", "EYLÜL", "EYLÜL")]
+    assert all(c["grup_aylari"] == ["EKİM", "EYLÜL"] for c in genisletilmis)
+    # Girdi konfigürasyonları değiştirilmez
+    assert "ay" not in configs[0] and configs[1]["override_month_name"] == "MART"
+
+
+def test_ay_verilmezse_konfigurasyon_aynen_kalir():
+    configs = [{"CARI_ADI": "A"}]
+    assert xo.aylara_genislet(configs) == configs
+    assert xo.aylara_genislet(configs, aylar=[]) == configs
+
+
+def test_tum_aylar_sayfa_listesinden_bulunur(sayim_exceli, deneme_configi):
+    config = deneme_configi(sayim_exceli("a.xlsx", SAYFALAR), "a")
+    genisletilmis = xo.aylara_genislet([config], tum_aylar=True)
+    # Takvim sırasıyla; büyük/küçük harf farklı sayfa da bulunur, aylık olmayan sayfa alınmaz
+    assert [c["ay"] for c in genisletilmis] == ["EYLÜL", "EKİM", "KASIM"]
+    assert all(c["grup_aylari"] == ["EYLÜL", "EKİM", "KASIM"] for c in genisletilmis)
+
+
+def test_tum_aylar_bulunamazsa_konfigurasyon_aynen_kalir(sayim_exceli, deneme_configi, tmp_path, capsys):
+    aylik_sayfasiz = deneme_configi(sayim_exceli("a.xlsx", {"ÖZET": [("TSH_2000", 1)]}), "a")
+    okunamayan = deneme_configi(str(tmp_path / "yok.xlsx"), "b")
+    assert xo.aylara_genislet([aylik_sayfasiz, okunamayan], tum_aylar=True) == [aylik_sayfasiz, okunamayan]
+    assert "'B DENEME HASTANESİ' sayfa listesi okunamadı" in capsys.readouterr().out
+
+
+def test_grup_sayfalari_tek_okumada_alinir(okumalar, sayim_exceli):
+    yol = sayim_exceli("a.xlsx", SAYFALAR)
+    grup = ["A EYLÜL SAYIM", "a ekim sayım", "A KASIM SAYIM"]
+
+    assert xo.ay_sayfasini_oku(yol, "a ekim sayım", grup, SUTUN) == SAYFALAR["a ekim sayım"]
+    assert okumalar == [grup]
+    assert set(xo._OKUNMUS_AY_SAYFALARI[(yol, SUTUN)]) == {"A EYLÜL SAYIM", "A KASIM SAYIM"}
+
+    assert xo.ay_sayfasini_oku(yol, "A KASIM SAYIM", grup, SUTUN) == SAYFALAR["A KASIM SAYIM"]
+    assert xo.ay_sayfasini_oku(yol, "A EYLÜL SAYIM", grup, SUTUN) == SAYFALAR["A EYLÜL SAYIM"]
+    assert len(okumalar) == 1
+    # Son ay verilince grup bellekten silinir
+    assert xo._OKUNMUS_AY_SAYFALARI == {}
+
+
+def test_verilmis_ay_yeniden_istenirse_excel_yeniden_okunur(okumalar, sayim_exceli):
+    yol = sayim_exceli("a.xlsx", SAYFALAR)
+    grup = ["A EYLÜL SAYIM", "a ekim sayım"]
+    xo.ay_sayfasini_oku(yol, "a ekim sayım", grup, SUTUN)
+    assert xo.ay_sayfasini_oku(yol, "a ekim sayım", grup, SUTUN) == SAYFALAR["a ekim sayım"]
+    assert okumalar == [grup, grup]
+
+
+def test_farkli_ihtiyac_sutunu_ayri_tutulur(okumalar, sayim_exceli):
+    yol = sayim_exceli("a.xlsx", SAYFALAR)
+    grup = ["A EYLÜL SAYIM", "a ekim sayım"]
+    xo.ay_sayfasini_oku(yol, "a ekim sayım", grup, SUTUN)
+    with pytest.raises(ValueError, match="beklenen sütun"):
+        xo.ay_sayfasini_oku(yol, "a ekim sayım", grup, "2 AYLIK İHTİYAÇ MİKTARI (TEST)")
+    assert list(xo._OKUNMUS_AY_SAYFALARI) == [(yol, SUTUN)]
+
+
+def siparis_satirlari(sonuc):
+    return sonuc["siparis"][["test_adi", "stok_kodu", "test_miktari", "ozelalan1"]].values.tolist()
+
+
+def test_cok_ayli_calistirma_exceli_bir_kez_acar(okumalar, sayim_exceli, deneme_configi):
+    config = deneme_configi(sayim_exceli("a.xlsx", SAYFALAR), "a")
+    sonuclar = xo.hastaneleri_isle(xo.aylara_genislet([config], aylar=["EKİM", "EYLÜL", "KASIM"]))
+    assert [sonuc["durum"] for sonuc in sonuclar] == ["BAŞARILI"] * 3
+    assert okumalar == [["a ekim sayım", "A EYLÜL SAYIM", "A KASIM SAYIM"]]
+    assert xo._OKUNMUS_AY_SAYFALARI == {}
+
+    # Her ayın satırları, o ay tek başına işlendiğindeki satırlarla aynıdır
+    for ay, sonuc in zip(["EKİM", "EYLÜL", "KASIM"], sonuclar):
+        tek = xo.hastaneleri_isle([dict(config, override_month_name=ay)])[0]
+        assert siparis_satirlari(sonuc) == siparis_satirlari(tek)
+
+
+def test_sayfasi_olmayan_ay_digerlerini_engellemez(okumalar, sayim_exceli, deneme_configi):
+    config = deneme_configi(sayim_exceli("a.xlsx", SAYFALAR), "a")
+    sonuclar = xo.hastaneleri_isle(xo.aylara_genislet([config], aylar=["EKİM", "MART", "KASIM"]))
+    assert [sonuc["durum"] for sonuc in sonuclar] == ["BAŞARILI", "BAŞARISIZ", "BAŞARILI"]
+    assert okumalar == [["a ekim sayım", "A KASIM SAYIM"]]
+    assert xo._OKUNMUS_AY_SAYFALARI == {}
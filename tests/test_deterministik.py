@@ -0,0 +1,103 @@
+import argparse
+
+import pytest
+
+import xml_olusturucu as xo
+
+# =========================================================================
+# DETERMİNİSTİK MOD: hiçbir fiş değişmediyse çalıştırma yeni bir şey üretmemiş sayılır
+# =========================================================================
+
+
+def sonuc(durum, yeni_fis=None):
+    return {"durum": durum, "metrik": {"yeni_fis": yeni_fis}}
+
+
+@pytest.fixture
+def deterministik(monkeypatch):
+    monkeypatch.setitem(xo.CALISMA_AYARLARI, "deterministik", True)
+
+
+@pytest.mark.parametrize("sonuclar, beklenen", [
+    ([sonuc("BAŞARILI", False), sonuc("BAŞARILI", False)], True),
+    ([sonuc("BAŞARILI", False), sonuc("ATLANDI")], True),
+    ([sonuc("BAŞARILI", False), sonuc("BAŞARILI", True)], False),
+    ([sonuc("BAŞARILI", False), sonuc("BAŞARISIZ")], False),
+    ([], False),
+])
+def test_fisler_degismedi_mi(deterministik, sonuclar, beklenen):
+    assert xo.fisler_degismedi_mi(sonuclar, argparse.Namespace(parca=None)) is beklenen
+
+
+def test_parca_ve_deterministik_olmayan_calistirma(deterministik, monkeypatch):
+    sonuclar = [sonuc("BAŞARILI", False)]
+    # Parça klasörü merge için gerekir
+    assert not xo.fisler_degismedi_mi(sonuclar, argparse.Namespace(parca=(1, 2)))
+    monkeypatch.setitem(xo.CALISMA_AYARLARI, "deterministik", False)
+    assert not xo.fisler_degismedi_mi(sonuclar, argparse.Namespace(parca=None))
+
+
+def test_bos_calisma_klasoru_kaldirilir(tmp_path, monkeypatch):
+    klasor = tmp_path / "20260101_000000"
+    klasor.mkdir()
+    (klasor / xo.GUNLUK_DOSYASI_ADI).write_text("günlük", encoding="utf-8")
+    monkeypatch.setattr(xo, "TUM_CIKTILAR_YOLU", str(klasor))
+    xo.bos_calisma_klasorunu_kaldir()
+    assert not klasor.exists()
+
+    # Beklenmeyen bir dosya varsa klasöre dokunulmaz
+    klasor.mkdir()
+    (klasor / "baska.xml").write_text("<Fis/>", encoding="utf-8")
+    xo.bos_calisma_klasorunu_kaldir()
+    assert (klasor / "baska.xml").exists()
+
+
+# FISNO ÇAKIŞMASI: içerik deposunda başka bir özete ayrılmış numara kullanılmaz
+
+OZET_A, OZET_B, OZET_C = "a" * 64, "b" * 64, "c" * 64
+
+
+def test_fisno_ayni_ozete_hep_ayni_numarayi_verir(calisma_dizini):
+    assert xo.fisno_ayir(OZET_A, 91234567) == 91234567
+    assert xo.fisno_ayir(OZET_A, 91234567) == 91234567
+    with open(f"{xo.ICERIK_DEPOSU}/{xo.FISNO_KLASORU}/91234567", encoding="ascii") as f:
+        assert f.read() == OZET_A
+
+
+def test_cakisan_fisno_sonraki_numaraya_gecer(calisma_dizini, capsys):
+    assert xo.fisno_ayir(OZET_A, 91234567) == 91234567
+    assert xo.fisno_ayir(OZET_B, 91234567) == 91234568
+    assert xo.fisno_ayir(OZET_C, 91234567) == 91234569
+    assert "FISNO 91234567 başka bir fişe ait; bu fiş için 91234568 kullanıldı." in capsys.readouterr().out
+    # Sıra ne olursa olsun her özet kendi numarasını bulur
+    assert [xo.fisno_ayir(ozet, 91234567) for ozet in (OZET_C, OZET_B, OZET_A)] == [91234569, 91234568, 91234567]
+
+
+def test_aralik_sonunda_basa_donulur(calisma_dizini):
+    xo.fisno_ayir(OZET_A, 99999999)
+    assert xo.fisno_ayir(OZET_B, 99999999) == 90000000
+
+
+def test_depo_yazilamazsa_turetilen_numara_kullanilir(calisma_dizini, monkeypatch, capsys):
+    (calisma_dizini / "dosya").write_text("", encoding="utf-8")
+    monkeypatch.setattr(xo, "ICERIK_DEPOSU", str(calisma_dizini / "dosya" / "Icerik_Deposu"))
+    assert xo.fisno_ayir(OZET_A, 91234567) == 91234567
+    assert "FISNO içerik deposunda ayrılamadı" in capsys.readouterr().out
+
+
+def test_cakisan_fislere_farkli_fisno_yazilir(calisma_dizini, sayim_exceli, deneme_configi, monkeypatch):
+    xo.CALISMA_AYARLARI["deterministik"] = True
+    asil = xo.fis_kimligi
+    # İki farklı fişin özetten türetilen FISNO'su aynı çıksın
+    monkeypatch.setattr(xo, "fis_kimligi", lambda *argumanlar: (asil(*argumanlar)[0], 95555555))
+    configs = [deneme_configi(sayim_exceli(f"{onek}.xlsx", {f"{onek.upper()} EKİM SAYIM": [("TSH_2000", miktar)]}),
+                              onek) for onek, miktar in (("a", 2600), ("b", 100))]
+
+    ilk = xo.hastaneleri_isle(configs)
+    assert [sonuc["metrik"]["fisno"] for sonuc in ilk] == [95555555, 95555556]
+    assert [xo.fis_numarasini_oku(sonuc["cikti"]) for sonuc in ilk] == ["95555555", "95555556"]
+
+    # Aynı gün yeniden çalıştırıldığında fişler değişmemiş sayılır ve numaraları korunur
+    ikinci = xo.hastaneleri_isle(configs[::-1])
+    assert [sonuc["metrik"]["yeni_fis"] for sonuc in ikinci] == [False, False]
+    assert [sonuc["metrik"]["fisno"] for sonuc in ikinci] == [95555556, 95555555]
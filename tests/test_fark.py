@@ -0,0 +1,109 @@
+import os
+
+import pytest
+
+import xml_olusturucu as xo
+
+# =========================================================================
+# ÖNCEKİ ÇALIŞTIRMAYLA FARK (--diff-against): fiş okuma, aynı STOKKOD birleştirme ve okunamayan fişler
+# =========================================================================
+
+SATIRLAR = [("TSH_2000", 2600), ("Glukoz (Serum/Plazma)", 1200)]
+
+
+def fis_xml(cari_id, satirlar, cari_adi="DENEME HASTANESİ"):
+    """xml_dosyasina_yaz düzeninde (kaçışsız) elle bir fiş metni üretir."""
+    govde = "".join(f"<Satir>\n<SIRANO>{i}</SIRANO>\n<STOKKOD>{stok_kodu}</STOKKOD>\n<STOKADI>{stok_adi}</STOKADI>\n"
+                    f"<MIKTAR>{miktar}</MIKTAR>\n<OZELALAN1>{ozelalan1}</OZELALAN1>\n</Satir>\n"
+                    for i, (stok_kodu, stok_adi, miktar, ozelalan1) in enumerate(satirlar, 1))
+    return (f'<?xml version="1.0" encoding="utf-8"?>\n<Fis>\n<FISNO>90000001</FISNO>\n<CARIID>{cari_id}</CARIID>\n'
+            f"<CARIADI>{cari_adi}</CARIADI>\n<Satirlar>\n{govde}</Satirlar>\n</Fis>\n")
+
+
+def fis_yaz(klasor, ad, metin):
+    yol = os.path.join(klasor, ad)
+    with open(yol, "w", encoding="utf-8") as f:
+        f.write(metin)
+    return yol
+
+
+def test_fis_satirlari_okunur(tmp_path):
+    yol = fis_yaz(tmp_path, "a_islenmis_veri_20261018_120000.xml",
+                  fis_xml("A", [("7K6230", "ARC.TSH", 3000, "1K + 2SET"), ("3L8222", "CC GLUKOZ", 1200, "")]))
+    assert xo.fis_satirlarini_oku(yol) == ("A", [("7K6230", "3000", "1K + 2SET"), ("3L8222", "1200", "")])
+
+
+def test_kacissiz_ampersand_parse_error_verir(tmp_path):
+    yol = fis_yaz(tmp_path, "a_islenmis_veri_20261018_120000.xml",
+                  fis_xml("A", [("7K6230", "ARC.TSH", 3000, "1K")], cari_adi="AĞRI KADIN & ÇOCUK"))
+    with pytest.raises(xo.ET.ParseError):
+        xo.fis_satirlarini_oku(yol)
+
+
+def test_ayni_stokkod_birlestirilir():
+    indeks = {}
+    xo._fark_indeksine_ekle(indeks, "A", None, "7K6230", "3000", "1K + 2SET")
+    xo._fark_indeksine_ekle(indeks, "A", "", "7K6230", 500, "1SET")
+    xo._fark_indeksine_ekle(indeks, "A", "EKİM", "7K6230", "200", "1SET")
+    xo._fark_indeksine_ekle(indeks, "A", "EKİM", "3L8222", "sayı değil", "1SET")
+    assert indeks == {("A", "", "7K6230"): [3500, ["1K + 2SET", "1SET"]],
+                      ("A", "EKİM", "7K6230"): [200, ["1SET"]],
+                      ("A", "EKİM", "3L8222"): [0, ["1SET"]]}
+
+
+def test_onceki_calistirma_okunamayan_fisi_atlar(tmp_path, capsys):
+    fis_yaz(tmp_path, "a_islenmis_veri_20261018_120000.xml",
+            fis_xml("A", [("7K6230", "ARC.TSH", 3000, "1K"), ("7K6230", "ARC.TSH", 500, "1SET")]))
+    fis_yaz(tmp_path, "b_islenmis_veri_EKİM_20261018_120000.xml", fis_xml("B", [("3L8222", "CC GLUKOZ", 1200, "4SET")]))
+    fis_yaz(tmp_path, "c_islenmis_veri_20261018_120000.xml",
+            fis_xml("C", [("3L8222", "R&D GLUKOZ", 1200, "4SET")]))
+    # Hastane fişi adına uymayan dosyalar okunmaz
+    fis_yaz(tmp_path, "konsolide_20261018_120000.xml", "bozuk")
+    fis_yaz(tmp_path, "notlar.txt", "bozuk")
+
+    indeks, fis_sayisi, okunamayanlar = xo.onceki_calistirmayi_oku(str(tmp_path))
+    assert indeks == {("A", "", "7K6230"): [3500, ["1K", "1SET"]], ("B", "EKİM", "3L8222"): [1200, ["4SET"]]}
+    assert fis_sayisi == 2
+    assert okunamayanlar == ["c_islenmis_veri_20261018_120000.xml"]
+    assert "'c_islenmis_veri_20261018_120000.xml' okunamadı" in capsys.readouterr().out
+
+
+@pytest.fixture
+def onceki_calistirma(calisma_dizini, sayim_exceli, deneme_configi):
+    """Bir hastanenin fişi yazılmış önceki çalıştırma klasörü ve konfigürasyonu."""
+    config = deneme_configi(sayim_exceli("a.xlsx", {"A EKİM SAYIM": SATIRLAR}), "a")
+    xo.process_hospital_data(config)
+    return config, xo.TUM_CIKTILAR_YOLU
+
+
+def test_degismeyen_satirlar_ayni_sayilir(onceki_calistirma):
+    config, klasor = onceki_calistirma
+    assert xo.fark_raporu([config], klasor) == {"+": 0, "-": 0, "~": 0, "=": 2, "okunamayan": 0}
+
+
+def test_eklenen_silinen_ve_degisen_satirlar(onceki_calistirma, sayim_exceli, capsys):
+    config, klasor = onceki_calistirma
+    sayim_exceli("a.xlsx", {"A EKİM SAYIM": [("TSH_2000", 5000), ("Alanin aminotransferaz (ALT)", 450)]})
+    capsys.readouterr()
+    assert xo.fark_raporu([config], klasor) == {"+": 1, "-": 1, "~": 1, "=": 0, "okunamayan": 0}
+    cikti = capsys.readouterr().out
+    assert "--- A ---" in cikti
+    assert "3000 TEST (1K + 2SET) -> 5000 TEST (2K + 2SET) (+2000 TEST)" in cikti
+    assert "3L8222" in cikti and "kaldırıldı" in cikti
+
+
+def test_satir_sirasi_fark_sayilmaz(onceki_calistirma, sayim_exceli):
+    config, klasor = onceki_calistirma
+    sayim_exceli("a.xlsx", {"A EKİM SAYIM": SATIRLAR[::-1]})
+    assert xo.fark_raporu([config], klasor)["="] == 2
+
+
+def test_okunamayan_fis_raporlanir_digerleri_karsilastirilir(onceki_calistirma, capsys):
+    config, klasor = onceki_calistirma
+    fis_yaz(klasor, "b_islenmis_veri_20261018_120000.xml",
+            fis_xml("B", [("3L8222", "CC GLUKOZ", 1200, "4SET")], cari_adi="AĞRI KADIN & ÇOCUK"))
+    capsys.readouterr()
+    assert xo.fark_raporu([config], klasor) == {"+": 0, "-": 0, "~": 0, "=": 2, "okunamayan": 1}
+    cikti = capsys.readouterr().out
+    assert "(1 fiş)" in cikti
+    assert "Şu önceki fişler okunamadı; satırları 'eklendi' görünebilir: b_islenmis_veri_20261018_120000.xml" in cikti
@@ -0,0 +1,44 @@
+import atexit
+import logging.handlers
+import os
+import subprocess
+import sys
+
+import xml_olusturucu as xo
+
+# =========================================================================
+# GÜNLÜK: içe aktarma günlüğü yapılandırmaz; işleyiciler ve atexit kaydı gunlugu_ayarla ile kurulur
+# =========================================================================
+
+KOK = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_ice_aktarma_gunlugu_yapilandirmaz():
+    betik = ("import atexit, logging; once = atexit._ncallbacks(); import xml_olusturucu as xo; "
+             "print(xo.GUNLUK.handlers, xo.GUNLUK.propagate, xo.GUNLUK.level == logging.NOTSET, "
+             "atexit._ncallbacks() - once)")
+    cikti = subprocess.run([sys.executable, "-c", betik], cwd=KOK, capture_output=True, text=True, check=True)
+    assert cikti.stdout.split() == ["[]", "True", "True", "0"]
+
+
+def test_kuyruklu_gunluk_atexit_e_bir_kez_kaydolur(calisma_dizini, monkeypatch, capsys):
+    kayitlar = []
+    monkeypatch.setattr(xo, "_GUNLUK_ATEXIT_KAYITLI", False)
+    monkeypatch.setattr(atexit, "register", kayitlar.append)
+    try:
+        xo.gunlugu_ayarla()
+        xo.GUNLUK.info("kuyruktan yazıldı")
+        xo.gunlugu_ayarla(str(calisma_dizini))
+    finally:
+        xo.gunlugu_durdur()
+    assert kayitlar == [xo.gunlugu_durdur]
+    assert "kuyruktan yazıldı" in capsys.readouterr().out
+    assert isinstance(xo.GUNLUK.handlers[0], logging.handlers.QueueHandler)
+
+
+def test_dogrudan_gunluk_dinleyici_baslatmaz(capsys):
+    xo.gunlugu_ayarla(dogrudan=True)
+    assert xo._GUNLUK_DINLEYICISI is None
+    assert not xo.GUNLUK.propagate
+    xo.GUNLUK.info("doğrudan yazıldı")
+    assert capsys.readouterr().out == "doğrudan yazıldı\n"
@@ -0,0 +1,119 @@
+import pytest
+
+import xml_olusturucu as xo
+
+# =========================================================================
+# KİT ÇÖZÜM TABLOSU: test adı -> kit (birebir ve normalize edilmiş indeks) ve konfigürasyon denetimi
+# =========================================================================
+
+
+def config_uret(onek, kit_eslestirme, cari_adi="DENEME HASTANESİ"):
+    return {"CARI_ADI": cari_adi, "output_prefix": onek, "kit_eslestirme": kit_eslestirme}
+
+
+@pytest.fixture(autouse=True)
+def bos_tablo_onbellegi(monkeypatch):
+    # Deneme konfigürasyonlarının tabloları gerçek hastanelerinkine karışmasın
+    monkeypatch.setattr(xo, "_KIT_TABLOLARI", {})
+
+
+@pytest.mark.parametrize("eski, yeni", [
+    ("Hbs_100", "HBs_100"),
+    ("Hbs_2000", "HBs_2000"),
+    ("Folat_500", "Folat_500 (Serum/Plazma)"),
+    ("hbsag_500", "Hbsag_500"),
+    ("TSH_2000", "TSH_2000"),
+])
+def test_eski_kit_anahtari_yazimlari_ayni_kite_gider(eski, yeni):
+    assert xo.KIT_KATALOGU.anahtari_coz(eski) == yeni
+    assert xo.kit_eslestirmelerini_birlestir(config_uret("eski", {"Anti HBs": eski})) == {"Anti HBs": yeni}
+    tablo = xo.hastane_kit_tablosu(config_uret("eski", [{"Anti HBs": eski}]))
+    assert tablo.get("Anti HBs") is xo.KIT_KATALOGU[yeni]
+
+
+def test_eski_ve_yeni_konfigurasyon_ayni_tabloyu_uretir():
+    for config in xo.HASTANE_CONFIGS:
+        # Yeniden adlandırmadan önceki yazımlar (Hbs_ / Folat_500)
+        eski = [{test_adi: kit.replace("HBs_", "Hbs_").replace("Folat_500 (Serum/Plazma)", "Folat_500")}
+                for test_adi, kit in xo.kit_eslestirmelerini_birlestir(config).items()]
+        yeni_tablo = xo.hastane_kit_tablosu(config)
+        eski_tablo = xo.hastane_kit_tablosu(dict(config, output_prefix=f"eski_{config['output_prefix']}",
+                                                 kit_eslestirme=eski))
+        assert eski_tablo.birebir == yeni_tablo.birebir
+
+
+def test_gercek_konfigurasyonlar_gecerli():
+    xo.konfigurasyonlari_dogrula(xo.HASTANE_CONFIGS)
+
+
+@pytest.mark.parametrize("excel_adi, kit", [
+    ("TSH_2000", "TSH_2000"),
+    ("tsh_2000", "TSH_2000"),
+    ("Glukoz  (Serum/Plazma)", "Glukoz (Serum/Plazma)"),
+    ("GLUKOZ (SERUM/PLAZMA)", "Glukoz (Serum/Plazma)"),
+    ("Üre (Serum/Plazma)", "Üre (Serum/Plazma)"),
+    ("ÜRE (SERUM PLAZMA)", "Üre (Serum/Plazma)"),
+    # Hastaneye özel eşleştirme de normalize edilerek bulunur
+    ("ALANİN AMİNOTRANSFERAZ (ALT)", "ALT_1200"),
+    ("alanin aminotransferaz alt", "ALT_1200"),
+])
+def test_normalize_indeks(excel_adi, kit):
+    config = next(c for c in xo.HASTANE_CONFIGS if c["cari_id"] == "POSOF")
+    assert xo.hastane_kit_tablosu(config).get(excel_adi) is xo.KIT_KATALOGU[kit]
+
+
+def test_bilinmeyen_ad_varsayilani_dondurur():
+    tablo = xo.hastane_kit_tablosu(xo.HASTANE_CONFIGS[0])
+    assert tablo.get("Hemogram") is None
+    assert tablo.get("Hemogram", "yok") == "yok"
+
+
+def test_birebir_ad_normalize_eslesmeden_once_gelir():
+    tsh_100, tsh_2000 = xo.KIT_KATALOGU["TSH_100"], xo.KIT_KATALOGU["TSH_2000"]
+    # Aynı kite giden iki yazım çakışma sayılmaz
+    tablo = xo.KitCozumTablosu({"TSH": tsh_100, "tsh": tsh_100, "T.S.H": tsh_2000}, "deneme")
+    assert tablo.get("T.S.H") is tsh_2000
+    assert tablo.get("TSH") is tsh_100
+
+
+def test_normalize_cakismasi_raporlanir():
+    with pytest.raises(xo.KonfigurasyonHatasi, match="normalize edildiğinde aynı ad oluyor: 'anti hbs'"):
+        xo.KitCozumTablosu({"Anti HBs": xo.KIT_KATALOGU["HBs_100"],
+                            "ANTİ HBS": xo.KIT_KATALOGU["HBs_2000"]}, "deneme")
+
+
+def test_konfigurasyon_hatalari_birlikte_raporlanir():
+    configs = [
+        config_uret("a_veri", [{"Anti HBs": "HBs_100"}, {"Anti HBs": "HBs_2000"}], "A HASTANESİ"),
+        config_uret("b_veri", {"TSH": "TSH_9999"}, "B HASTANESİ"),
+        config_uret("c_veri", [{"anti hbs": "HBs_100"}, {"ANTİ HBS.": "HBs_2000"}], "C HASTANESİ"),
+        config_uret("a_veri", {}, "A HASTANESİ KOPYA"),
+        config_uret("d_veri", {"TSH": "TSH_2000"}, "D HASTANESİ"),
+    ]
+    with pytest.raises(xo.KonfigurasyonHatasi) as hata:
+        xo.konfigurasyonlari_dogrula(configs)
+    mesaj = str(hata.value)
+    assert "'Anti HBs' birden fazla kez eşleştirilmiş ('HBs_100' ve 'HBs_2000')" in mesaj
+    assert "'TSH' için kit anahtarı 'TSH_9999' STOK_MAP'te yok" in mesaj
+    assert "'C HASTANESİ' (c_veri) test adı çakışması" in mesaj
+    assert "output_prefix 'a_veri' birden fazla hastanede kullanılmış" in mesaj
+    assert "D HASTANESİ" not in mesaj
+
+
+def test_katalog_ilk_kullanimda_bir_kez_derlenir(monkeypatch):
+    derlenen = []
+    asil = xo.KitKatalogu
+
+    def katalog_derle(stok_map):
+        derlenen.append(stok_map)
+        return asil(stok_map)
+
+    monkeypatch.setattr(xo, "KitKatalogu", katalog_derle)
+    vekil = xo._TembelKatalog()
+    monkeypatch.setattr(xo, "KIT_KATALOGU", vekil)
+    assert derlenen == []
+
+    assert "TSH_2000" in vekil and len(vekil) == len(xo.STOK_MAP)
+    assert vekil["TSH_2000"] is vekil.get("TSH_2000") is xo.KIT_KATALOGU["TSH_2000"]
+    assert isinstance(xo.KIT_KATALOGU, asil)
+    assert derlenen == [xo.STOK_MAP]
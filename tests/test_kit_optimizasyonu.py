@@ -0,0 +1,112 @@
+import itertools
+import math
+
+import pytest
+
+import xml_olusturucu as xo
+
+# =========================================================================
+# KİT BOYU OPTİMİZASYONU: DP sonucu kaba kuvvet aramasıyla karşılaştırılır
+# =========================================================================
+
+AILELER = list(range(len(xo.KIT_KATALOGU.aileler)))
+
+
+def _anahtar(boylar, sayilar, ihtiyac):
+    """Karışımların sıralama ölçütü: fazla test, toplam set, sonra büyük boydan başlayarak çok set."""
+    toplam = sum(boy * sayi for boy, sayi in zip(boylar, sayilar))
+    return toplam - max(ihtiyac, 1), sum(sayilar), tuple(-sayi for sayi in sayilar)
+
+
+def kaba_kuvvet(aile_no, ihtiyac):
+    """Her boydan 0..⌈ihtiyaç/boy⌉ set alan tüm karışımlar arasından en iyisi."""
+    boylar = [int(kit.test_per_set) for kit in xo.KIT_KATALOGU.aileler[aile_no]]
+    hedef = max(ihtiyac, 1)
+    adaylar = (sayilar for sayilar in itertools.product(*(range(-(-hedef // boy) + 1) for boy in boylar))
+               if sum(boy * sayi for boy, sayi in zip(boylar, sayilar)) >= hedef)
+    return min(adaylar, key=lambda sayilar: _anahtar(boylar, sayilar, ihtiyac))
+
+
+def sinirli_kaba_kuvvet(aile_no, ihtiyac):
+    """
+    Büyük ihtiyaçlar için tam arama: en büyük boy dışındaki her boydan, en büyük boyla değiştirilebilecek
+    miktarın (en büyük boy / ebob) altında set alan tüm karışımlar; en büyük boyun set sayısı kalan
+    ihtiyacı karşılayan en küçük sayıdır. Daha fazla küçük boy seti aynı test sayısında daha çok set
+    demektir, bu yüzden en iyi karışım bu aralıktadır.
+    """
+    boylar = [int(kit.test_per_set) for kit in xo.KIT_KATALOGU.aileler[aile_no]]
+    hedef = max(ihtiyac, 1)
+    adaylar = []
+    for kucukler in itertools.product(*(range(boylar[0] // math.gcd(boylar[0], boy)) for boy in boylar[1:])):
+        kalan = hedef - sum(boy * sayi for boy, sayi in zip(boylar[1:], kucukler))
+        adaylar.append((max(0, -(-kalan // boylar[0])),) + kucukler)
+    return min(adaylar, key=lambda sayilar: _anahtar(boylar, sayilar, ihtiyac))
+
+
+def _sayilar(aile_no, karisim):
+    """en_az_fazlali_karisim sonucunu ailenin boy sırasıyla set sayılarına çevirir."""
+    adetler = dict(karisim)
+    return tuple(adetler.get(kit.sira, 0) for kit in xo.KIT_KATALOGU.aileler[aile_no])
+
+
+@pytest.mark.parametrize("aile_no", AILELER)
+def test_dp_kaba_kuvvetle_ayni(aile_no):
+    en_buyuk = int(xo.KIT_KATALOGU.aileler[aile_no][0].test_per_set)
+    for ihtiyac in range(0, 4 * en_buyuk + 1):
+        assert _sayilar(aile_no, xo.en_az_fazlali_karisim(aile_no, ihtiyac)) == kaba_kuvvet(aile_no, ihtiyac), ihtiyac
+
+
+@pytest.mark.parametrize("aile_no", AILELER)
+def test_dp_sinirin_ustunde(aile_no):
+    boylar = [int(kit.test_per_set) for kit in xo.KIT_KATALOGU.aileler[aile_no]]
+    ortak = math.gcd(*boylar)
+    # DP tablosu sınırı aşan kısmı en büyük boyla karşıladığı dal
+    for ihtiyac in (ortak * xo._KARISIM_DP_SINIRI + 1, ortak * (xo._KARISIM_DP_SINIRI + 7) + 13,
+                    ortak * 3 * xo._KARISIM_DP_SINIRI + boylar[-1] - 1):
+        karisim = _sayilar(aile_no, xo.en_az_fazlali_karisim(aile_no, ihtiyac))
+        assert karisim == sinirli_kaba_kuvvet(aile_no, ihtiyac), ihtiyac
+
+
+def test_sinirli_arama_kucuk_ihtiyacta_kaba_kuvvetle_ayni():
+    # Büyük ihtiyaçlarda kullanılan sınırlı aramanın kendisi de tam aramayla doğrulanır
+    for aile_no in AILELER:
+        for ihtiyac in range(0, 3000, 7):
+            assert sinirli_kaba_kuvvet(aile_no, ihtiyac) == kaba_kuvvet(aile_no, ihtiyac)
+
+
+def test_bolunen_satirlarda_ozelalan1_ve_miktar():
+    config = xo.HASTANE_CONFIGS[0]
+    satirlar = [(aile[-1].anahtar, ihtiyac) for aile in xo.KIT_KATALOGU.aileler
+                for ihtiyac in (0, 1, 99, 450, 501, 1234, 2600, 9999, 123457)]
+    siparis = xo.siparis_satirlarini_hesapla(satirlar, xo.hastane_kit_tablosu(config), True,
+                                            kit_optimizasyonu=True)
+
+    # Her kaynak satırın boyları art arda gelir; karışım DP sonucuyla, alanlar da kitin kendisiyle tutarlıdır
+    sira = 0
+    for test_adi, ihtiyac in satirlar:
+        kit = xo.KIT_KATALOGU[test_adi]
+        aile_no = xo.KIT_KATALOGU.aileler.index(xo.KIT_KATALOGU.aile(test_adi))
+        karisim = xo.en_az_fazlali_karisim(aile_no, ihtiyac)
+        parcalar = siparis.iloc[sira:sira + len(karisim)]
+        sira += len(karisim)
+
+        assert list(parcalar["test_adi"]) == [kit.anahtar] * len(karisim)
+        assert int(parcalar["ihtiyac"].sum()) == ihtiyac
+        for (_, satir), (kit_sirasi, set_sayisi) in zip(parcalar.iterrows(), karisim):
+            boy = xo.KIT_KATALOGU[satir["stok_map_key"]]
+            assert boy.sira == kit_sirasi
+            assert satir["set_sayisi"] == set_sayisi
+            assert satir["stok_kodu"] == boy.stok_kodu
+            assert satir["set_per_kutu"] == boy.set_per_kutu
+            assert satir["miktar"] == str(int(set_sayisi * boy.test_per_set))
+            assert satir["ozelalan1"] == xo._ozelalan1_bicimle(set_sayisi, boy.set_per_kutu)
+    assert sira == len(siparis)
+
+
+def test_ornek_ozelalan1_degerleri():
+    # TSH 2600 TEST: 5 x 500'lük set (4 set / kutu) + 1 x 100'lük set (1 set / kutu)
+    config = xo.HASTANE_CONFIGS[0]
+    siparis = xo.siparis_satirlarini_hesapla([("TSH_100", 2600)], xo.hastane_kit_tablosu(config), True,
+                                            kit_optimizasyonu=True)
+    assert list(zip(siparis["stok_map_key"], siparis["miktar"], siparis["ozelalan1"])) == [
+        ("TSH_2000", "2500", "1K + 1SET"), ("TSH_100", "100", "1K")]
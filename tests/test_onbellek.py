@@ -0,0 +1,155 @@
+import os
+
+import pytest
+from openpyxl import Workbook
+
+import xml_olusturucu as xo
+
+# =========================================================================
+# EXCEL ÖNBELLEĞİ: isabet, Excel değişince geçersizleşme ve boyut sınırında en eskinin silinmesi
+# =========================================================================
+
+SUTUN = "3 AYLIK İHTİYAÇ MİKTARI (TEST)"
+
+
+def excel_yaz(yol, sayfalar, mtime_ns=None):
+    """{sayfa adı: [(test_adi, ihtiyac), ...]} içeriğiyle bir sayım Excel'i yazar."""
+    wb = Workbook()
+    wb.remove(wb.active)
+    for ad, satirlar in sayfalar.items():
+        ws = wb.create_sheet(ad)
+        ws.append([xo.TEST_ADI_SUTUNU, SUTUN])
+        for satir in satirlar:
+            ws.append(list(satir))
+    wb.save(yol)
+    if mtime_ns is not None:
+        os.utime(yol, ns=(mtime_ns, mtime_ns))
+    return str(yol)
+
+
+@pytest.fixture
+def onbellek(tmp_path, monkeypatch):
+    """Önbellek geçici klasörde açılır; gerçek Excel ayrıştırmaları sayılır."""
+    klasor = tmp_path / "onbellek"
+    monkeypatch.setattr(xo, "ONBELLEK_KLASOR_ADI", str(klasor))
+    monkeypatch.setitem(xo.CALISMA_AYARLARI, "onbellek", True)
+    monkeypatch.setitem(xo.CALISMA_AYARLARI, "onbellek_mb", 256)
+
+    okumalar = []
+    asil = xo.excel_sayfalarini_oku
+
+    def sayan(kaynak, sheet_names, ihtiyac_sutunu):
+        okumalar.append(list(sheet_names))
+        return asil(kaynak, sheet_names, ihtiyac_sutunu)
+
+    monkeypatch.setattr(xo, "excel_sayfalarini_oku", sayan)
+    return klasor, okumalar
+
+
+def pkl_dosyalari(klasor):
+    return sorted(ad for ad in os.listdir(klasor) if ad.endswith(".pkl")) if klasor.exists() else []
+
+
+def test_isabet_excel_okumaz(tmp_path, onbellek):
+    klasor, okumalar = onbellek
+    yol = excel_yaz(tmp_path / "a.xlsx", {"EKİM": [("TSH", 450), ("Glukoz", 12.5)], "KASIM": [("TSH", 1)]})
+
+    ilk = xo.onbellekli_sayfalari_oku(yol, ["EKİM", "KASIM"], SUTUN)
+    assert okumalar == [["EKİM", "KASIM"]]
+    assert len(pkl_dosyalari(klasor)) == 2
+
+    ikinci = xo.onbellekli_sayfalari_oku(yol, ["EKİM", "KASIM"], SUTUN)
+    assert okumalar == [["EKİM", "KASIM"]]
+    assert ikinci == ilk == {"EKİM": [("TSH", 450), ("Glukoz", 12.5)], "KASIM": [("TSH", 1)]}
+    assert xo.onbellekli_satirlari_oku(yol, "EKİM", SUTUN) == ilk["EKİM"]
+    assert len(okumalar) == 1
+
+
+def test_yalnizca_eksik_sayfalar_okunur(tmp_path, onbellek):
+    _, okumalar = onbellek
+    yol = excel_yaz(tmp_path / "a.xlsx", {"EKİM": [("TSH", 1)], "KASIM": [("TSH", 2)]})
+    xo.onbellekli_sayfalari_oku(yol, ["EKİM"], SUTUN)
+    assert xo.onbellekli_sayfalari_oku(yol, ["EKİM", "KASIM"], SUTUN) == {"EKİM": [("TSH", 1)], "KASIM": [("TSH", 2)]}
+    assert okumalar == [["EKİM"], ["KASIM"]]
+
+
+def test_excel_degisince_yeniden_okunur(tmp_path, onbellek):
+    _, okumalar = onbellek
+    yol = excel_yaz(tmp_path / "a.xlsx", {"EKİM": [("TSH", 450)]}, mtime_ns=1_700_000_000_000_000_000)
+    assert xo.onbellekli_satirlari_oku(yol, "EKİM", SUTUN) == [("TSH", 450)]
+
+    # Aynı boyutlu yeni içerik, farklı değişiklik zamanı
+    excel_yaz(yol, {"EKİM": [("TSH", 999)]}, mtime_ns=1_700_000_000_000_000_001)
+    assert xo.onbellekli_satirlari_oku(yol, "EKİM", SUTUN) == [("TSH", 999)]
+    assert len(okumalar) == 2
+
+
+def test_sutun_ve_surum_anahtarda(tmp_path, onbellek, monkeypatch):
+    _, okumalar = onbellek
+    yol = excel_yaz(tmp_path / "a.xlsx", {"EKİM": [("TSH", 450)]})
+    xo.onbellekli_satirlari_oku(yol, "EKİM", SUTUN)
+    with pytest.raises(ValueError, match="beklenen sütun"):
+        xo.onbellekli_satirlari_oku(yol, "EKİM", "2 AYLIK İHTİYAÇ MİKTARI (TEST)")
+    monkeypatch.setattr(xo, "ONBELLEK_SURUMU", xo.ONBELLEK_SURUMU + 1)
+    xo.onbellekli_satirlari_oku(yol, "EKİM", SUTUN)
+    assert len(okumalar) == 3
+
+
+def test_bozuk_girdi_yeniden_okunur(tmp_path, onbellek):
+    klasor, okumalar = onbellek
+    yol = excel_yaz(tmp_path / "a.xlsx", {"EKİM": [("TSH", 450)]})
+    xo.onbellekli_satirlari_oku(yol, "EKİM", SUTUN)
+    (klasor / pkl_dosyalari(klasor)[0]).write_bytes(b"bozuk")
+    assert xo.onbellekli_satirlari_oku(yol, "EKİM", SUTUN) == [("TSH", 450)]
+    assert len(okumalar) == 2
+
+
+def test_kapaliyken_onbellek_kullanilmaz(tmp_path, onbellek, monkeypatch):
+    klasor, _ = onbellek
+    monkeypatch.setitem(xo.CALISMA_AYARLARI, "onbellek", False)
+    yol = excel_yaz(tmp_path / "a.xlsx", {"EKİM": [("TSH", 450)]})
+    assert list(xo.onbellekli_satirlari_oku(yol, "EKİM", SUTUN)) == [("TSH", 450)]
+    assert not klasor.exists()
+
+
+def test_sinir_asilinca_en_eski_kullanilan_silinir(tmp_path, onbellek):
+    klasor, _ = onbellek
+    klasor.mkdir()
+    for i, ad in enumerate(["c", "a", "b"]):
+        (klasor / f"{ad}.pkl").write_bytes(b"x" * 100)
+        os.utime(klasor / f"{ad}.pkl", (1000 + i, 1000 + i))
+    (klasor / "baska.tmp").write_bytes(b"x" * 1000)
+
+    xo._onbellegi_temizle(300)
+    assert pkl_dosyalari(klasor) == ["a.pkl", "b.pkl", "c.pkl"]
+    xo._onbellegi_temizle(250)
+    assert pkl_dosyalari(klasor) == ["a.pkl", "b.pkl"]
+    xo._onbellegi_temizle(100)
+    assert pkl_dosyalari(klasor) == ["b.pkl"]
+    assert (klasor / "baska.tmp").exists()
+
+
+def test_isabet_lru_sirasini_gunceller(tmp_path, onbellek):
+    klasor, okumalar = onbellek
+    eski = excel_yaz(tmp_path / "eski.xlsx", {"EKİM": [("TSH", 1)]})
+    yeni = excel_yaz(tmp_path / "yeni.xlsx", {"EKİM": [("TSH", 2)]})
+    xo.onbellekli_satirlari_oku(eski, "EKİM", SUTUN)
+    xo.onbellekli_satirlari_oku(yeni, "EKİM", SUTUN)
+    for ad in pkl_dosyalari(klasor):
+        os.utime(klasor / ad, (1000, 1000))
+
+    # Eski dosyanın girdisi kullanılınca en yeni sayılır; sınır aşılınca diğeri silinir
+    xo.onbellekli_satirlari_oku(eski, "EKİM", SUTUN)
+    boyut = max(os.path.getsize(klasor / ad) for ad in pkl_dosyalari(klasor))
+    xo._onbellegi_temizle(boyut)
+    assert len(pkl_dosyalari(klasor)) == 1
+    xo.onbellekli_satirlari_oku(eski, "EKİM", SUTUN)
+    assert len(okumalar) == 2
+
+
+def test_onbellek_mb_asilinca_yazilan_girdiler_silinir(tmp_path, onbellek, monkeypatch):
+    klasor, _ = onbellek
+    monkeypatch.setitem(xo.CALISMA_AYARLARI, "onbellek_mb", 0)
+    yol = excel_yaz(tmp_path / "a.xlsx", {"EKİM": [("TSH", 450)]})
+    assert xo.onbellekli_satirlari_oku(yol, "EKİM", SUTUN) == [("TSH", 450)]
+    assert pkl_dosyalari(klasor) == []
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import xml.etree.ElementTree as ET
+import zipfile
+
+import pytest
+
+import xml_olusturucu as xo
+
+# =========================================================================
+# TOPLU AKTARIM PAKETİ (--bundle): XML ve ZIP paketi, indeks sayıları/SHA-256 ve ayrıştırılamayan fişler
+# =========================================================================
+
+SAYFALAR = {
+    "a": [("TSH_2000", 2600), ("Glukoz (Serum/Plazma)", 1200), ("Alanin aminotransferaz (ALT)", 450)],
+    "b": [("Üre (Serum/Plazma)", 900)],
+}
+KACISSIZ_FIS = ('<?xml version="1.0" encoding="utf-8"?>\n<Fis>\n<FISNO>90000009</FISNO>\n<CARIID>C</CARIID>\n'
+                "<CARIADI>AĞRI KADIN & ÇOCUK</CARIADI>\n<Satirlar>\n<Satir>\n<STOKKOD>7K6230</STOKKOD>\n"
+                "</Satir>\n</Satirlar>\n</Fis>\n")
+
+
+def dosya_ozeti(yol):
+    with open(yol, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+@pytest.fixture
+def sonuclar(calisma_dizini, sayim_exceli, deneme_configi):
+    """İki hastanenin bu çalıştırmada yazılmış fişlerinin sonuçları."""
+    configs = [deneme_configi(sayim_exceli(f"{onek}.xlsx", {f"{onek.upper()} EKİM SAYIM": satirlar}), onek)
+               for onek, satirlar in SAYFALAR.items()]
+    sonuclar = xo.hastaneleri_isle(configs)
+    assert [sonuc["durum"] for sonuc in sonuclar] == ["BAŞARILI", "BAŞARILI"]
+    return sonuclar
+
+
+def hatali_fis_ekle(sonuclar, ad, metin):
+    yol = os.path.join(xo.TUM_CIKTILAR_YOLU, ad)
+    with open(yol, "w", encoding="utf-8") as f:
+        f.write(metin)
+    return sonuclar[:1] + [{"durum": "BAŞARILI", "cikti": yol}] + sonuclar[1:]
+
+
+def xml_paketini_oku(yol):
+    kok = ET.parse(yol).getroot()
+    assert kok.tag == "Fisler"
+    fisler = kok.findall("Fis")
+    indeks = [{alan.tag: alan.text for alan in kayit} for kayit in kok.find("Indeks")]
+    return fisler, indeks
+
+
+def test_xml_paketi_ve_indeksi(sonuclar):
+    yol = xo.paketi_olustur(sonuclar, "xml")
+    assert os.path.basename(yol) == f"{xo.PAKET_DOSYA_ADI}_{xo.CALISMA_ZAMANI}.xml"
+    assert not os.path.exists(f"{yol}.tmp")
+
+    fisler, indeks = xml_paketini_oku(yol)
+    assert len(fisler) == len(indeks) == 2
+    for sira, (fis, kayit, sonuc) in enumerate(zip(fisler, indeks, sonuclar), 1):
+        assert kayit["SIRANO"] == str(sira)
+        assert kayit["DOSYA"] == os.path.basename(sonuc["cikti"])
+        assert kayit["CARIID"] == fis.findtext("CARIID")
+        assert kayit["FISNO"] == fis.findtext("FISNO")
+        assert kayit["SATIRSAYISI"] == str(len(fis.findall("Satirlar/Satir")))
+        assert kayit["BAYT"] == str(os.path.getsize(sonuc["cikti"]))
+        assert kayit["SHA256"] == dosya_ozeti(sonuc["cikti"])
+    assert [kayit["SATIRSAYISI"] for kayit in indeks] == ["3", "1"]
+
+
+@pytest.mark.parametrize("sikistir", [False, True])
+def test_zip_paketi_ve_indeksi(sonuclar, sikistir):
+    yol = xo.paketi_olustur(sonuclar, "zip", sikistir)
+    with zipfile.ZipFile(yol) as arsiv:
+        assert arsiv.testzip() is None
+        adlar = [os.path.basename(sonuc["cikti"]) for sonuc in sonuclar]
+        assert arsiv.namelist() == adlar + [xo.PAKET_INDEKS_ADI]
+        indeks = json.loads(arsiv.read(xo.PAKET_INDEKS_ADI))
+        for kayit, sonuc in zip(indeks, sonuclar):
+            icerik = arsiv.read(kayit["dosya"])
+            with open(sonuc["cikti"], "rb") as f:
+                assert icerik == f.read()
+            assert kayit["sha256"] == hashlib.sha256(icerik).hexdigest()
+            assert kayit["bayt"] == len(icerik)
+            fis = ET.fromstring(icerik)
+            assert (kayit["cari_id"], kayit["fisno"]) == (fis.findtext("CARIID"), fis.findtext("FISNO"))
+            assert kayit["satir_sayisi"] == len(fis.findall("Satirlar/Satir"))
+            assert "hata" not in kayit
+    assert [kayit["satir_sayisi"] for kayit in indeks] == [3, 1]
+
+
+@pytest.mark.parametrize("metin", [KACISSIZ_FIS, KACISSIZ_FIS.replace(" & ", " ")[:-20]],
+                         ids=["kacissiz_ampersand", "yarim_fis"])
+def test_xml_paketi_hatali_fisi_atlar(sonuclar, metin, capsys):
+    sonuclar = hatali_fis_ekle(sonuclar, "c_islenmis_veri_20261018_120000.xml", metin)
+    yol = xo.paketi_olustur(sonuclar, "xml")
+
+    # Paket geçerli XML kalır; hatalı fiş ne gövdede ne indekste yer alır
+    fisler, indeks = xml_paketini_oku(yol)
+    assert [fis.findtext("CARIID") for fis in fisler] == ["A", "B"]
+    assert [kayit["DOSYA"] for kayit in indeks] == [os.path.basename(sonuclar[0]["cikti"]),
+                                                    os.path.basename(sonuclar[2]["cikti"])]
+    assert [kayit["SIRANO"] for kayit in indeks] == ["1", "2"]
+    assert indeks[1]["SHA256"] == dosya_ozeti(sonuclar[2]["cikti"])
+    cikti = capsys.readouterr().out
+    assert "'c_islenmis_veri_20261018_120000.xml' ayrıştırılamadı, pakete alınmadı" in cikti
+    assert "(2 fiş, 4 satır," in cikti
+
+
+def test_zip_paketi_hatali_fisi_isaretler(sonuclar, capsys):
+    sonuclar = hatali_fis_ekle(sonuclar, "c_islenmis_veri_20261018_120000.xml", KACISSIZ_FIS)
+    yol = xo.paketi_olustur(sonuclar, "zip")
+    with zipfile.ZipFile(yol) as arsiv:
+        indeks = json.loads(arsiv.read(xo.PAKET_INDEKS_ADI))
+        assert arsiv.read("c_islenmis_veri_20261018_120000.xml") == KACISSIZ_FIS.encode("utf-8")
+    hatali = indeks[1]
+    assert hatali["satir_sayisi"] is None
+    assert "hata" in hatali
+    assert hatali["sha256"] == hashlib.sha256(KACISSIZ_FIS.encode("utf-8")).hexdigest()
+    assert [kayit["satir_sayisi"] for kayit in (indeks[0], indeks[2])] == [3, 1]
+    cikti = capsys.readouterr().out
+    assert "indekste hatalı olarak işaretlendi" in cikti
+    assert "(3 fiş, 4 satır," in cikti
+
+
+def test_baska_klasordeki_veya_basarisiz_fis_pakete_girmez(sonuclar, tmp_path, capsys):
+    disarida = tmp_path / "a_islenmis_veri_20261018_120000.xml"
+    disarida.write_text(KACISSIZ_FIS, encoding="utf-8")
+    ek = [{"durum": "BAŞARILI", "cikti": str(disarida)}, {"durum": "HATA", "cikti": sonuclar[0]["cikti"]}]
+    assert xo.paket_fisleri(sonuclar + ek) == [sonuc["cikti"] for sonuc in sonuclar]
+    assert xo.paketi_olustur(ek, "zip") is None
+    assert "bu çalıştırmada yazılmış fiş yok" in capsys.readouterr().out
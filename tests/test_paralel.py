@@ -0,0 +1,149 @@
+import multiprocessing
+import os
+import re
+
+import pytest
+
+import xml_olusturucu as xo
+
+# =========================================================================
+# PARALEL ÇALIŞMA: boru hattı (--prefetch) ve süreç havuzu (--workers) sıralı çalışmayla aynı sonucu verir
+# =========================================================================
+
+SAYFALAR = {
+    "a": {"A EYLÜL SAYIM": [("TSH_2000", 1000)],
+          "A EKİM SAYIM": [("TSH_2000", 2600), ("Glukoz (Serum/Plazma)", 1200), ("Hemogram", 5)]},
+    "d": {"D EKİM SAYIM": [("Üre (Serum/Plazma)", 900), ("Alanin aminotransferaz (ALT)", 450), ("TSH_2000", 0)]},
+}
+MODLAR = {
+    "sirali": {},
+    "boru_hatti": {"on_yukleme": 2},
+    "boru_hatti_derinlik_1": {"on_yukleme": 1},
+    "surec_havuzu": {"workers": 3},
+}
+
+_ASIL_ISCI = xo._hastane_isci
+
+# Çalıştırma anına bağlı alanlar (deterministik mod kapalıyken)
+_DEGISKEN_ALANLAR = re.compile(r"<(FISNO|FISSAAT|SEVKSAAT)>[^<]*</\1>")
+_KARSILASTIRILAN_METRIKLER = ("durum", "sayfa", "taranan_satir", "eslesen_satir", "uretilen_satir", "atlanan",
+                              "eslesmeyen_satirlar")
+
+
+@pytest.fixture
+def configs(calisma_dizini, sayim_exceli, deneme_configi, tmp_path):
+    """Çok aylı bir hastane, iki sağlam hastane ve farklı nedenlerle başarısız olan üç hastane."""
+    a = deneme_configi(sayim_exceli("a.xlsx", SAYFALAR["a"]), "a")
+    bozuk = tmp_path / "c.xlsx"
+    bozuk.write_bytes(b"PK\x03\x04 bozuk excel")
+    return [
+        *xo.aylara_genislet([a], aylar=["EKİM", "EYLÜL"]),
+        deneme_configi(str(tmp_path / "olmayan.xlsx"), "b"),
+        deneme_configi(str(bozuk), "c"),
+        deneme_configi(sayim_exceli("d.xlsx", SAYFALAR["d"]), "d"),
+        deneme_configi(sayim_exceli("e.xlsx", {"E EKİM SAYIM": [("TSH_2000", 1)]}, sutun="BAŞKA SÜTUN"), "e"),
+        deneme_configi(sayim_exceli("f.xlsx", {"F EKİM SAYIM": [("Glukoz (Serum/Plazma)", 300)]}), "f"),
+    ]
+
+
+def fork_gerekli():
+    # Testin değiştirdiği modül durumu işçi süreçlere ancak fork ile geçer
+    if multiprocessing.get_start_method() != "fork":
+        pytest.skip("süreç havuzu testi fork başlatma yöntemi gerektirir")
+
+
+def calistir(configs, mod, tmp_path, monkeypatch):
+    """
+    Hastaneleri verilen modda kendi çıktı klasöründe işler; her hastane için (önek, ay, durum, XML metni,
+    sipariş satırları, metrikler) döndürür.
+    """
+    klasor = str(tmp_path / mod)
+    os.makedirs(klasor)
+    monkeypatch.setattr(xo, "TUM_CIKTILAR_YOLU", klasor)
+    sonuclar = xo.hastaneleri_isle(configs, **MODLAR[mod])
+
+    ozet = []
+    for sonuc in sonuclar:
+        xml = None
+        if sonuc["cikti"]:
+            assert os.path.dirname(sonuc["cikti"]) == klasor
+            with open(sonuc["cikti"], encoding="utf-8") as f:
+                xml = _DEGISKEN_ALANLAR.sub("", f.read())
+        siparis = sonuc["siparis"]
+        satirlar = None if siparis is None else siparis[xo.XML_SATIR_ALANLARI].values.tolist()
+        metrik = {alan: sonuc["metrik"][alan] for alan in _KARSILASTIRILAN_METRIKLER}
+        ozet.append((sonuc["output_prefix"], sonuc["ay"], sonuc["durum"], xml, satirlar, metrik))
+    return ozet
+
+
+def test_sirali_calistirma_hatali_hastanelere_ragmen_tamamlanir(configs, tmp_path, monkeypatch):
+    sonuclar = calistir(configs, "sirali", tmp_path, monkeypatch)
+    assert [(onek, ay, durum) for onek, ay, durum, *_ in sonuclar] == [
+        ("a_islenmis_veri", "EKİM", "BAŞARILI"), ("a_islenmis_veri", "EYLÜL", "BAŞARILI"),
+        ("b_islenmis_veri", None, "BAŞARISIZ"), ("c_islenmis_veri", None, "BAŞARISIZ"),
+        ("d_islenmis_veri", None, "BAŞARILI"), ("e_islenmis_veri", None, "BAŞARISIZ"),
+        ("f_islenmis_veri", None, "BAŞARILI")]
+    for _, _, durum, xml, satirlar, _ in sonuclar:
+        assert (xml is not None) == (satirlar is not None) == (durum == "BAŞARILI")
+
+
+@pytest.mark.parametrize("mod", [mod for mod in MODLAR if mod != "sirali"])
+def test_paralel_calistirma_sirali_ile_ayni(configs, tmp_path, monkeypatch, mod):
+    beklenen = calistir(configs, "sirali", tmp_path, monkeypatch)
+    assert calistir(configs, mod, tmp_path, monkeypatch) == beklenen
+
+
+def _cokan_isci(grup, *argumanlar):
+    if grup[0]["output_prefix"] == "d_islenmis_veri":
+        raise RuntimeError("işçi çöktü")
+    return _ASIL_ISCI(grup, *argumanlar)
+
+
+@pytest.mark.parametrize("mod", list(MODLAR))
+def test_hesaplama_hatasi_diger_hastaneleri_etkilemez(configs, tmp_path, monkeypatch, capsys, mod):
+    if mod == "surec_havuzu":
+        fork_gerekli()
+    beklenen = calistir(configs, "sirali", tmp_path / "beklenen", monkeypatch)
+    asil = xo.siparis_satirlarini_hesapla
+
+    def hesapla(satirlar, *argumanlar, **secenekler):
+        if any(test_adi == "Üre (Serum/Plazma)" for test_adi, _ in satirlar):
+            raise RuntimeError("beklenmeyen hata")
+        return asil(satirlar, *argumanlar, **secenekler)
+
+    monkeypatch.setattr(xo, "siparis_satirlarini_hesapla", hesapla)
+    capsys.readouterr()
+    sonuclar = calistir(configs, mod, tmp_path, monkeypatch)
+    assert "beklenmeyen hata" in capsys.readouterr().out
+    assert sonuclar[4][:5] == ("d_islenmis_veri", None, "BAŞARISIZ", None, None)
+    assert sonuclar[:4] + sonuclar[5:] == beklenen[:4] + beklenen[5:]
+
+
+def test_isci_sureci_hatasi_diger_hastaneleri_etkilemez(configs, tmp_path, monkeypatch, capsys):
+    # İşçi süreci sonuç döndüremezse yalnızca o hastanenin grubu başarısız sayılır
+    fork_gerekli()
+    beklenen = calistir(configs, "sirali", tmp_path / "beklenen", monkeypatch)
+    monkeypatch.setattr(xo, "_hastane_isci", _cokan_isci)
+    capsys.readouterr()
+    sonuclar = calistir(configs, "surec_havuzu", tmp_path, monkeypatch)
+    assert "'D DENEME HASTANESİ' işçi süreci başarısız oldu: işçi çöktü" in capsys.readouterr().out
+    assert sonuclar[4][:5] == ("d_islenmis_veri", None, "BAŞARISIZ", None, None)
+    assert sonuclar[:4] + sonuclar[5:] == beklenen[:4] + beklenen[5:]
+
+
+def test_yazma_hatasi_diger_hastaneleri_etkilemez(configs, tmp_path, monkeypatch, capsys):
+    # Boru hattında arka plandaki yazma başarısız olursa yalnızca o hastane başarısız sayılır
+    beklenen = calistir(configs, "sirali", tmp_path / "beklenen", monkeypatch)
+    asil = xo._xml_yazma_gorevi
+
+    def yazma_gorevi(output_path, *argumanlar, **secenekler):
+        if os.path.basename(output_path).startswith("a_islenmis_veri_EYLÜL"):
+            raise OSError("disk dolu")
+        return asil(output_path, *argumanlar, **secenekler)
+
+    monkeypatch.setattr(xo, "_xml_yazma_gorevi", yazma_gorevi)
+    capsys.readouterr()
+    sonuclar = calistir(configs, "boru_hatti", tmp_path, monkeypatch)
+    assert "XML dosyası yazılamadı: disk dolu" in capsys.readouterr().out
+    assert sonuclar[1][:5] == ("a_islenmis_veri", "EYLÜL", "BAŞARISIZ", None, None)
+    assert sonuclar[:1] + sonuclar[2:] == beklenen[:1] + beklenen[2:]
@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+
+import xml_olusturucu as xo
+
+# =========================================================================
+# PARÇA SİPARİŞ SATIRLARI: merge'ün konsolide özeti, tek makinedeki çalıştırmayla aynı olmalı
+# =========================================================================
+
+SATIRLAR = [("Alanin aminotransferaz (ALT)", 450), ("Glukoz (Serum/Plazma)", 1200), ("TSH_2000", 2600),
+            ("TSH_100", 90), ("Hemogram", 30)]
+
+
+def sonuc_uret(config, ay, carpan):
+    siparis = xo.siparis_satirlarini_hesapla([(ad, ihtiyac * carpan) for ad, ihtiyac in SATIRLAR],
+                                             xo.hastane_kit_tablosu(config), config["apply_min_roundup"])
+    return dict(config, ay=ay), {
+        "durum": "BAŞARILI",
+        "siparis": siparis.assign(cari_id=config["cari_id"], output_prefix=config["output_prefix"], ay=ay),
+    }
+
+
+@pytest.mark.parametrize("aylar", [[None], ["EYLÜL", "EKİM"]])
+def test_parcalardan_konsolide_ozet_ayni(tmp_path, monkeypatch, aylar):
+    xo.agir_modulleri_yukle()
+    ciftler = [sonuc_uret(config, ay, carpan)
+               for carpan, config in enumerate(xo.HASTANE_CONFIGS[:4], 1) for ay in aylar]
+    # Hastaneler iki parçaya bölünür; her parça kendi klasörüne yazar
+    parcalar = [ciftler[::2], ciftler[1::2]]
+
+    okunan = []
+    for i, parca in enumerate(parcalar):
+        klasor = tmp_path / str(i)
+        klasor.mkdir()
+        monkeypatch.setattr(xo, "TUM_CIKTILAR_YOLU", str(klasor))
+        xo.parca_siparisini_yaz([config for config, _ in parca], [sonuc for _, sonuc in parca])
+        tablolar = xo.parca_siparisini_oku(str(klasor))
+        okunan.extend({"siparis": tablolar.get(xo.manifest_anahtari(config))} for config, _ in parca)
+
+    beklenen = xo.konsolide_siparis_ozeti([sonuc for _, sonuc in ciftler])
+    birlesik = xo.konsolide_siparis_ozeti(okunan)
+    pd.testing.assert_frame_equal(birlesik, beklenen, check_dtype=False)
+
+
+def test_siparissiz_parca(tmp_path, monkeypatch):
+    monkeypatch.setattr(xo, "TUM_CIKTILAR_YOLU", str(tmp_path))
+    assert xo.parca_siparisini_yaz(xo.HASTANE_CONFIGS[:1], [{"durum": "ATLANDI", "siparis": None}]) is None
+    assert xo.parca_siparisini_oku(str(tmp_path)) == {}
+
+
+def test_izleme_ve_parca_birlikte_reddedilir(capsys):
+    with pytest.raises(SystemExit):
+        xo.argumanlari_oku(["--watch", "--shard", "1/2"])
+    assert "--shard" in capsys.readouterr().err
+    assert xo.argumanlari_oku(["--shard", "1/2"]).parca == (1, 2)
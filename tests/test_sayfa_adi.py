@@ -0,0 +1,103 @@
+import io
+import zipfile
+
+import pytest
+from openpyxl import Workbook
+
+import xml_olusturucu as xo
+
+# =========================================================================
+# SAYFA ADI ÇÖZÜMLEME: her hastanenin siparişinin hangi sayfadan okunacağını belirler
+# =========================================================================
+
+
+def excel_baytlari(sayfa_adlari):
+    wb = Workbook()
+    wb.active.title = sayfa_adlari[0]
+    for ad in sayfa_adlari[1:]:
+        wb.create_sheet(ad)
+    tampon = io.BytesIO()
+    wb.save(tampon)
+    return tampon.getvalue()
+
+
+def test_sayfa_adlari_workbook_xmlden_sirasiyla_okunur():
+    adlar = ["ARDAHAN DH EYLÜL SAYIM", "ATATÜRK ÜNi. EKİM SAYIM", "Özet & Notlar"]
+    assert xo.sayfa_adlarini_ayikla(io.BytesIO(excel_baytlari(adlar))) == adlar
+
+
+def test_strict_ad_alanli_workbook_xml():
+    tampon = io.BytesIO()
+    with zipfile.ZipFile(tampon, "w") as arsiv:
+        arsiv.writestr("xl/workbook.xml",
+                       '<workbook xmlns="http://purl.oclc.org/ooxml/spreadsheetml/main"><sheets>'
+                       '<sheet name="POSOF DH EKİM SAYIM" sheetId="1"/><sheet name="İKİNCİ" sheetId="2"/>'
+                       '</sheets></workbook>')
+    assert xo.sayfa_adlarini_ayikla(tampon) == ["POSOF DH EKİM SAYIM", "İKİNCİ"]
+
+
+def test_workbook_xml_olmayan_arsiv_hata_verir():
+    tampon = io.BytesIO()
+    with zipfile.ZipFile(tampon, "w") as arsiv:
+        arsiv.writestr("baska.txt", "x")
+    with pytest.raises(KeyError):
+        xo.sayfa_adlarini_ayikla(tampon)
+
+
+def test_birebir_ad():
+    adlar = ["POSOF DH EYLÜL SAYIM", "POSOF DH EKİM SAYIM"]
+    assert xo.sayfa_adini_coz(adlar, "POSOF DH", "EKİM") == "POSOF DH EKİM SAYIM"
+
+
+def test_birebir_ad_varyantlardan_once_gelir():
+    adlar = ["posof dh ekim sayım", "POSOF DH EKİM SAYIM", "POSOF DH EKİM SAYIM "]
+    assert xo.sayfa_adini_coz(adlar, "POSOF DH", "EKİM") == "POSOF DH EKİM SAYIM"
+
+
+@pytest.mark.parametrize("gercek_ad, on_ek, ay", [
+    # Büyük/küçük harf ve Türkçe İ/I/ı/i farkı
+    ("ATATÜRK ÜNi. EYLÜL SAYIM", "ATATÜRK ÜNİ.", "EYLÜL"),
+    ("Iğdır dh ekim sayım", "IĞDIR DH", "EKİM"),
+    # Noktalama ve fazla boşluk
+    ("ATATÜRK  ÜNİ EYLÜL SAYIM ", "ATATÜRK ÜNİ.", "EYLÜL"),
+    # Ön ekle başlayan, ay adı ile SAYIM kelimesini içeren tek sayfa
+    ("GÖLE DH EKİM 2025 SAYIM", "GÖLE DH", "EKİM"),
+])
+def test_turkce_ve_buyuk_kucuk_harf_varyanti(gercek_ad, on_ek, ay):
+    assert xo.sayfa_adini_coz(["ÖZET", gercek_ad], on_ek, ay) == gercek_ad
+
+
+@pytest.mark.parametrize("adlar", [
+    ["POSOF DH EYLÜL SAYIM", "POSOF DH KASIM SAYIM"],
+    # Ay var ama başka bir hastanenin ön ekiyle
+    ["GÖLE DH EKİM SAYIM"],
+    # Ön ek ve ay var, SAYIM kelimesi yok
+    ["POSOF DH EKİM"],
+    [],
+])
+def test_ay_sayfasi_yoksa_none(adlar):
+    assert xo.sayfa_adini_coz(adlar, "POSOF DH", "EKİM") is None
+
+
+@pytest.mark.parametrize("adlar", [
+    # Normalize edilince ikisi de beklenen ada eşit
+    ["posof dh ekim sayım", "POSOF DH EKİM SAYIM "],
+    # Birebir/normalize eşleşme yok, gevşek eşleşmeye iki aday uyuyor
+    ["POSOF DH EKİM 2024 SAYIM", "POSOF DH EKİM 2025 SAYIM"],
+])
+def test_birden_fazla_aday_tahmin_edilmez(adlar):
+    assert xo.sayfa_adini_coz(adlar, "POSOF DH", "EKİM") is None
+
+
+def test_sayfa_listesi_dosya_degisince_yeniden_okunur(tmp_path):
+    yol = tmp_path / "sayim.xlsx"
+    yol.write_bytes(excel_baytlari(["A EKİM SAYIM"]))
+    assert xo.sayfa_adlarini_oku(str(yol)) == ["A EKİM SAYIM"]
+    yol.write_bytes(excel_baytlari(["A EKİM SAYIM", "A KASIM SAYIM"]))
+    assert xo.sayfa_adlarini_oku(str(yol)) == ["A EKİM SAYIM", "A KASIM SAYIM"]
+
+
+@pytest.mark.parametrize("metin, ay", [("Ekim", "EKİM"), ("ekim", "EKİM"), ("SUBAT", None), ("şubat", "ŞUBAT"),
+                                       ("AGUSTOS", None), ("aralık", "ARALIK"), ("Mart ", "MART"), ("", None)])
+def test_ay_adini_bul(metin, ay):
+    assert xo.ay_adini_bul(metin) == ay
@@ -0,0 +1,123 @@
+import math
+import random
+
+import pandas as pd
+import pytest
+
+import xml_olusturucu as xo
+
+# =========================================================================
+# SÜTUN BAZLI SİPARİŞ MOTORU: eski satır satır döngüyle birebir aynı satırlar
+# =========================================================================
+
+
+def eski_motor(satirlar, config):
+    """
+    Sütun bazlı motordan önceki satır satır algoritma (yalnızca birebir test adı eşleşmesiyle),
+    karşılaştırma için aynen korunmuştur. 9'lu XML satırlarının listesini döndürür.
+    """
+    hospital_kit_map = xo.kit_eslestirmelerini_birlestir(config)
+    apply_min_roundup = config["apply_min_roundup"]
+    xml_lines_data = []
+    for test_adi_raw, ihtiyac_miktari_raw in satirlar:
+        if pd.isna(test_adi_raw):
+            continue
+        test_adi = str(test_adi_raw).strip()
+        stok_map_key = hospital_kit_map.get(test_adi, test_adi)
+        if stok_map_key not in xo.STOK_MAP:
+            continue
+        stok_bilgisi = xo.STOK_MAP[stok_map_key]
+
+        TEST_PER_KUTU = stok_bilgisi[9]
+        SET_PER_KUTU = stok_bilgisi[10]
+        if SET_PER_KUTU <= 0:
+            TEST_PER_SET = TEST_PER_KUTU
+            if TEST_PER_SET == 0:
+                TEST_PER_SET = 1
+        else:
+            TEST_PER_SET = TEST_PER_KUTU / SET_PER_KUTU
+
+        if pd.isna(ihtiyac_miktari_raw):
+            continue
+        try:
+            ihtiyac_miktari = int(ihtiyac_miktari_raw)
+        except (ValueError, TypeError, OverflowError):
+            # Eski döngü sonsuz hücrede (OverflowError) hastanenin tamamını düşürürdü; yeni motor satırı atlar.
+            continue
+
+        istenilen_set_miktari = 0
+        if ihtiyac_miktari <= 0:
+            if ihtiyac_miktari == 0 and apply_min_roundup:
+                istenilen_set_miktari = 1
+            else:
+                continue
+        elif ihtiyac_miktari > 0:
+            istenilen_set_miktari = math.ceil(ihtiyac_miktari / TEST_PER_SET)
+
+        xml_test_miktari = istenilen_set_miktari * TEST_PER_SET
+        miktar_str = str(int(xml_test_miktari))
+
+        ozelalan1_str = ""
+        if SET_PER_KUTU > 0 and istenilen_set_miktari > 0:
+            tam_kutu_sayisi = istenilen_set_miktari // SET_PER_KUTU
+            kalan_set_sayisi = istenilen_set_miktari % SET_PER_KUTU
+            if tam_kutu_sayisi > 0:
+                ozelalan1_str += f"{tam_kutu_sayisi}K"
+            if kalan_set_sayisi > 0:
+                if ozelalan1_str:
+                    ozelalan1_str += " + "
+                ozelalan1_str += f"{kalan_set_sayisi}SET"
+            if not ozelalan1_str and istenilen_set_miktari > 0 and tam_kutu_sayisi > 0:
+                ozelalan1_str = f"{tam_kutu_sayisi}K"
+        elif istenilen_set_miktari > 0:
+            ozelalan1_str = f"{istenilen_set_miktari}SET"
+
+        xml_lines_data.append((stok_bilgisi[0], stok_bilgisi[1], miktar_str, "TEST", stok_bilgisi[4],
+                               stok_bilgisi[5], stok_bilgisi[6], ozelalan1_str, stok_bilgisi[8]))
+    return xml_lines_data
+
+
+# Sayım sayfalarında rastlanan ihtiyaç hücreleri: boş, NaN, ondalık, negatif, sıfır, metin, mantıksal
+DAGINIK_IHTIYACLAR = [None, float("nan"), 0, 0.0, "0", -1, -250, -0.5, 0.4, 12.7, -2.5, 1, 99, 100, 101,
+                      499, 500, 501, 2000, 123456, "12", " 7 ", "12.5", "abc", "", "-3", True, False,
+                      float("inf"), 3.0, 1e6]
+
+
+def daginik_sayfa(config, satir_sayisi, tohum):
+    """Hastanenin tablosundaki adlar, boşluklu yazımlar, tanımsız adlar ve karışık ihtiyaçlarla sayfa üretir."""
+    rastgele = random.Random(tohum)
+    adlar = sorted(set(xo.STOK_MAP) | set(xo.kit_eslestirmelerini_birlestir(config)))
+    adlar += [f"  {adlar[0]} ", "Hemogram", "Tanımsız Test", "", None, float("nan"), 42]
+    satirlar = []
+    for _ in range(satir_sayisi):
+        if rastgele.random() < 0.5:
+            ihtiyac = rastgele.choice(DAGINIK_IHTIYACLAR)
+        else:
+            ihtiyac = rastgele.randint(-100, 8000)
+        satirlar.append((rastgele.choice(adlar), ihtiyac))
+    return satirlar
+
+
+@pytest.mark.parametrize("min_yuvarlama", [True, False])
+@pytest.mark.parametrize("config_no", range(len(xo.HASTANE_CONFIGS)))
+def test_sutun_motoru_eski_donguyle_ayni(config_no, min_yuvarlama):
+    config = dict(xo.HASTANE_CONFIGS[config_no], apply_min_roundup=min_yuvarlama)
+    satirlar = daginik_sayfa(config, 3000, tohum=config_no)
+
+    siparis = xo.siparis_satirlarini_hesapla(satirlar, xo.hastane_kit_tablosu(config), min_yuvarlama)
+    yeni = [tuple(str(alan) for alan in satir) for satir in xo.xml_satirlarina_cevir(siparis)]
+    eski = eski_motor(satirlar, config)
+
+    assert len(yeni) == len(eski)
+    for sira, (yeni_satir, eski_satir) in enumerate(zip(yeni, eski)):
+        assert yeni_satir == eski_satir, f"{sira}. satır farklı"
+
+
+@pytest.mark.parametrize("kolon", [[None] * 5, [float("nan")] * 5, ["x", "y", "z", "", "q"], [0] * 5])
+def test_tamamen_gecersiz_veya_sifir_sutun(kolon):
+    config = xo.HASTANE_CONFIGS[0]
+    satirlar = list(zip(["TSH"] * len(kolon), kolon))
+    for min_yuvarlama in (True, False):
+        siparis = xo.siparis_satirlarini_hesapla(satirlar, xo.hastane_kit_tablosu(config), min_yuvarlama)
+        beklenen = eski_motor(satirlar, dict(config, apply_min_roundup=min_yuvarlama))
+        assert [tuple(map(str, satir)) for satir in xo.xml_satirlarina_cevir(siparis)] == beklenen
@@ -0,0 +1,165 @@
+import datetime
+import sqlite3
+
+import pytest
+
+import xml_olusturucu as xo
+
+# =========================================================================
+# TALEP GEÇMİŞİ: şema oluşturma, çalıştırma satırlarının eklenmesi ve history raporları (geçici veritabanı)
+# =========================================================================
+
+SAYFALAR = {
+    "a": {"A EKİM SAYIM": [("TSH_2000", 2600), ("Glukoz (Serum/Plazma)", 1200)],
+          "A EYLÜL SAYIM": [("TSH_2000", 1000)]},
+    "b": {"B EKİM SAYIM": [("Üre (Serum/Plazma)", 900), ("TSH_2000", 100)]},
+}
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "gecmis" / "talep_gecmisi.sqlite")
+
+
+@pytest.fixture
+def calistir(calisma_dizini, sayim_exceli, deneme_configi, monkeypatch, db):
+    """Verilen (önek, ay) hastanelerini CALISMA_ZAMANI anında işleyip talep geçmişine ekler."""
+
+    def calistir(hastaneler, zaman="20261018_120000", sayfalar=SAYFALAR):
+        monkeypatch.setattr(xo, "CALISMA_ZAMANI", zaman)
+        configs = [deneme_configi(sayim_exceli(f"{onek}.xlsx", sayfalar[onek]), onek, ay)
+                   for onek, ay in hastaneler]
+        sonuclar = xo.hastaneleri_isle(configs)
+        return configs, sonuclar, xo.talep_gecmisine_ekle(configs, sonuclar, db)
+
+    return calistir
+
+
+def stok_kodu(kit):
+    return xo.KIT_KATALOGU[kit].stok_kodu
+
+
+def rapor_satirlari(capsys):
+    """Rapor tablosunun başlıksız satırları; her satır [CARIID, STOKKOD, DÖNEM, İHTİYAÇ, SET, TEST, ...]."""
+    return [satir.split() for satir in capsys.readouterr().out.splitlines() if satir.startswith("  ")][1:]
+
+
+def test_sema_olusturulur(db):
+    baglanti = xo.talep_gecmisini_ac(db)
+    try:
+        tablolar = {ad for (ad,) in baglanti.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        assert tablolar == {"fisler", "satirlar"}
+        assert baglanti.execute("PRAGMA user_version").fetchone()[0] == xo.TALEP_GECMISI_SURUMU
+    finally:
+        baglanti.close()
+    # Yeniden açmak şemayı bozmaz
+    xo.talep_gecmisini_ac(db).close()
+
+
+def test_yeni_surum_veritabani_acilmaz(db):
+    xo.talep_gecmisini_ac(db).close()
+    baglanti = sqlite3.connect(db)
+    baglanti.execute(f"PRAGMA user_version = {xo.TALEP_GECMISI_SURUMU + 1}")
+    baglanti.close()
+    with pytest.raises(sqlite3.DatabaseError, match="daha yeni bir sürümle"):
+        xo.talep_gecmisini_ac(db)
+
+
+@pytest.mark.parametrize("ay, zaman, donem", [
+    ("EKİM", datetime.datetime(2026, 10, 18), "2026-10"),
+    ("EYLÜL", datetime.datetime(2026, 10, 18), "2026-09"),
+    ("KASIM", datetime.datetime(2026, 10, 18), "2025-11"),
+    ("ARALIK", datetime.datetime(2027, 1, 3), "2026-12"),
+])
+def test_ay_donemi(ay, zaman, donem):
+    assert xo.ay_donemi(ay, zaman) == donem
+
+
+def test_satirlar_eklenir(calistir, db):
+    configs, sonuclar, eklenen = calistir([("a", "EKİM"), ("b", "EKİM")])
+    assert eklenen == sum(len(sonuc["siparis"]) for sonuc in sonuclar) == 4
+
+    baglanti = sqlite3.connect(db)
+    try:
+        fisler = baglanti.execute("SELECT calisma, output_prefix, cari_id, ay, donem, cikti FROM fisler "
+                                  "ORDER BY fis_id").fetchall()
+        assert fisler == [("20261018_120000", config["output_prefix"], config["cari_id"], "EKİM", "2026-10",
+                           sonuc["cikti"]) for config, sonuc in zip(configs, sonuclar)]
+        satirlar = baglanti.execute("SELECT cari_id, test_adi, kit_anahtari, stok_kodu, ihtiyac, set_sayisi, "
+                                    "test_miktari, ozelalan1 FROM satirlar WHERE cari_id = 'A' ORDER BY rowid").fetchall()
+    finally:
+        baglanti.close()
+    siparis = sonuclar[0]["siparis"]
+    assert satirlar == list(zip(["A"] * len(siparis), siparis["test_adi"], siparis["stok_map_key"],
+                                siparis["stok_kodu"], siparis["ihtiyac"], siparis["set_sayisi"],
+                                siparis["test_miktari"], siparis["ozelalan1"]))
+
+
+def test_siparisi_olmayan_sonuc_eklenmez(calistir, db):
+    configs, sonuclar, _ = calistir([("a", "EKİM")])
+    sonuclar = [dict(sonuclar[0], durum="ATLANDI", siparis=None)]
+    assert xo.talep_gecmisine_ekle(configs, sonuclar, db) == 0
+    baglanti = sqlite3.connect(db)
+    assert baglanti.execute("SELECT COUNT(*) FROM fisler").fetchone()[0] == 1
+    baglanti.close()
+
+
+def test_toplam_raporu(calistir, db, capsys):
+    calistir([("a", "EKİM"), ("b", "EKİM")])
+    capsys.readouterr()
+    assert xo.gecmis_raporu("toplam", son_ay=0, yol=db) == 0
+    satirlar = rapor_satirlari(capsys)
+    assert sorted(satir[:3] for satir in satirlar if satir[1] != "TOPLAM") == sorted([
+        ["A", stok_kodu("TSH_2000"), "2026-10"], ["A", stok_kodu("Glukoz (Serum/Plazma)"), "2026-10"],
+        ["B", stok_kodu("TSH_2000"), "2026-10"], ["B", stok_kodu("Üre (Serum/Plazma)"), "2026-10"]])
+    assert ["A", stok_kodu("TSH_2000"), "2026-10", "2600", "6", "3000"] in [satir[:6] for satir in satirlar]
+    assert ["A", "TOPLAM", "3800", "4200"] in satirlar
+
+
+def test_trend_raporu_ay_ay_dokum_verir(calistir, db, capsys):
+    calistir([("a", "EKİM"), ("a", "EYLÜL")])
+    capsys.readouterr()
+    assert xo.gecmis_raporu("trend", cari="a", stok="TSH", son_ay=0, yol=db) == 0
+    satirlar = rapor_satirlari(capsys)
+    assert [satir[:4] for satir in satirlar if satir[1] != "TOPLAM"] == [
+        ["A", stok_kodu("TSH_2000"), "2026-09", "1000"], ["A", stok_kodu("TSH_2000"), "2026-10", "2600"]]
+
+    # Toplam raporunda iki dönem tek satırda birleşir
+    assert xo.gecmis_raporu("toplam", cari="A DENEME", stok="TSH_2000", son_ay=0, yol=db) == 0
+    assert [satir[:6] for satir in rapor_satirlari(capsys)] == [
+        ["A", stok_kodu("TSH_2000"), "2026-09..2026-10", "(2)", "3600", "8"]]
+
+
+def test_ayni_donem_yeniden_islenirse_son_fis_kullanilir(calistir, db, capsys):
+    calistir([("a", "EKİM")])
+    # İzleme modundaki gibi aynı hastane ve dönem yeni bir Excel ile yeniden işlenir
+    calistir([("a", "EKİM")], zaman="20261018_130000", sayfalar={"a": {"A EKİM SAYIM": [("TSH_2000", 5000)]}})
+    capsys.readouterr()
+    assert xo.gecmis_raporu("toplam", cari="a", son_ay=0, yol=db) == 0
+    assert [satir[:4] for satir in rapor_satirlari(capsys)] == [["A", stok_kodu("TSH_2000"), "2026-10", "5000"]]
+
+
+def test_son_ay_eski_donemleri_disarida_birakir(calistir, db, capsys):
+    calistir([("a", "EKİM")], zaman="20200115_120000")
+    calistir([("b", "EKİM")], zaman=datetime.datetime.now().strftime("%Y%m%d_%H%M%S"))
+    capsys.readouterr()
+    assert xo.gecmis_raporu("toplam", son_ay=0, yol=db) == 0
+    assert {satir[0] for satir in rapor_satirlari(capsys)} == {"A", "B"}
+    assert xo.gecmis_raporu("toplam", son_ay=13, yol=db) == 0
+    assert {satir[0] for satir in rapor_satirlari(capsys)} == {"B"}
+
+
+@pytest.mark.parametrize("filtre, mesaj", [
+    ({"cari": "olmayan hastane"}, "Geçmişte 'olmayan hastane' ile eşleşen hastane yok."),
+    ({"stok": "OLMAYAN_KIT"}, "Kit kataloğunda 'OLMAYAN_KIT' ile eşleşen kit yok."),
+])
+def test_eslesmeyen_filtre_hata_verir(calistir, db, capsys, filtre, mesaj):
+    calistir([("a", "EKİM")])
+    capsys.readouterr()
+    assert xo.gecmis_raporu("toplam", yol=db, **filtre) == 1
+    assert mesaj in capsys.readouterr().out
+
+
+def test_gecmis_yoksa_hata_verir(db, capsys):
+    assert xo.gecmis_raporu("toplam", yol=db) == 1
+    assert "Talep geçmişi bulunamadı" in capsys.readouterr().out
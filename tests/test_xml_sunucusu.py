@@ -0,0 +1,174 @@
+import io
+import json
+import socket
+import sys
+import threading
+import urllib.error
+import urllib.request
+import xml.etree.ElementTree as ET
+from urllib.parse import quote
+
+import pytest
+from openpyxl import Workbook
+
+import xml_olusturucu as xo
+import xml_sunucusu as xs
+
+# =========================================================================
+# YEREL HTTP SERVİSİ: sunucu 127.0.0.1'de boş bir portta (port 0) bir iş parçacığında çalışır
+# =========================================================================
+
+CONFIG = next(c for c in xo.HASTANE_CONFIGS if c["cari_id"] == "POSOF")
+SATIRLAR = [("Alanin aminotransferaz (ALT)", 450), ("Glukoz (Serum/Plazma)", 1200), ("Hemogram", 30),
+            ("Üre (Serum/Plazma)", 0), ("TSH_2000", "abc"), (None, 10), ("TSH_2000", 2600)]
+
+
+def sayim_exceli(sayfa_adi, satirlar=SATIRLAR):
+    """POSOF biçiminde tek sayfalık bir sayım Excel'i (bayt) üretir."""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = sayfa_adi
+    ws.append(["SIRA", xo.TEST_ADI_SUTUNU, CONFIG["ihtiyac_sutunu"]])
+    for sira, (test_adi, ihtiyac) in enumerate(satirlar, 1):
+        ws.append([sira, test_adi, ihtiyac])
+    tampon = io.BytesIO()
+    wb.save(tampon)
+    return tampon.getvalue()
+
+
+def sunucu_baslat(isci=2, kuyruk=4):
+    sunucu = xs.FisSunucusu(("127.0.0.1", 0), isci_sayisi=isci, kuyruk=kuyruk)
+    threading.Thread(target=sunucu.serve_forever, daemon=True).start()
+    return sunucu
+
+
+def sunucuyu_durdur(sunucu):
+    sunucu.shutdown()
+    sunucu.server_close()
+
+
+@pytest.fixture
+def sunucu():
+    sunucu = sunucu_baslat()
+    yield f"http://127.0.0.1:{sunucu.server_port}"
+    sunucuyu_durdur(sunucu)
+
+
+def istek(adres, govde=None, yontem=None):
+    """(HTTP kodu, başlıklar, gövde) döndürür; hata kodları da istisna yerine döner."""
+    try:
+        with urllib.request.urlopen(urllib.request.Request(adres, data=govde, method=yontem), timeout=30) as cevap:
+            return cevap.status, cevap.headers, cevap.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def test_saglik(sunucu):
+    kod, _, govde = istek(f"{sunucu}/saglik")
+    assert kod == 200
+    assert json.loads(govde) == {"durum": "hazir", "isci": 2, "hastane": len(xo.HASTANE_CONFIGS),
+                                 "stok_map": len(xo.STOK_MAP)}
+
+
+def test_yuklenen_excel_xml(sunucu):
+    kod, basliklar, govde = istek(f"{sunucu}/fis?config={CONFIG['output_prefix']}&ay=ekim",
+                                  sayim_exceli(f"{CONFIG['sheet_prefix']} EKİM SAYIM"))
+    assert kod == 200
+    assert basliklar["Content-Type"].startswith("application/xml")
+    assert "filename*=UTF-8''posof_islenmis_veri_EK%C4%B0M_" in basliklar["Content-Disposition"]
+
+    kok = ET.fromstring(govde)
+    beklenen = xo.xml_satirlarina_cevir(xo.siparis_satirlarini_hesapla(
+        SATIRLAR, xo.hastane_kit_tablosu(CONFIG), CONFIG["apply_min_roundup"]))
+    satirlar = kok.find("Satirlar").findall("Satir")
+    assert kok.findtext("CARIID") == CONFIG["cari_id"]
+    assert int(basliklar["X-Uretilen-Satir"]) == len(satirlar) == len(beklenen)
+    assert [(s.findtext("STOKKOD"), s.findtext("MIKTAR"), s.findtext("OZELALAN1")) for s in satirlar] == \
+           [(satir[0], satir[2], satir[7]) for satir in beklenen]
+
+
+def test_yuklenen_excel_json(sunucu):
+    kod, basliklar, govde = istek(f"{sunucu}/fis?cari_id=posof&ay={quote('EKİM')}&bicim=json",
+                                  sayim_exceli(f"{CONFIG['sheet_prefix']} EKİM SAYIM"))
+    assert kod == 200
+    assert basliklar["Content-Type"].startswith("application/json")
+    veri = json.loads(govde)
+    assert (veri["cari_id"], veri["config"], veri["sayfa"]) == (CONFIG["cari_id"], CONFIG["output_prefix"],
+                                                               f"{CONFIG['sheet_prefix']} EKİM SAYIM")
+    beklenen = xo.xml_satirlarina_cevir(xo.siparis_satirlarini_hesapla(
+        SATIRLAR, xo.hastane_kit_tablosu(CONFIG), CONFIG["apply_min_roundup"]))
+    assert [tuple(satir[alan] for alan in xo.XML_SATIR_ALANLARI) for satir in veri["satirlar"]] == \
+           [tuple(satir) for satir in beklenen]
+    assert veri["metrik"]["taranan_satir"] == len(SATIRLAR)
+    assert veri["metrik"]["uretilen_satir"] == len(veri["satirlar"])
+    assert veri["metrik"]["eslesmeyen_satirlar"] == {"Hemogram": [4]}
+
+
+def test_gomulu_sunucu_istek_gunlugunu_yakalar():
+    # main() kullanılmadan kurulan sunucu stdout'u kendisi sarar ve kapanınca eski haline döndürür
+    sunucu = sunucu_baslat()
+    try:
+        assert sys.stdout is sunucu.cikti
+        with sunucu.cikti.yakala() as cikti:
+            xo.GUNLUK.warning("istek günlüğü")
+        assert cikti.getvalue() == "istek günlüğü\n"
+        assert istek(f"http://127.0.0.1:{sunucu.server_port}/fis?config={CONFIG['output_prefix']}&ay=ekim",
+                     sayim_exceli(f"{CONFIG['sheet_prefix']} EKİM SAYIM"))[0] == 200
+    finally:
+        sunucuyu_durdur(sunucu)
+    assert not isinstance(sys.stdout, xs.IsParcacigiCiktisi)
+
+
+@pytest.mark.parametrize("yontem, yol, kod", [
+    ("GET", "/bilinmeyen", 404),
+    ("POST", "/bilinmeyen", 404),
+    ("POST", "/fis?config=yok_boyle_bir_onek", 404),
+    ("POST", "/fis?cari_id=YOK", 404),
+])
+def test_bulunamadi(sunucu, yontem, yol, kod):
+    durum, _, govde = istek(f"{sunucu}{yol}", b"" if yontem == "POST" else None, yontem)
+    assert durum == kod
+    assert "hata" in json.loads(govde)
+
+
+def test_gecersiz_excel_422(sunucu):
+    kod, _, govde = istek(f"{sunucu}/fis?config={CONFIG['output_prefix']}", b"bu bir xlsx degil")
+    assert kod == 422
+    assert ".xlsx" in json.loads(govde)["hata"]
+
+
+def test_sayfa_bulunamadi_422(sunucu):
+    kod, _, govde = istek(f"{sunucu}/fis?config={CONFIG['output_prefix']}&ay=ekim",
+                          sayim_exceli("BAŞKA BİR SAYFA"))
+    assert kod == 422
+    assert "beklenen sayfa adı bulunamadı" in json.loads(govde)["hata"]
+
+
+def test_dolu_sunucu_503():
+    sunucu = sunucu_baslat(isci=1, kuyruk=0)
+    try:
+        # Tek yer, başlıkları bitmemiş bir istekle tutulur; işçi onun gövdesini bekler
+        mesgul = socket.create_connection(("127.0.0.1", sunucu.server_port))
+        mesgul.sendall(b"GET /saglik HTTP/1.1\r\nHost: 127.0.0.1\r\n")
+        # İlk bağlantı kabul edilene kadar beklenir (yer alınmış olur)
+        for _ in range(200):
+            if sunucu.yerler._value == 0:
+                break
+            threading.Event().wait(0.01)
+
+        kod, basliklar, govde = istek(f"http://127.0.0.1:{sunucu.server_port}/saglik")
+        assert kod == 503
+        assert basliklar["Retry-After"] == "1"
+        assert "meşgul" in json.loads(govde)["hata"]
+
+        # Yer boşalınca istekler yeniden kabul edilir
+        mesgul.sendall(b"\r\n")
+        mesgul.recv(65536)
+        mesgul.close()
+        for _ in range(200):
+            if sunucu.yerler._value == 1:
+                break
+            threading.Event().wait(0.01)
+        assert istek(f"http://127.0.0.1:{sunucu.server_port}/saglik")[0] == 200
+    finally:
+        sunucuyu_durdur(sunucu)
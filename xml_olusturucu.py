@@ -1,10 +1,64 @@
-import pandas as pd
 import datetime
 import math
 import re
 import random
 import os
+import platform
 import sys
+import importlib
+import io
+import json
+import logging
+import pickle
+import queue
+import shutil
+import sqlite3
+import hashlib
+import argparse
+import atexit
+import contextlib
+import threading
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+
+class _TembelModul:
+    """
+    Ağır bağımlılıklar (pandas, numpy, openpyxl) için vekil: modül ilk öznitelik erişiminde içe aktarılır
+    ve bu modüldeki ad gerçek modülle değiştirilir. Excel okumayan komutlar (list, validate-config,
+    show-kit) ve modülü içe aktaran diğer araçlar bu kütüphanelerin yüklenme süresini ödemez; Excel
+    işleyen yollar ise onları agir_modulleri_yukle ile, süre ölçümü başlamadan yükler.
+    """
+
+    def __init__(self, ad, modul_adi):
+        self._ad = ad
+        self._modul_adi = modul_adi
+
+    def __getattr__(self, oznitelik):
+        modul = importlib.import_module(self._modul_adi)
+        globals()[self._ad] = modul
+        return getattr(modul, oznitelik)
+
+
+pd = _TembelModul("pd", "pandas")
+np = _TembelModul("np", "numpy")
+openpyxl = _TembelModul("openpyxl", "openpyxl")
+
+
+def agir_modulleri_yukle():
+    """
+    pandas, numpy ve openpyxl'i hemen içe aktarır. Excel işleyen yollar (çalıştırma, işçi süreç, sunucu)
+    bunu hiçbir faz süresi başlamadan çağırır; aksi halde yüklenme süresi ilk hastanenin "hesaplama"
+    fazına karışır ve metrikleri bozar. Kit kataloğu da aynı nedenle burada derlenir.
+    """
+    for vekil in (pd, np, openpyxl):
+        if isinstance(vekil, _TembelModul):
+            globals()[vekil._ad] = importlib.import_module(vekil._modul_adi)
+    if isinstance(KIT_KATALOGU, _TembelKatalog):
+        KIT_KATALOGU._derle()
 
 # =========================================================================
 # 1. KLASÖR YÖNETİMİ VE ÇIKTI TANIMLARI
@@ -13,10 +67,165 @@ import sys
 # Merkeze bir çıktı klasörü tanımlayın. Bu klasör, script'in çalıştığı yerde oluşur.
 MERKEZI_KLASOR_ADI = "XML_Ciktilar"
 
-# Her çalıştırmada benzersiz bir alt klasör oluşturmak için zaman damgası
-CALISMA_ZAMANI = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+# Her çalıştırmada benzersiz bir alt klasör oluşturmak için zaman damgası. İçe aktarmada değil,
+# çalıştırma başlarken (yeni_calisma_klasoru) belirlenir; list / validate-config gibi komutlar ve modülü
+# içe aktaran araçlar çalıştırma klasörüyle ilgilenmez.
+CALISMA_ZAMANI = None
 # Örn: XML_Ciktilar/20251008_154700
-TUM_CIKTILAR_YOLU = os.path.join(MERKEZI_KLASOR_ADI, CALISMA_ZAMANI)
+TUM_CIKTILAR_YOLU = None
+
+# Deterministik modda fişlerin içerik özetiyle (SHA-256) adlandırılıp saklandığı klasör
+ICERIK_DEPOSU = os.path.join(MERKEZI_KLASOR_ADI, "Icerik_Deposu")
+
+# Ayrıştırılmış Excel sütunlarının saklandığı önbellek klasörü (XML_Ciktilar ile aynı yerde oluşur)
+ONBELLEK_KLASOR_ADI = "XML_Onbellek"
+
+# Komut satırından gelen çalışma ayarları (paralel çalıştırmada işçi süreçlere de aktarılır)
+CALISMA_AYARLARI = {
+    # True ise metin alanları (STOKADI, CARIADI vb.) XML kaçışından geçirilir (& -> &amp; ...).
+    # Varsayılan False: çıktı, depo programının bugüne kadar aldığı dosyayla bayt bayt aynıdır.
+    "xml_kacis": False,
+    # True ise FISNO içerikten türetilir, saatler sabitlenir ve aynı içerikli fiş yeniden yazılmaz
+    # (ICERIK_DEPOSU). Varsayılan False: FISNO rastgele, saat çalıştırma anıdır.
+    "deterministik": False,
+    # True ise birden fazla boyu olan kitler (TSH_100 / TSH_2000) en az fazla test verecek boy karışımıyla
+    # sipariş edilir. Varsayılan False: hastanenin kit_eslestirme'deki boyu yukarı yuvarlanır.
+    "kit_optimizasyonu": False,
+    # Değişmeyen Excel dosyalarının (TEST ADI, ihtiyaç) sütunları önbellekten okunur.
+    "onbellek": True,
+    # Önbellek bu boyutu (MB) aşarsa en uzun süredir kullanılmayan girdiler silinir.
+    "onbellek_mb": 256,
+    # Konsola yazılacak en düşük günlük seviyesi (--quiet: WARNING, --verbose: DEBUG).
+    "gunluk_seviyesi": logging.INFO,
+    # True ise her çalıştırma klasörüne dönen bir günlük dosyası (GUNLUK_DOSYASI_ADI) yazılır.
+    "gunluk_dosyasi": False,
+}
+
+
+# GÜNLÜK (LOGGING): tüm mesajlar GUNLUK üzerinden yazılır. Satır bazlı ayrıntılar DEBUG seviyesindedir
+# ve varsayılan INFO seviyesinde hiç biçimlenmez. Modül içe aktarılırken GUNLUK'a işleyici eklenmez ve
+# atexit kaydı yapılmaz: modülü kullanan uygulamada kayıtlar o uygulamanın günlük ayarlarına gider.
+# Günlük gunlugu_ayarla ile yapılandırılır: dogrudan=True ise mesajlar doğrudan o anki sys.stdout'a
+# yazılır (alt komutlar ve sunucunun iş parçacığı bazlı çıktı yakalaması için); run komutunda ise bir
+# kuyruğa alınır ve konsola / dosyaya tek bir dinleyici iş parçacığı yazar, böylece hesaplama konsol
+# G/Ç'sini beklemez.
+
+GUNLUK = logging.getLogger("xml_olusturucu")
+
+GUNLUK_DOSYASI_ADI = "calistirma.log"
+GUNLUK_DOSYASI_BAYT = 5 * 1024 * 1024
+GUNLUK_DOSYASI_YEDEK = 3
+
+_GUNLUK_DINLEYICISI = None
+_GUNLUK_ATEXIT_KAYITLI = False
+
+
+class _KonsolIsleyici(logging.StreamHandler):
+    """Her kaydı o anki sys.stdout'a yazar (redirect_stdout ve iş parçacığı bazlı yakalama için)."""
+
+    def __init__(self):
+        super().__init__(sys.stdout)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, deger):
+        pass
+
+
+class _DosyaBicimleyici(logging.Formatter):
+    """Konsol düzeni için mesajların başına konan boş satırları dosyada atar."""
+
+    def formatMessage(self, record):
+        record.message = record.message.lstrip("\n")
+        return super().formatMessage(record)
+
+
+def _konsol_isleyicisi(seviye):
+    isleyici = _KonsolIsleyici()
+    isleyici.setLevel(seviye)
+    isleyici.setFormatter(logging.Formatter("%(message)s"))
+    return isleyici
+
+
+def gunluk_seviyesi():
+    """Kayıtların oluşturulacağı en düşük seviye (konsol ve varsa günlük dosyası seviyelerinin küçüğü)."""
+    seviye = CALISMA_AYARLARI["gunluk_seviyesi"]
+    if CALISMA_AYARLARI["gunluk_dosyasi"]:
+        seviye = min(seviye, logging.INFO)
+    return seviye
+
+
+def gunlugu_durdur():
+    """Kuyruk dinleyicisini, kuyruktaki tüm kayıtlar yazıldıktan sonra durdurur."""
+    global _GUNLUK_DINLEYICISI
+    if _GUNLUK_DINLEYICISI is not None:
+        _GUNLUK_DINLEYICISI.stop()
+        for isleyici in _GUNLUK_DINLEYICISI.handlers:
+            isleyici.close()
+        _GUNLUK_DINLEYICISI = None
+
+
+def gunlugu_ayarla(dosya_klasoru=None, dogrudan=False):
+    """
+    GUNLUK'u CALISMA_AYARLARI'ndaki seviyeyle kuyruk tabanlı yazmaya geçirir. dosya_klasoru verilirse
+    (ve gunluk_dosyasi açıksa) kayıtlar ayrıca o klasördeki dönen günlük dosyasına yazılır.
+    dogrudan=True ise kuyruk kullanılmaz: her kayıt o anki sys.stdout'a yazılır (dosya yazılmaz).
+    Her çağrı önceki dinleyiciyi kapatır; izleme modunda her çalıştırma kendi klasörüne yazar.
+    Dinleyici ilk kez başlatılırken, çıkışta kuyruğun boşaltılması için gunlugu_durdur atexit'e kaydedilir.
+    """
+    import logging.handlers
+
+    global _GUNLUK_DINLEYICISI, _GUNLUK_ATEXIT_KAYITLI
+    gunlugu_durdur()
+    GUNLUK.propagate = False
+    GUNLUK.setLevel(gunluk_seviyesi())
+    if dogrudan:
+        # Seviye süzmesi günlükte yapılır (dry-run --verbose gibi GUNLUK.setLevel ile değiştirilebilsin)
+        GUNLUK.handlers = [_konsol_isleyicisi(logging.NOTSET)]
+        return
+
+    isleyiciler = [_konsol_isleyicisi(CALISMA_AYARLARI["gunluk_seviyesi"])]
+    if dosya_klasoru and CALISMA_AYARLARI["gunluk_dosyasi"]:
+        dosya = logging.handlers.RotatingFileHandler(
+            os.path.join(dosya_klasoru, GUNLUK_DOSYASI_ADI), maxBytes=GUNLUK_DOSYASI_BAYT,
+            backupCount=GUNLUK_DOSYASI_YEDEK, encoding="utf-8")
+        # Sessiz modda da dosyaya INFO kayıtları yazılır; --verbose ise satır ayrıntıları da yazılır
+        dosya.setLevel(min(CALISMA_AYARLARI["gunluk_seviyesi"], logging.INFO))
+        dosya.setFormatter(_DosyaBicimleyici("%(asctime)s [%(levelname)s] %(message)s"))
+        isleyiciler.append(dosya)
+
+    kuyruk = queue.SimpleQueue()
+    GUNLUK.handlers = [logging.handlers.QueueHandler(kuyruk)]
+    _GUNLUK_DINLEYICISI = logging.handlers.QueueListener(kuyruk, *isleyiciler, respect_handler_level=True)
+    _GUNLUK_DINLEYICISI.start()
+    if not _GUNLUK_ATEXIT_KAYITLI:
+        atexit.register(gunlugu_durdur)
+        _GUNLUK_ATEXIT_KAYITLI = True
+
+
+@contextlib.contextmanager
+def gunluk_kayitlarini_topla():
+    """
+    Blok içindeki günlük kayıtlarını yazmak yerine biçimlenmiş halde biriktirir ve verilen listeye ekler.
+    Kayıtlar sonradan GUNLUK.handle ile yazılabilir (işçi süreçten ana sürece aktarma, yalnızca hata
+    durumunda gösterme gibi).
+    """
+    import logging.handlers
+
+    kuyruk = queue.SimpleQueue()
+    onceki_isleyiciler, onceki_yayilim = GUNLUK.handlers, GUNLUK.propagate
+    # Biriktirilen kayıtlar uygulamanın (kök günlüğün) işleyicilerine de şimdiden gitmesin
+    GUNLUK.handlers, GUNLUK.propagate = [logging.handlers.QueueHandler(kuyruk)], False
+    kayitlar = []
+    try:
+        yield kayitlar
+    finally:
+        GUNLUK.handlers, GUNLUK.propagate = onceki_isleyiciler, onceki_yayilim
+        while not kuyruk.empty():
+            kayitlar.append(kuyruk.get())
 
 
 def klasor_olustur(yol):
@@ -28,13 +237,20 @@ def klasor_olustur(yol):
     try:
         # os.makedirs, iç içe klasörleri (ana klasör ve zaman damgalı alt klasörü) oluşturur.
         os.makedirs(yol, exist_ok=True)
-        print(f"\n[INFO] Çıktı klasörü hazırlandı: {yol}")
+        GUNLUK.info("\n[INFO] Çıktı klasörü hazırlandı: %s", yol)
         return True
     except Exception as e:
-        print(f"KRİTİK HATA: Merkezin çıktı klasörü oluşturulamadı. Lütfen klasör izinlerini kontrol edin: {e}")
+        GUNLUK.error("KRİTİK HATA: Merkezin çıktı klasörü oluşturulamadı. Lütfen klasör izinlerini kontrol edin: %s", e)
         return False
 
 
+def yeni_calisma_klasoru():
+    """CALISMA_ZAMANI'nı ve çıktı klasörünü (TUM_CIKTILAR_YOLU) şimdiki zamana taşır (klasörü oluşturmaz)."""
+    global CALISMA_ZAMANI, TUM_CIKTILAR_YOLU
+    CALISMA_ZAMANI = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    TUM_CIKTILAR_YOLU = os.path.join(MERKEZI_KLASOR_ADI, CALISMA_ZAMANI)
+
+
 # =========================================================================
 # 2. ORTAK AYARLAR VE SABİT EŞLEŞTİRME TABLOSU
 # =========================================================================
@@ -64,11 +280,25 @@ def get_dynamic_sheet_name(sheet_prefix, override_month_name=None):
 
     dynamic_sheet_name = f"{sheet_prefix} {month_to_use} SAYIM"
 
-    print(f"(Debug) Otomatik Sayfa Adı Tahmini: {dynamic_sheet_name}")
+    GUNLUK.debug("(Debug) Otomatik Sayfa Adı Tahmini: %s", dynamic_sheet_name)
     # Hem dinamik adı hem de mevcut ay adını (hata mesajı için) döndür
     return dynamic_sheet_name, current_month_name
 
 
+# Türkçe büyük/küçük harf dönüşümünde İ/I/ı/i karışmasın diye hepsi "i" yapılır.
+_TURKCE_I_HARFLERI = str.maketrans({"İ": "i", "I": "i", "ı": "i"})
+_NOKTALAMA = re.compile(r"[^\w\s]|_")
+
+
+def turkce_normalize(metin):
+    """
+    Karşılaştırma için metni sadeleştirir: İ/I/ı/i -> i, küçük harf, noktalama -> boşluk,
+    art arda boşluklar tek boşluk. Örn. "ATATÜRK ÜNi.  EYLÜL SAYIM" -> "atatürk üni eylül sayim".
+    """
+    metin = str(metin).translate(_TURKCE_I_HARFLERI).lower()
+    return " ".join(_NOKTALAMA.sub(" ", metin).split())
+
+
 # YENİ YARDIMCI TARİH FONKSİYONLARI: Depo programının istediği özel tarih formatları için.
 
 def date_to_ole_format(date_obj):
@@ -225,6 +455,189 @@ STOK_MAP = {
     "ALNTY_TAKROLİMUS": ("9P4220", "ALNTY. TACROLİMUS (2*100 TEST) (ABBOTT)", "", "", DINAMIK_VADE_TARIHI_STR, "10", "LOST", "", "6517", 200, 2),
 }
 
+
+# -------------------------------------------------------------------------
+# DERLENMİŞ KİT KATALOĞU: STOK_MAP tuple'ları ilk kullanımda bir kez isimli kayıtlara çevrilir.
+# -------------------------------------------------------------------------
+
+class KitKaydi:
+    """
+    STOK_MAP'teki tek bir kitin derlenmiş kaydı.
+    Alanlar isimle okunur (stok_bilgisi[9] yerine kit.test_per_kutu); TEST_PER_SET önceden hesaplanmıştır.
+    Dinamik alanlar (MİKTAR, BİRİM KOD, OZELALAN1) kayıtta tutulmaz, sipariş hesabında üretilir.
+    """
+    __slots__ = ("sira", "anahtar", "stok_kodu", "stok_adi", "vade_tarihi", "kdv_orani", "depo_kod",
+                 "id_kodu", "test_per_kutu", "set_per_kutu", "test_per_set")
+
+    def __init__(self, sira, anahtar, stok_bilgisi):
+        self.sira = sira
+        self.anahtar = anahtar
+        # Ortak sabitler ("10", "LOST", ID'ler, vade tarihi) tek bir string nesnesi olarak paylaşılır.
+        self.stok_kodu = sys.intern(stok_bilgisi[0])
+        self.stok_adi = stok_bilgisi[1]
+        self.vade_tarihi = sys.intern(stok_bilgisi[4])
+        self.kdv_orani = sys.intern(stok_bilgisi[5])
+        self.depo_kod = sys.intern(stok_bilgisi[6])
+        self.id_kodu = sys.intern(stok_bilgisi[8])
+        self.test_per_kutu = stok_bilgisi[9]
+        self.set_per_kutu = stok_bilgisi[10]
+
+        # Set başına düşen Test miktarı
+        if self.set_per_kutu <= 0:
+            self.test_per_set = self.test_per_kutu if self.test_per_kutu != 0 else 1
+        else:
+            self.test_per_set = self.test_per_kutu / self.set_per_kutu
+
+    def __repr__(self):
+        return f"KitKaydi({self.anahtar!r}, stok_kodu={self.stok_kodu!r}, id={self.id_kodu!r})"
+
+
+class KitKatalogu:
+    """
+    STOK_MAP'ten bir kez derlenen kit kataloğu.
+    - Anahtara göre KitKaydi (katalog["TSH_2000"]), STOKKOD'a ve ID'ye göre ikincil indeksler (O(1)).
+    - Sipariş motoru için aynı verinin sütun (NumPy dizisi) görünümü: katalog.sutunlar[alan][sira]
+      (ilk erişimde kurulur; katalog NumPy yüklenmeden derlenebilir).
+    - Aynı testin farklı boyları (kit aileleri, Örn. TSH_100 / TSH_2000): katalog.aileler[aile_no].
+    """
+    __slots__ = ("kayitlar", "sira", "aileler", "_sutunlar", "_stok_kodu_index", "_id_index", "_anahtar_index")
+
+    # Sütun görünümünde yer alan sabit (kite ait) alanlar
+    SABIT_ALANLAR = ("stok_kodu", "stok_adi", "vade_tarihi", "kdv_orani", "depo_kod", "id_kodu")
+
+    def __init__(self, stok_map):
+        self.kayitlar = {}
+        self.sira = {}
+        self._stok_kodu_index = {}
+        self._id_index = {}
+
+        for sira, (anahtar, stok_bilgisi) in enumerate(stok_map.items()):
+            kayit = KitKaydi(sira, anahtar, stok_bilgisi)
+            self.kayitlar[anahtar] = kayit
+            self.sira[anahtar] = sira
+            self._stok_kodu_index.setdefault(kayit.stok_kodu, []).append(kayit)
+            self._id_index.setdefault(kayit.id_kodu, []).append(kayit)
+
+        self._stok_kodu_index = {k: tuple(v) for k, v in self._stok_kodu_index.items()}
+        self._id_index = {k: tuple(v) for k, v in self._id_index.items()}
+
+        kayitlar = list(self.kayitlar.values())
+        self._sutunlar = None
+        self._anahtar_index = None
+
+        # Kit aileleri: ID'si ve boy eki (_100, _2000) atılmış anahtarı aynı olan kitler. ID tek başına
+        # yetmez: 6517 birbirinin yerine geçemeyen onlarca kitte ortaktır (Hbsag, Hcv, Hiv...).
+        # Yalnızca set başına test sayısı tamsayı olan en az iki boylu aileler alınır (büyükten küçüğe).
+        gruplar = {}
+        for kayit in kayitlar:
+            gruplar.setdefault((kayit.id_kodu, re.sub(r"_\d+$", "", kayit.anahtar)), []).append(kayit)
+        self.aileler = [tuple(sorted(grup, key=lambda k: (-k.test_per_set, k.sira))) for grup in gruplar.values()
+                        if len(grup) > 1 and all(float(k.test_per_set).is_integer() for k in grup)]
+
+    @property
+    def sutunlar(self):
+        """Alan adı -> kit sırasıyla dizilmiş NumPy dizisi ("aile": kitin aile numarası, ailesi yoksa -1)."""
+        if self._sutunlar is None:
+            kayitlar = list(self.kayitlar.values())
+            sutunlar = {alan: np.array([getattr(k, alan) for k in kayitlar], dtype=object)
+                        for alan in self.SABIT_ALANLAR}
+            sutunlar["set_per_kutu"] = np.array([k.set_per_kutu for k in kayitlar], dtype="int64")
+            sutunlar["test_per_set"] = np.array([k.test_per_set for k in kayitlar], dtype="float64")
+            sutunlar["anahtar"] = np.array([k.anahtar for k in kayitlar], dtype=object)
+            sutunlar["aile"] = np.full(len(kayitlar), -1, dtype="int64")
+            for aile_no, aile in enumerate(self.aileler):
+                for kayit in aile:
+                    sutunlar["aile"][kayit.sira] = aile_no
+            self._sutunlar = sutunlar
+        return self._sutunlar
+
+    def __getitem__(self, anahtar):
+        return self.kayitlar[anahtar]
+
+    def __contains__(self, anahtar):
+        return anahtar in self.kayitlar
+
+    def __len__(self):
+        return len(self.kayitlar)
+
+    def get(self, anahtar, varsayilan=None):
+        return self.kayitlar.get(anahtar, varsayilan)
+
+    def stok_koduna_gore(self, stok_kodu):
+        """Bu STOKKOD'a eşlenen kitler (Örn: "2P3250" -> Sodyum ve Potasyum)."""
+        return self._stok_kodu_index.get(stok_kodu, ())
+
+    def id_ye_gore(self, id_kodu):
+        """Bu ID'yi paylaşan kitler (Örn: "6485" -> TSH_100, TSH_2000)."""
+        return self._id_index.get(id_kodu, ())
+
+    def aile(self, anahtar):
+        """Kitin ailesindeki tüm boylar, büyükten küçüğe (Örn: "TSH_100" -> TSH_2000, TSH_100); ailesi yoksa ()."""
+        kayit = self.kayitlar[anahtar]
+        return next((aile for aile in self.aileler if kayit in aile), ())
+
+    def anahtari_coz(self, anahtar):
+        """
+        Konfigürasyonda yazılan kit anahtarını katalogdaki yazılışına çevirir: önce birebir, sonra
+        turkce_normalize ile, son olarak sondaki parantezli nitelik atılarak ("Hbs_100" -> "HBs_100",
+        "Folat_500" -> "Folat_500 (Serum/Plazma)"). Bulunamazsa veya birden fazla kite uyuyorsa None.
+        """
+        if anahtar in self.kayitlar:
+            return anahtar
+        if self._anahtar_index is None:
+            index = {}
+            for kit_anahtari in self.kayitlar:
+                for normal in {turkce_normalize(kit_anahtari),
+                               turkce_normalize(re.sub(r"\s*\([^)]*\)\s*$", "", kit_anahtari))}:
+                    index.setdefault(normal, set()).add(kit_anahtari)
+            self._anahtar_index = {normal: next(iter(adlar)) if len(adlar) == 1 else None
+                                   for normal, adlar in index.items()}
+        return self._anahtar_index.get(turkce_normalize(anahtar))
+
+    def ara(self, aranan):
+        """
+        Aranan metne uyan kitler, katalog sırasıyla: kit anahtarı (TSH_2000), boy eki atılmış anahtar
+        (TSH -> tüm TSH boyları) veya STOKKOD'un kendisi (Türkçe harf ve büyük/küçük harf farkı gözetilmez).
+        """
+        hedef = turkce_normalize(aranan)
+        return [kit for kit in self.kayitlar.values()
+                if hedef in (turkce_normalize(kit.anahtar), turkce_normalize(re.sub(r"_\d+$", "", kit.anahtar)),
+                             turkce_normalize(kit.stok_kodu))]
+
+
+class _TembelKatalog:
+    """
+    KIT_KATALOGU için vekil: katalog ilk erişimde STOK_MAP'ten derlenir ve bu modüldeki ad gerçek
+    katalogla değiştirilir (_TembelModul gibi). Katalog kullanmayan komutlar ve modülü içe aktaran
+    diğer araçlar derleme süresini ödemez.
+    """
+
+    def __init__(self):
+        self._katalog = None
+
+    def _derle(self):
+        if self._katalog is None:
+            self._katalog = KitKatalogu(STOK_MAP)
+            if globals()["KIT_KATALOGU"] is self:
+                globals()["KIT_KATALOGU"] = self._katalog
+        return self._katalog
+
+    def __getattr__(self, oznitelik):
+        return getattr(self._derle(), oznitelik)
+
+    def __getitem__(self, anahtar):
+        return self._derle()[anahtar]
+
+    def __contains__(self, anahtar):
+        return anahtar in self._derle()
+
+    def __len__(self):
+        return len(self._derle())
+
+
+# İlk kullanımda bir kez derlenir; işleme fonksiyonları STOK_MAP yerine bunu kullanır.
+KIT_KATALOGU = _TembelKatalog()
+
 # Excel'deki Test Adı Sütun Adı (Bu sabittir)
 TEST_ADI_SUTUNU = "TEST ADI"
 # =========================================================================
@@ -244,11 +657,13 @@ HASTANE_CONFIGS = [
         "override_month_name": "EYLÜL",
         "ihtiyac_sutunu": "2 AYLIK İHTİYAÇ MİKTARI (TEST)",
         "apply_min_roundup": True,
-        "kit_eslestirme": {"TSH": "TSH_2000"},
-        "kit_eslestirme": {"HBsAg": "Hbsag_100"},
-        "kit_eslestirme": {"Anti HCV": "Hcv_100"},
-        "kit_eslestirme": {"Anti HIV": "Hiv_100"},
-        "kit_eslestirme": {"Anti HBs": "Hbs_100"},
+        "kit_eslestirme": [
+            {"TSH": "TSH_2000"},
+            {"HBsAg": "Hbsag_100"},
+            {"Anti HCV": "Hcv_100"},
+            {"Anti HIV": "Hiv_100"},
+            {"Anti HBs": "HBs_100"},
+        ],
     },
     {
         "CARI_ADI": "ARDAHAN DEVLET HASTANESİ",
@@ -259,16 +674,18 @@ HASTANE_CONFIGS = [
         "override_month_name": "EYLÜL",
         "ihtiyac_sutunu": "2,5 AYLIK İHTİYAÇ MİKTARI (TEST)",
         "apply_min_roundup": True,
-        "kit_eslestirme": {"TSH": "TSH_2000"},
-        "kit_eslestirme": {"Serbest T3": "T3_2000"},
-        "kit_eslestirme": {"Serbest T4": "T4_2000"},
-        "kit_eslestirme": {"Folat (Serum/Plazma)": "Folat_500"},
-        "kit_eslestirme": {"Vitamin B12)": "B12_500"},
-        "kit_eslestirme": {"Ferritin (Serum/Plazma)": "Ferritin_2000"},
-        "kit_eslestirme": {"Alanin aminotransferaz (ALT)": "ALT_3960"},
-        "kit_eslestirme": {"Aspartat aminotransferaz (AST)": "AST_3960"},
-        "kit_eslestirme": {"25-Hidroksi vitamin D": "VitD_2000"},
-        "kit_eslestirme": {"Bilirubin, total (Serum/Plazma)": "TBil_3600"},
+        "kit_eslestirme": [
+            {"TSH": "TSH_2000"},
+            {"Serbest T3": "T3_2000"},
+            {"Serbest T4": "T4_2000"},
+            {"Folat (Serum/Plazma)": "Folat_500 (Serum/Plazma)"},
+            {"Vitamin B12)": "B12_500"},
+            {"Ferritin (Serum/Plazma)": "Ferritin_2000"},
+            {"Alanin aminotransferaz (ALT)": "ALT_3960"},
+            {"Aspartat aminotransferaz (AST)": "AST_3960"},
+            {"25-Hidroksi vitamin D": "VitD_2000"},
+            {"Bilirubin, total (Serum/Plazma)": "TBil_3600"},
+        ],
     },
     {
         "CARI_ADI": "ARDAHAN MERKEZ HALK SAĞLIĞI LABORATUVARI",
@@ -279,9 +696,11 @@ HASTANE_CONFIGS = [
         "override_month_name": "EYLÜL",
         "ihtiyac_sutunu": "3 AYLIK İHTİYAÇ MİKTARI (TEST)",
         "apply_min_roundup": True,
-        "kit_eslestirme": {"Alanin aminotransferaz (ALT)": "ALT_1200"},
-        "kit_eslestirme": {"Aspartat aminotransferaz (AST)": "AST_1200"},
-        "kit_eslestirme": {"Bilirubin, total (Serum/Plazma)": "TBil_900"},
+        "kit_eslestirme": [
+            {"Alanin aminotransferaz (ALT)": "ALT_1200"},
+            {"Aspartat aminotransferaz (AST)": "AST_1200"},
+            {"Bilirubin, total (Serum/Plazma)": "TBil_900"},
+        ],
     },
     {
         "CARI_ADI": "ATATÜRK ÜNİVERSİTESİ ARAŞTIRMA HASTANESİ MİKROBİYOLOJİ LABORATUVARI",
@@ -292,13 +711,15 @@ HASTANE_CONFIGS = [
         "override_month_name": "EYLÜL",
         "ihtiyac_sutunu": "2 AYLIK İHTİYAÇ MİKTARI (TEST)",
         "apply_min_roundup": True,
-        "kit_eslestirme": {"TSH": "TSH_2000"},
-        "kit_eslestirme": {"Serbest T3": "T3_2000"},
-        "kit_eslestirme": {"Serbest T4": "T4_2000"},
-        "kit_eslestirme": {"HBsAg": "Hbsag_500"},
-        "kit_eslestirme": {"Anti HCV": "Hcv_2000"},
-        "kit_eslestirme": {"Anti HIV": "Hiv_2000"},
-        "kit_eslestirme": {"Anti HBs": "Hbs_2000"},
+        "kit_eslestirme": [
+            {"TSH": "TSH_2000"},
+            {"Serbest T3": "T3_2000"},
+            {"Serbest T4": "T4_2000"},
+            {"HBsAg": "Hbsag_500"},
+            {"Anti HCV": "Hcv_2000"},
+            {"Anti HIV": "Hiv_2000"},
+            {"Anti HBs": "HBs_2000"},
+        ],
     },
     {
         "CARI_ADI": "GÖLE DEVLET HASTANESİ",
@@ -309,9 +730,11 @@ HASTANE_CONFIGS = [
         "override_month_name": "EYLÜL",
         "ihtiyac_sutunu": "2 AYLIK İHTİYAÇ MİKTARI (TEST)",
         "apply_min_roundup": True,
-        "kit_eslestirme": {"Alanin aminotransferaz (ALT)": "ALT_1200"},
-        "kit_eslestirme": {"Aspartat aminotransferaz (AST)": "AST_1200"},
-        "kit_eslestirme": {"Bilirubin, total (Serum/Plazma)": "TBil_900"},
+        "kit_eslestirme": [
+            {"Alanin aminotransferaz (ALT)": "ALT_1200"},
+            {"Aspartat aminotransferaz (AST)": "AST_1200"},
+            {"Bilirubin, total (Serum/Plazma)": "TBil_900"},
+        ],
     },
     {
         "CARI_ADI": "IĞDIR DR. NEVRUZ EREZ DEVLET HASTANESİ",
@@ -322,13 +745,15 @@ HASTANE_CONFIGS = [
         "override_month_name": "EYLÜL",
         "ihtiyac_sutunu": "2,5 AYLIK İHTİYAÇ MİKTARI (TEST)",
         "apply_min_roundup": True,
-        "kit_eslestirme": {"TSH": "TSH_2000"},
-        "kit_eslestirme": {"Serbest T3": "T3_2000"},
-        "kit_eslestirme": {"Serbest T4": "T4_2000"},
-        "kit_eslestirme": {"HBsAg": "Hbsag_500"},
-        "kit_eslestirme": {"Anti HCV": "Hcv_2000"},
-        "kit_eslestirme": {"Anti HIV": "Hiv_2000"},
-        "kit_eslestirme": {"Anti HBs": "Hbs_2000"},
+        "kit_eslestirme": [
+            {"TSH": "TSH_2000"},
+            {"Serbest T3": "T3_2000"},
+            {"Serbest T4": "T4_2000"},
+            {"HBsAg": "Hbsag_500"},
+            {"Anti HCV": "Hcv_2000"},
+            {"Anti HIV": "Hiv_2000"},
+            {"Anti HBs": "HBs_2000"},
+        ],
     },
     {
         "CARI_ADI": "IĞDIR HALK SAĞLIĞI LABORATUVARI",
@@ -339,19 +764,21 @@ HASTANE_CONFIGS = [
         "override_month_name": "EYLÜL",
         "ihtiyac_sutunu": "2,5 AYLIK İHTİYAÇ MİKTARI (TEST)",
         "apply_min_roundup": True,
-        "kit_eslestirme": {"TSH": "TSH_2000"},
-        "kit_eslestirme": {"Serbest T3": "T3_2000"},
-        "kit_eslestirme": {"Serbest T4": "T4_2000"},
-        "kit_eslestirme": {"HBsAg": "Hbsag_100"},
-        "kit_eslestirme": {"Anti HCV": "Hcv_100"},
-        "kit_eslestirme": {"Anti HIV": "Hiv_100"},
-        "kit_eslestirme": {"Anti HBs": "Hbs_100"},
-        "kit_eslestirme": {"Folat (Serum/Plazma)": "Folat_500"},
-        "kit_eslestirme": {"Vitamin B12)": "B12_500"},
-        "kit_eslestirme": {"Ferritin (Serum/Plazma)": "Ferritin_2000"},
-        "kit_eslestirme": {"Alanin aminotransferaz (ALT)": "ALT_3960"},
-        "kit_eslestirme": {"Aspartat aminotransferaz (AST)": "AST_1200"},
-        "kit_eslestirme": {"Bilirubin, total (Serum/Plazma)": "TBil_3600"},
+        "kit_eslestirme": [
+            {"TSH": "TSH_2000"},
+            {"Serbest T3": "T3_2000"},
+            {"Serbest T4": "T4_2000"},
+            {"HBsAg": "Hbsag_100"},
+            {"Anti HCV": "Hcv_100"},
+            {"Anti HIV": "Hiv_100"},
+            {"Anti HBs": "HBs_100"},
+            {"Folat (Serum/Plazma)": "Folat_500 (Serum/Plazma)"},
+            {"Vitamin B12)": "B12_500"},
+            {"Ferritin (Serum/Plazma)": "Ferritin_2000"},
+            {"Alanin aminotransferaz (ALT)": "ALT_3960"},
+            {"Aspartat aminotransferaz (AST)": "AST_1200"},
+            {"Bilirubin, total (Serum/Plazma)": "TBil_3600"},
+        ],
     },
     {
         "CARI_ADI": "GİRESUN ÖZEL KENT HASTANESİ",
@@ -362,17 +789,19 @@ HASTANE_CONFIGS = [
         "override_month_name": "EYLÜL",
         "ihtiyac_sutunu": "2,5 AYLIK İHTİYAÇ MİKTARI (TEST)",
         "apply_min_roundup": True,
-        "kit_eslestirme": {"TSH": "TSH_100"},
-        "kit_eslestirme": {"Serbest T3": "T3_100"},
-        "kit_eslestirme": {"Serbest T4": "T4_100"},
-        "kit_eslestirme": {"HBsAg": "Hbsag_100"},
-        "kit_eslestirme": {"Anti HCV": "Hcv_100"},
-        "kit_eslestirme": {"Anti HIV": "Hiv_100"},
-        "kit_eslestirme": {"Anti HBs": "Hbs_100"},
-        "kit_eslestirme": {"Folat (Serum/Plazma)": "Folat_500"},
-        "kit_eslestirme": {"Vitamin B12)": "B12_500"},
-        "kit_eslestirme": {"Ferritin (Serum/Plazma)": "Ferritin_2000"},
-        "kit_eslestirme": {"25-Hidroksi vitamin D": "VitD_2000"},
+        "kit_eslestirme": [
+            {"TSH": "TSH_100"},
+            {"Serbest T3": "T3_100"},
+            {"Serbest T4": "T4_100"},
+            {"HBsAg": "Hbsag_100"},
+            {"Anti HCV": "Hcv_100"},
+            {"Anti HIV": "Hiv_100"},
+            {"Anti HBs": "HBs_100"},
+            {"Folat (Serum/Plazma)": "Folat_500 (Serum/Plazma)"},
+            {"Vitamin B12)": "B12_500"},
+            {"Ferritin (Serum/Plazma)": "Ferritin_2000"},
+            {"25-Hidroksi vitamin D": "VitD_2000"},
+        ],
     },
     {
         "CARI_ADI": "KTÜ TIP FAKÜLTESİ FARABİ HASTANESİ",
@@ -393,9 +822,11 @@ HASTANE_CONFIGS = [
         "override_month_name": "EYLÜL",
         "ihtiyac_sutunu": "3 AYLIK İHTİYAÇ MİKTARI (TEST)",
         "apply_min_roundup": True,
-        "kit_eslestirme": {"Alanin aminotransferaz (ALT)": "ALT_1200"},
-        "kit_eslestirme": {"Aspartat aminotransferaz (AST)": "AST_1200"},
-        "kit_eslestirme": {"Bilirubin, total (Serum/Plazma)": "TBil_900"},
+        "kit_eslestirme": [
+            {"Alanin aminotransferaz (ALT)": "ALT_1200"},
+            {"Aspartat aminotransferaz (AST)": "AST_1200"},
+            {"Bilirubin, total (Serum/Plazma)": "TBil_900"},
+        ],
     },
     {
         "CARI_ADI": "RİZE DEVLET HASTANESİ",
@@ -406,13 +837,15 @@ HASTANE_CONFIGS = [
         "override_month_name": "EYLÜL",
         "ihtiyac_sutunu": "2 AYLIK İHTİYAÇ MİKTARI (TEST)",
         "apply_min_roundup": True,
-        "kit_eslestirme": {"TSH": "TSH_2000"},
-        "kit_eslestirme": {"Serbest T3": "T3_2000"},
-        "kit_eslestirme": {"Serbest T4": "T4_2000"},
-        "kit_eslestirme": {"HBsAg": "Hbsag_500"},
-        "kit_eslestirme": {"Anti HCV": "Hcv_2000"},
-        "kit_eslestirme": {"Anti HIV": "Hiv_2000"},
-        "kit_eslestirme": {"Anti HBs": "Hbs_2000"},
+        "kit_eslestirme": [
+            {"TSH": "TSH_2000"},
+            {"Serbest T3": "T3_2000"},
+            {"Serbest T4": "T4_2000"},
+            {"HBsAg": "Hbsag_500"},
+            {"Anti HCV": "Hcv_2000"},
+            {"Anti HIV": "Hiv_2000"},
+            {"Anti HBs": "HBs_2000"},
+        ],
     },
     {
         "CARI_ADI": "RİZE EĞİTİM VE ARAŞTIRMA HASTANESİ",
@@ -423,29 +856,806 @@ HASTANE_CONFIGS = [
         "override_month_name": "EYLÜL",
         "ihtiyac_sutunu": "2 AYLIK İHTİYAÇ MİKTARI (TEST)",
         "apply_min_roundup": True,
-        "kit_eslestirme": {"TSH": "TSH_2000"},
-        "kit_eslestirme": {"Serbest T3": "T3_2000"},
-        "kit_eslestirme": {"Serbest T4": "T4_2000"},
-        "kit_eslestirme": {"HBsAg": "Hbsag_500"},
-        "kit_eslestirme": {"Anti HCV": "Hcv_2000"},
-        "kit_eslestirme": {"Anti HIV": "Hiv_2000"},
-        "kit_eslestirme": {"Anti HBs": "Hbs_2000"},
+        "kit_eslestirme": [
+            {"TSH": "TSH_2000"},
+            {"Serbest T3": "T3_2000"},
+            {"Serbest T4": "T4_2000"},
+            {"HBsAg": "Hbsag_500"},
+            {"Anti HCV": "Hcv_2000"},
+            {"Anti HIV": "Hiv_2000"},
+            {"Anti HBs": "HBs_2000"},
+        ],
     },
 ]
 
 
+# -------------------------------------------------------------------------
+# KONFİGÜRASYON YÜKLEYİCİ: Her hastane için tek bir "test adı -> kit kaydı" çözüm tablosu
+# -------------------------------------------------------------------------
+
+class KonfigurasyonHatasi(ValueError):
+    """HASTANE_CONFIGS içindeki tutarsızlıklar (tekrarlanan test adı, bilinmeyen kit anahtarı vb.)."""
+
+
+# output_prefix -> derlenmiş çözüm tablosu (süreç başına bir kez derlenir)
+_KIT_TABLOLARI = {}
+
+
+def kit_eslestirmelerini_birlestir(config):
+    """
+    Hastanenin "kit_eslestirme" girdilerini ({test adı: kit anahtarı} sözlüklerinden oluşan liste
+    veya tek bir sözlük) tek bir sözlükte birleştirir.
+    Kit anahtarları KIT_KATALOGU.anahtari_coz ile katalogdaki yazılışa çevrilir (eski "Hbs_2000" gibi
+    yazımlar da aynı kite gider). Aynı test adı birden fazla girdide geçerse veya kit anahtarı STOK_MAP'te
+    yoksa KonfigurasyonHatasi fırlatır.
+    """
+    girdiler = config.get("kit_eslestirme") or []
+    if isinstance(girdiler, dict):
+        girdiler = [girdiler]
+
+    birlesik = {}
+    hatalar = []
+    for girdi in girdiler:
+        for test_adi, kit_anahtari in girdi.items():
+            katalog_anahtari = KIT_KATALOGU.anahtari_coz(kit_anahtari)
+            if test_adi in birlesik:
+                hatalar.append(f"'{test_adi}' birden fazla kez eşleştirilmiş "
+                               f"('{birlesik[test_adi]}' ve '{kit_anahtari}')")
+            elif katalog_anahtari is None:
+                hatalar.append(f"'{test_adi}' için kit anahtarı '{kit_anahtari}' STOK_MAP'te yok")
+            birlesik.setdefault(test_adi, katalog_anahtari or kit_anahtari)
+
+    if hatalar:
+        raise KonfigurasyonHatasi(
+            f"'{config['CARI_ADI']}' ({config['output_prefix']}) kit eşleştirmesi hatalı:\n  - "
+            + "\n  - ".join(hatalar))
+    return birlesik
+
+
+# Excel'den gelen test adı -> turkce_normalize sonucu (aynı ad tüm hastanelerde bir kez normalize edilir)
+_NORMALIZE_TEST_ADLARI = {}
+
+
+def test_adini_normalize_et(test_adi):
+    """turkce_normalize'ın test adları için bellekli (memoized) hali."""
+    normal = _NORMALIZE_TEST_ADLARI.get(test_adi)
+    if normal is None:
+        normal = _NORMALIZE_TEST_ADLARI[test_adi] = turkce_normalize(test_adi)
+    return normal
+
+
+class KitCozumTablosu:
+    """
+    Hastanenin "test adı -> KitKaydi" çözüm tablosu.
+    Önce birebir ad aranır; bulunamazsa adın normalize edilmiş hali (büyük/küçük harf, İ/I/ı/i,
+    fazla boşluk ve noktalama farkları yok sayılarak) ikinci bir hash indeksinde aranır.
+    "Kokain  (İdrar)" veya "Vitamin B12)" gibi yazımlar da böylece O(1) eşleşir.
+    Normalize edildiğinde aynı olan iki ad farklı kitlere gidiyorsa KonfigurasyonHatasi fırlatılır.
+    """
+
+    __slots__ = ("birebir", "normalize")
+
+    def __init__(self, birebir, aciklama):
+        self.birebir = birebir
+        self.normalize = {}
+        hatalar = []
+        for test_adi, kit in birebir.items():
+            normal = test_adini_normalize_et(test_adi)
+            onceki_adi, onceki_kit = self.normalize.setdefault(normal, (test_adi, kit))
+            if onceki_kit is not kit:
+                hatalar.append(f"'{onceki_adi}' ({onceki_kit.anahtar}) ve '{test_adi}' ({kit.anahtar}) "
+                               f"normalize edildiğinde aynı ad oluyor: '{normal}'")
+        if hatalar:
+            raise KonfigurasyonHatasi(f"{aciklama} test adı çakışması:\n  - " + "\n  - ".join(hatalar))
+
+    def get(self, test_adi, varsayilan=None):
+        kit = self.birebir.get(test_adi)
+        if kit is None:
+            kit = self.normalize.get(test_adini_normalize_et(test_adi), (None, varsayilan))[1]
+        return kit
+
+    def __len__(self):
+        return len(self.birebir)
+
+
+def hastane_kit_tablosu(config):
+    """
+    Hastane için "Excel'deki test adı -> KitKaydi" çözüm tablosunu (KitCozumTablosu) döndürür
+    (ilk çağrıda derlenir). Tablo, STOK_MAP anahtarlarının kendisiyle ve hastaneye özel kit
+    eşleştirmeleriyle (öncelikli) doldurulur; böylece sıcak döngüde tek bir sözlük araması yeterlidir.
+    """
+    anahtar = config["output_prefix"]
+    tablo = _KIT_TABLOLARI.get(anahtar)
+    if tablo is None:
+        birebir = dict(KIT_KATALOGU.kayitlar)
+        for test_adi, kit_anahtari in kit_eslestirmelerini_birlestir(config).items():
+            birebir[test_adi] = KIT_KATALOGU[kit_anahtari]
+        tablo = KitCozumTablosu(birebir, f"'{config['CARI_ADI']}' ({config['output_prefix']})")
+        _KIT_TABLOLARI[anahtar] = tablo
+    return tablo
+
+
+def konfigurasyonlari_dogrula(configs):
+    """
+    Herhangi bir Excel okunmadan önce tüm hastanelerin çözüm tablolarını derler.
+    Tekrarlanan output_prefix dahil bulunan tüm hataları tek bir KonfigurasyonHatasi içinde toplar.
+    """
+    hatalar = []
+    gorulen = set()
+    for config in configs:
+        if config["output_prefix"] in gorulen:
+            hatalar.append(f"output_prefix '{config['output_prefix']}' birden fazla hastanede kullanılmış")
+            continue
+        gorulen.add(config["output_prefix"])
+        try:
+            hastane_kit_tablosu(config)
+        except KonfigurasyonHatasi as e:
+            hatalar.append(str(e))
+    if hatalar:
+        raise KonfigurasyonHatasi("\n".join(hatalar))
+
+
 # =========================================================================
 # 4. İŞLEME FONKSİYONLARI (Güncel Versiyon - Kit Eşleştirmesi Dahil)
 # =========================================================================
 
+# EXCEL OKUMA: Sayfanın tamamı yerine yalnızca iki sütun, satır satır okunur.
+def excel_satirlarini_oku(input_path, sheet_name, ihtiyac_sutunu):
+    """
+    Excel sayfasını openpyxl'in salt-okunur (read_only) modu ile açar ve
+    (test_adi, ihtiyac) çiftlerini tembel (lazy) olarak üreten bir iterator döndürür.
+
+    Başlık satırından yalnızca TEST_ADI_SUTUNU ve ihtiyac_sutunu'nun yeri bulunur; diğer sütunlar
+    ve sayfanın tamamı belleğe alınmaz. Boş hücreler None olarak gelir.
+    Sayfa veya sütunlar bulunamazsa hata, satırlar okunmadan hemen ValueError olarak fırlatılır
+    (sayfa hatası pd.read_excel ile aynı mesajı taşır).
+    """
+    wb = openpyxl.load_workbook(input_path, read_only=True, data_only=True)
+    try:
+        satirlar, test_idx, ihtiyac_idx = _sayfa_sutunlarini_bul(wb, sheet_name, ihtiyac_sutunu)
+    except Exception:
+        wb.close()
+        raise
+
+    return _iki_sutun_uret(wb, satirlar, test_idx, ihtiyac_idx)
+
+
+def excel_sayfalarini_oku(input_path, sheet_names, ihtiyac_sutunu):
+    """
+    Aynı Excel'in birden fazla sayfasını tek açılışta okur: zip arşivi ve paylaşılan metinler
+    (sharedStrings) bir kez ayrıştırılır. {sayfa adı: [(test_adi, ihtiyac), ...]} döndürür.
+    Sayfalardan biri veya sütunları bulunamazsa excel_satirlarini_oku ile aynı ValueError fırlatılır.
+    """
+    wb = openpyxl.load_workbook(input_path, read_only=True, data_only=True)
+    try:
+        sayfalar = {}
+        for sheet_name in sheet_names:
+            satirlar, test_idx, ihtiyac_idx = _sayfa_sutunlarini_bul(wb, sheet_name, ihtiyac_sutunu)
+            sayfalar[sheet_name] = [
+                (satir[test_idx] if test_idx < len(satir) else None,
+                 satir[ihtiyac_idx] if ihtiyac_idx < len(satir) else None)
+                for satir in satirlar
+            ]
+        return sayfalar
+    finally:
+        wb.close()
+
+
+def _sayfa_sutunlarini_bul(wb, sheet_name, ihtiyac_sutunu):
+    """Sayfanın satır iterator'ını ve başlıktan bulunan TEST ADI / ihtiyaç sütun indekslerini döndürür."""
+    if sheet_name not in wb.sheetnames:
+        raise ValueError(f"Worksheet named '{sheet_name}' not found")
+
+    ws = wb[sheet_name]
+    # Bazı programlar sayfa boyutunu (dimension) yanlış yazar; salt-okunur modda satırlar kesilmesin.
+    ws.reset_dimensions()
+    satirlar = ws.iter_rows(values_only=True)
+
+    baslik = [str(h).strip() if h is not None else "" for h in (next(satirlar, None) or ())]
+    eksik = [s for s in (TEST_ADI_SUTUNU, ihtiyac_sutunu) if s.strip() not in baslik]
+    if eksik:
+        raise ValueError(f"'{sheet_name}' sayfasında beklenen sütun(lar) bulunamadı: {eksik}")
+
+    return satirlar, baslik.index(TEST_ADI_SUTUNU.strip()), baslik.index(ihtiyac_sutunu.strip())
+
+
+def _iki_sutun_uret(wb, satirlar, test_idx, ihtiyac_idx):
+    """excel_satirlarini_oku için satır üreticisi; iş bitince (veya yarıda kalırsa) dosyayı kapatır."""
+    try:
+        for satir in satirlar:
+            test_adi = satir[test_idx] if test_idx < len(satir) else None
+            ihtiyac = satir[ihtiyac_idx] if ihtiyac_idx < len(satir) else None
+            yield test_adi, ihtiyac
+    finally:
+        wb.close()
+
+
+# -------------------------------------------------------------------------
+# SAYFA ADI ÇÖZÜMLEME: Sayfa listesi yalnızca XLSX arşivindeki xl/workbook.xml'den okunur.
+# -------------------------------------------------------------------------
+
+# (mutlak yol, boyut, mtime) -> sayfa adları; aynı dosyanın listesi süreç içinde bir kez okunur.
+_SAYFA_LISTELERI = {}
+
+
+def sayfa_adlarini_ayikla(kaynak):
+    """
+    Sayfa adlarını, sayfa verisine hiç dokunmadan, zip içindeki xl/workbook.xml'den okur.
+    kaynak bir dosya yolu veya dosya benzeri nesne (BytesIO) olabilir.
+    """
+    with zipfile.ZipFile(kaynak) as arsiv:
+        kok = ET.fromstring(arsiv.read("xl/workbook.xml"))
+    # Etiketler ad alanlı gelir ({...}sheet); strict ve transitional biçimlerin ikisi de desteklenir.
+    return [eleman.get("name") for eleman in kok.iter() if eleman.tag.rsplit("}", 1)[-1] == "sheet"]
+
+
+def sayfa_adlarini_oku(input_path, icerik=None):
+    """
+    Excel'deki sayfa adlarını sayfa_adlarini_ayikla ile okur.
+    icerik (excel_on_yukle sonucu) verilirse dosya diskten yeniden açılmaz.
+    Sonuç dosyanın yol/boyut/mtime bilgisiyle önbelleğe alınır.
+    """
+    bilgi = os.stat(input_path)
+    anahtar = (os.path.abspath(input_path), bilgi.st_size, bilgi.st_mtime_ns)
+
+    adlar = _SAYFA_LISTELERI.get(anahtar)
+    if adlar is None:
+        adlar = sayfa_adlarini_ayikla(io.BytesIO(icerik) if icerik is not None else input_path)
+        _SAYFA_LISTELERI[anahtar] = adlar
+    return adlar
+
+
+def sayfa_adini_coz(sayfa_adlari, sheet_prefix, ay_adi):
+    """
+    "{sheet_prefix} {ay_adi} SAYIM" için dosyadaki gerçek sayfa adını bulur; bulamazsa None döndürür.
+    Sırasıyla: birebir ad, turkce_normalize ile eşit ad, son olarak normalize edilmiş hali ön ekle
+    başlayan ve ay adı ile SAYIM kelimesini içeren tek sayfa ("ATATÜRK ÜNİ EYLÜL SAYIM " gibi).
+    Birden fazla sayfa aynı derecede eşleşirse tahmin yapılmaz, None döner.
+    """
+    beklenen = f"{sheet_prefix} {ay_adi} SAYIM"
+    if beklenen in sayfa_adlari:
+        return beklenen
+
+    normalize = {ad: turkce_normalize(ad) for ad in sayfa_adlari}
+    hedef = turkce_normalize(beklenen)
+    esitler = [ad for ad, norm in normalize.items() if norm == hedef]
+    if len(esitler) == 1:
+        return esitler[0]
+
+    on_ek = turkce_normalize(sheet_prefix)
+    ay = turkce_normalize(ay_adi)
+    adaylar = [ad for ad, norm in normalize.items()
+               if norm.startswith(on_ek + " ") and {ay, "sayim"} <= set(norm[len(on_ek):].split())]
+    return adaylar[0] if len(adaylar) == 1 else None
+
+
+# -------------------------------------------------------------------------
+# EXCEL ÖNBELLEĞİ: Değişmeyen dosyalar yeniden ayrıştırılmaz.
+# -------------------------------------------------------------------------
+
+# Okuyucunun ürettiği veri biçimi değişirse artırılır (eski girdiler kendiliğinden geçersiz olur).
+ONBELLEK_SURUMU = 1
+
+# (mutlak yol, boyut, mtime) -> SHA-256; aynı süreçte aynı dosya tekrar hashlenmez.
+_PARMAK_IZLERI = {}
+
+
+def dosya_parmak_izi(input_path):
+    """
+    Dosyanın parmak izini döndürür: mutlak yol, boyut, değişiklik zamanı ve içerik özeti (SHA-256).
+    İçerik özeti, aynı yol/boyut/mtime için süreç içinde bir kez hesaplanır.
+    """
+    yol = os.path.abspath(input_path)
+    bilgi = os.stat(yol)
+    anahtar = (yol, bilgi.st_size, bilgi.st_mtime_ns)
+
+    ozet = _PARMAK_IZLERI.get(anahtar)
+    if ozet is None:
+        h = hashlib.sha256()
+        with open(yol, 'rb') as f:
+            for blok in iter(lambda: f.read(1 << 20), b''):
+                h.update(blok)
+        ozet = h.hexdigest()
+        _PARMAK_IZLERI[anahtar] = ozet
+
+    return {"yol": yol, "boyut": bilgi.st_size, "mtime_ns": bilgi.st_mtime_ns, "sha256": ozet}
+
+
+def _onbellek_dosyasi(parmak_izi, sheet_name, ihtiyac_sutunu):
+    """Parmak izi, sayfa ve sütun adından önbellek dosyasının yolunu üretir."""
+    anahtar = json.dumps([ONBELLEK_SURUMU, parmak_izi, sheet_name, ihtiyac_sutunu, TEST_ADI_SUTUNU],
+                         sort_keys=True, ensure_ascii=False)
+    ad = hashlib.sha256(anahtar.encode('utf-8')).hexdigest()
+    return os.path.join(ONBELLEK_KLASOR_ADI, f"{ad}.pkl")
+
+
+def _onbellegi_temizle(sinir_bayt):
+    """Önbellek boyutu sınırı aşarsa en eski erişilen (mtime) girdileri siler (LRU)."""
+    try:
+        girdiler = []
+        for ad in os.listdir(ONBELLEK_KLASOR_ADI):
+            if ad.endswith(".pkl"):
+                yol = os.path.join(ONBELLEK_KLASOR_ADI, ad)
+                bilgi = os.stat(yol)
+                girdiler.append((bilgi.st_mtime, bilgi.st_size, yol))
+    except OSError:
+        return
+
+    toplam = sum(boyut for _, boyut, _ in girdiler)
+    for _, boyut, yol in sorted(girdiler):
+        if toplam <= sinir_bayt:
+            break
+        try:
+            os.remove(yol)
+            toplam -= boyut
+        except OSError:
+            pass
+
+
+def excel_on_yukle(input_path):
+    """
+    Dosyanın tüm baytlarını tek okumada belleğe alır; ağ sürücüsündeki bekleme, boru hattında
+    (hastaneleri_isle) önceki hastane hesaplanırken arka plan iş parçacığında geçer.
+    İçerik özeti aynı baytlardan hesaplanıp _PARMAK_IZLERI'ne işlenir, böylece manifest ve
+    önbellek kontrolü dosyayı ikinci kez okumaz. print yapmaz; hatalar Future ile çağırana döner.
+    """
+    yol = os.path.abspath(input_path)
+    bilgi = os.stat(input_path)
+    with open(input_path, 'rb') as f:
+        icerik = f.read()
+
+    # Okuma sırasında dosya değiştiyse özet kaydedilmez (dosya_parmak_izi yeniden hesaplar)
+    son = os.stat(input_path)
+    if len(icerik) == bilgi.st_size and (son.st_size, son.st_mtime_ns) == (bilgi.st_size, bilgi.st_mtime_ns):
+        _PARMAK_IZLERI[(yol, bilgi.st_size, bilgi.st_mtime_ns)] = hashlib.sha256(icerik).hexdigest()
+    return icerik
+
+
+def onbellekli_satirlari_oku(input_path, sheet_name, ihtiyac_sutunu, icerik=None):
+    """
+    excel_satirlarini_oku ile aynı (test_adi, ihtiyac) çiftlerini döndürür; dosya değişmediyse
+    ayrıştırma yapılmadan önbellekteki pickle dosyasından milisaniyeler içinde yükler.
+    Önbellek anahtarı: yol, boyut, mtime, içerik özeti, sayfa adı ve ihtiyaç sütunu.
+    Önbellek kapalıysa (CALISMA_AYARLARI["onbellek"]) doğrudan akış okuyucusunu döndürür.
+    icerik (excel_on_yukle sonucu) verilirse Excel diskten değil bellekteki baytlardan ayrıştırılır.
+    """
+    if not CALISMA_AYARLARI["onbellek"]:
+        kaynak = io.BytesIO(icerik) if icerik is not None else input_path
+        return excel_satirlarini_oku(kaynak, sheet_name, ihtiyac_sutunu)
+
+    return onbellekli_sayfalari_oku(input_path, [sheet_name], ihtiyac_sutunu, icerik)[sheet_name]
+
+
+def onbellekli_sayfalari_oku(input_path, sheet_names, ihtiyac_sutunu, icerik=None):
+    """
+    Birden fazla sayfa için onbellekli_satirlari_oku: önbellekte olan sayfalar oradan yüklenir,
+    kalanların hepsi Excel tek kez açılarak okunur (excel_sayfalarini_oku) ve önbelleğe yazılır.
+    {sayfa adı: [(test_adi, ihtiyac), ...]} döndürür.
+    """
+    kaynak = io.BytesIO(icerik) if icerik is not None else input_path
+    if not CALISMA_AYARLARI["onbellek"]:
+        return excel_sayfalarini_oku(kaynak, sheet_names, ihtiyac_sutunu)
+
+    parmak_izi = dosya_parmak_izi(input_path)
+    sayfalar = {}
+    for sheet_name in sheet_names:
+        onbellek_yolu = _onbellek_dosyasi(parmak_izi, sheet_name, ihtiyac_sutunu)
+        try:
+            with open(onbellek_yolu, 'rb') as f:
+                sayfalar[sheet_name] = pickle.load(f)
+            os.utime(onbellek_yolu)  # LRU için son kullanım zamanını güncelle
+            GUNLUK.debug("(Önbellek) '%s' sayfası önbellekten yüklendi.", sheet_name)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            GUNLUK.warning("UYARI: Önbellek girdisi okunamadı, Excel yeniden okunacak: %s", e)
+
+    eksikler = [sheet_name for sheet_name in sheet_names if sheet_name not in sayfalar]
+    if not eksikler:
+        return sayfalar
+
+    okunan = excel_sayfalarini_oku(kaynak, eksikler, ihtiyac_sutunu)
+    sayfalar.update(okunan)
+
+    # Paralel işçiler (süreçler veya sunucu iş parçacıkları) aynı girdiyi yazabilir: önce geçici
+    # dosyaya yazılır, sonra atomik olarak taşınır.
+    try:
+        os.makedirs(ONBELLEK_KLASOR_ADI, exist_ok=True)
+        for sheet_name, satirlar in okunan.items():
+            onbellek_yolu = _onbellek_dosyasi(parmak_izi, sheet_name, ihtiyac_sutunu)
+            gecici_yol = f"{onbellek_yolu}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(gecici_yol, 'wb') as f:
+                pickle.dump(satirlar, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(gecici_yol, onbellek_yolu)
+        _onbellegi_temizle(CALISMA_AYARLARI["onbellek_mb"] * 1024 * 1024)
+    except OSError as e:
+        GUNLUK.warning("UYARI: Önbelleğe yazılamadı (işlem devam ediyor): %s", e)
+
+    return sayfalar
+
+
+# ÇOK AYLI ÇALIŞMA (--months / --all-months): aynı Excel'in aylık sayfaları tek açılışta okunur.
+
+# (mutlak yol, ihtiyaç sütunu) -> {sayfa adı: satırlar}; grubun henüz işlenmemiş aylarının sayfaları.
+_OKUNMUS_AY_SAYFALARI = {}
+
+
+def ay_sayfasini_oku(input_path, sheet_name, grup_sayfalari, ihtiyac_sutunu, icerik=None):
+    """
+    Çok aylı çalışmada bir ayın satırlarını döndürür. Grubun ilk ayında istenen tüm aylık sayfalar
+    (grup_sayfalari) tek okumada alınır; sonraki aylar bellekten verilir ve verilen sayfa bellekten
+    silinir. Böylece her Excel, kaç ay istenirse istensin bir kez açılır.
+    """
+    anahtar = (os.path.abspath(input_path), ihtiyac_sutunu)
+    okunmus = _OKUNMUS_AY_SAYFALARI.get(anahtar)
+    if okunmus is None or sheet_name not in okunmus:
+        okunmus = onbellekli_sayfalari_oku(input_path, grup_sayfalari, ihtiyac_sutunu, icerik)
+        _OKUNMUS_AY_SAYFALARI[anahtar] = okunmus
+
+    satirlar = okunmus.pop(sheet_name)
+    if not okunmus:
+        del _OKUNMUS_AY_SAYFALARI[anahtar]
+    return satirlar
+
+
+def ay_adini_bul(metin):
+    """Kullanıcının yazdığı ay adını ("Ekim", "EKİM", "ekim") TURKISH_MONTHS'taki yazılışına çevirir; yoksa None."""
+    hedef = turkce_normalize(metin)
+    for ay in TURKISH_MONTHS.values():
+        if turkce_normalize(ay) == hedef:
+            return ay
+    return None
+
+
+def ay_etiketi(kayit):
+    """Çok aylı çalışmada konfigürasyon/sonuç mesajlarına eklenen " [AY]" eki; tek ayda boş."""
+    return f" [{kayit['ay']}]" if kayit.get("ay") else ""
+
+
+def aylara_genislet(configs, aylar=None, tum_aylar=False):
+    """
+    Her hastane konfigürasyonunu istenen her ay için bir kopyaya genişletir (ay, grup_aylari alanlarıyla).
+    tum_aylar=True ise Excel'in sayfa listesinde (workbook.xml) sayfası bulunan tüm aylar alınır;
+    sayfa listesi okunamayan veya hiç aylık sayfası bulunmayan hastane olduğu gibi bırakılır
+    (normal çalıştırmadaki hata mesajıyla başarısız olur).
+    """
+    genisletilmis = []
+    for config in configs:
+        hastane_aylari = list(aylar or [])
+        if tum_aylar:
+            try:
+                sayfa_adlari = sayfa_adlarini_oku(config["input_path"])
+            except (OSError, zipfile.BadZipFile, KeyError, ET.ParseError) as e:
+                GUNLUK.warning("UYARI: '%s' sayfa listesi okunamadı: %s", config["CARI_ADI"], e)
+                sayfa_adlari = []
+            hastane_aylari = [ay for ay in TURKISH_MONTHS.values()
+                              if sayfa_adini_coz(sayfa_adlari, config["sheet_prefix"], ay)]
+
+        if not hastane_aylari:
+            genisletilmis.append(config)
+            continue
+        for ay in hastane_aylari:
+            genisletilmis.append(dict(config, override_month_name=ay, ay=ay, grup_aylari=hastane_aylari))
+    return genisletilmis
+
+
+# SÜTUN BAZLI SİPARİŞ MOTORU: iterrows yerine tüm sayfa tek seferde (dizi işlemleriyle) hesaplanır.
+
+# generate_xml_content'e giden 9 elemanlı tuple'ların alan sırası
+XML_SATIR_ALANLARI = ["stok_kodu", "stok_adi", "miktar", "birim_kod", "vade_tarihi",
+                      "kdv_orani", "depo_kod", "ozelalan1", "id_kodu"]
+
+
+def _tamsayiya_cevir(deger):
+    """int() ile aynı kuralla çevirir; çevrilemeyen değerler için None döndürür."""
+    try:
+        return int(deger)
+    except (ValueError, TypeError, OverflowError):
+        return None
+
+
+def _ihtiyaclari_tamsayiya_cevir(ham):
+    """
+    İhtiyaç sütununu satır bazlı int() ile birebir aynı sonucu verecek şekilde tamsayıya çevirir.
+    Çevrilemeyen (metin, boş vb.) değerler NaN olur.
+    Tamamen sayısal sütunlarda işlem tek vektörel adımdır; metin içeren sütunlarda yalnızca
+    benzersiz değerler tek tek çevrilir (aynı metin bir kez çözülür).
+    """
+    tur = pd.api.types.infer_dtype(ham, skipna=True)
+    if tur in ("integer", "floating", "mixed-integer-float", "decimal", "boolean", "empty"):
+        sayisal = pd.to_numeric(ham, errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+        # int() sıfıra doğru keser (12.7 -> 12, -2.5 -> -2); sonsuz değerler geçersizdir.
+        return np.trunc(np.where(np.isfinite(sayisal), sayisal, np.nan))
+
+    kodlar, benzersiz = pd.factorize(ham)
+    cevrilmis = [_tamsayiya_cevir(deger) for deger in benzersiz]
+    cevrilmis = np.array([np.nan if d is None else d for d in cevrilmis] + [np.nan], dtype="float64")
+    return cevrilmis[kodlar]  # kod -1 (boş hücre) son elemana, yani NaN'a düşer
+
+
+def _benzersiz_metinler(bicimle, *diziler):
+    """
+    Dizilerdeki her benzersiz değer grubu için bicimle() bir kez çağrılır ve sonuç satırlara dağıtılır.
+    Benzersizleştirme sıralama yerine hash ile (pd.factorize) yapılır; birden fazla dizi, kodları
+    karışık tabanlı tek bir tamsayıda birleştirilerek tek seferde faktörize edilir.
+    """
+    birlesik = np.zeros(len(diziler[0]), dtype="int64")
+    tabanlar = []
+    for dizi in diziler:
+        kodlar, benzersiz = pd.factorize(dizi)
+        tabanlar.append(benzersiz)
+        birlesik = birlesik * max(len(benzersiz), 1) + kodlar
+
+    kodlar, birlesik = pd.factorize(birlesik)
+    metinler = []
+    for kod in birlesik:
+        grup = []
+        for benzersiz in reversed(tabanlar):
+            kod, kalan = divmod(int(kod), len(benzersiz))
+            grup.append(benzersiz[kalan])
+        metinler.append(bicimle(*reversed(grup)))
+    return np.array(metinler + [""], dtype=object)[kodlar]
+
+
+def _ozelalan1_bicimle(set_sayisi, set_per_kutu):
+    """OZELALAN1 (Kutu + Set Bilgisi): Örn. 9 set / 4 set'lik kutu -> "2K + 1SET"."""
+    if set_per_kutu <= 0:
+        # Kutu bilgisi yoksa sadece set sayısını yaz
+        return f"{set_sayisi}SET"
+    tam_kutu_sayisi, kalan_set_sayisi = divmod(int(set_sayisi), int(set_per_kutu))
+    parcalar = []
+    if tam_kutu_sayisi > 0:
+        parcalar.append(f"{tam_kutu_sayisi}K")
+    if kalan_set_sayisi > 0:
+        parcalar.append(f"{kalan_set_sayisi}SET")
+    return " + ".join(parcalar)
+
+
+# Metrik kayıtlarında atlanan satırların nedenleri (sipariş motorundaki kontrol sırasıyla)
+ATLAMA_NEDENLERI = ("bos_test_adi", "bilinmeyen_test", "bos_ihtiyac", "tamsayi_degil", "negatif", "sifir")
+
+
+def _atlanan_satirlari_say(sayaclar, bos_ad, kit_no, ham_bos, ihtiyac, gecerli, apply_min_roundup):
+    """Sipariş motorunun maskelerinden satır sayılarını ve atlama nedenlerini sayaçlara ekler."""
+    eslesen = kit_no >= 0
+    nedenler = {
+        "bos_test_adi": bos_ad,
+        "bilinmeyen_test": ~bos_ad & ~eslesen,
+        "bos_ihtiyac": eslesen & ham_bos,
+        "tamsayi_degil": eslesen & ~ham_bos & np.isnan(ihtiyac),
+        "negatif": eslesen & (ihtiyac < 0),
+        "sifir": eslesen & (ihtiyac == 0) & (not apply_min_roundup),
+    }
+    for alan, sayi in (("taranan_satir", len(kit_no)), ("eslesen_satir", int(eslesen.sum())),
+                       ("uretilen_satir", int(gecerli.sum()))):
+        sayaclar[alan] = sayaclar.get(alan, 0) + sayi
+    atlanan = sayaclar.setdefault("atlanan", dict.fromkeys(ATLAMA_NEDENLERI, 0))
+    for neden in ATLAMA_NEDENLERI:
+        atlanan[neden] += int(nedenler[neden].sum())
+
+
+# KİT BOYU OPTİMİZASYONU (--optimize-kits): aynı testin birden fazla boyu varsa (TSH_100 / TSH_2000)
+# ihtiyaç, hastaneye sabitlenen boy yerine en az fazla testle karşılayan boy karışımıyla sipariş edilir.
+
+# (aile_no, ihtiyaç) -> ((kit sırası, set sayısı), ...); aynı ihtiyaç tüm hastanelerde bir kez çözülür.
+_KARISIM_COZUMLERI = {}
+
+# Bu kadar birimi (set boylarının ortak böleni cinsinden) aşan ihtiyacın fazlası doğrudan en büyük boyla
+# karşılanır; DP tablosu hatalı girilmiş dev ihtiyaçlarda da küçük kalır (fazla test yine sıfırdır).
+_KARISIM_DP_SINIRI = 10000
+
+
+def en_az_fazlali_karisim(aile_no, ihtiyac):
+    """
+    Ailedeki boylardan ihtiyacı karşılayan set karışımını küçük bir tamsayı DP'siyle bulur: önce fazla
+    test en aza, eşitlikte toplam set sayısı en aza indirilir; yine eşitse büyük boy tercih edilir.
+    ((kit sırası, set sayısı), ...) döndürür, büyük boydan küçüğe. İhtiyaç 0 ise en küçük boydan 1 set.
+    """
+    anahtar = (aile_no, ihtiyac)
+    karisim = _KARISIM_COZUMLERI.get(anahtar)
+    if karisim is not None:
+        return karisim
+
+    kitler = KIT_KATALOGU.aileler[aile_no]
+    boylar = [int(kit.test_per_set) for kit in kitler]
+    ortak = math.gcd(*boylar)
+    birimler = [boy // ortak for boy in boylar]
+    hedef = -(-max(ihtiyac, 1) // ortak)
+
+    sayilar = [0] * len(kitler)
+    if hedef > _KARISIM_DP_SINIRI:
+        sayilar[0] = (hedef - _KARISIM_DP_SINIRI) // birimler[0]
+        hedef -= sayilar[0] * birimler[0]
+
+    # en_az[t]: toplamı tam t birim olan en az set sayısı; en küçük boyun katlarından biri
+    # [hedef, hedef + en küçük birim) aralığına düştüğü için tablo orada biter.
+    sinir = hedef + birimler[-1] - 1
+    yok = sinir + 1
+    en_az = [0] + [yok] * sinir
+    secim = [-1] * (sinir + 1)
+    for toplam in range(1, sinir + 1):
+        for i, birim in enumerate(birimler):
+            if birim <= toplam and en_az[toplam - birim] + 1 < en_az[toplam]:
+                en_az[toplam] = en_az[toplam - birim] + 1
+                secim[toplam] = i
+
+    toplam = next(t for t in range(hedef, sinir + 1) if en_az[t] < yok)
+    while toplam:
+        i = secim[toplam]
+        sayilar[i] += 1
+        toplam -= birimler[i]
+
+    karisim = tuple((kit.sira, sayi) for kit, sayi in zip(kitler, sayilar) if sayi)
+    _KARISIM_COZUMLERI[anahtar] = karisim
+    return karisim
+
+
+def kit_karisimlarini_uygula(kit_no, ihtiyac, set_sayisi, satir_kodu, sayaclar=None):
+    """
+    Ailesi olan kitlere düşen sipariş satırlarını en_az_fazlali_karisim sonucuna göre böler: her
+    boy ayrı bir satır olur (büyükten küçüğe, kaynak satırın yerinde); diğer satırlar aynen kalır.
+    Yeni (kit_no, set_sayisi, satir_kodu) dizilerini döndürür. sayaclar verilirse bölünen satır
+    sayısı ve fazla test toplamının önceki/sonraki değeri "kit_optimizasyonu" altına eklenir.
+    """
+    test_per_set = KIT_KATALOGU.sutunlar["test_per_set"]
+    aileli = np.flatnonzero(KIT_KATALOGU.sutunlar["aile"][kit_no] >= 0)
+    karisimlar = [en_az_fazlali_karisim(int(KIT_KATALOGU.sutunlar["aile"][kit_no[i]]), int(ihtiyac[i]))
+                  for i in aileli]
+
+    if sayaclar is not None:
+        ozet = sayaclar.get("kit_optimizasyonu") or {"satir": 0, "fazla_test_once": 0, "fazla_test_sonra": 0}
+        for i, karisim in zip(aileli, karisimlar):
+            ozet["satir"] += 1
+            ozet["fazla_test_once"] += int(set_sayisi[i] * test_per_set[kit_no[i]] - ihtiyac[i])
+            ozet["fazla_test_sonra"] += int(sum(sayi * test_per_set[kit] for kit, sayi in karisim) - ihtiyac[i])
+        sayaclar["kit_optimizasyonu"] = ozet
+
+    adetler = np.ones(len(kit_no), dtype="int64")
+    adetler[aileli] = [len(karisim) for karisim in karisimlar]
+    kaynak = np.repeat(np.arange(len(kit_no)), adetler)
+    yeni_kit_no = kit_no[kaynak]
+    yeni_set_sayisi = set_sayisi[kaynak]
+    baslangiclar = np.cumsum(adetler) - adetler
+    for i, karisim in zip(aileli, karisimlar):
+        for j, (kit, sayi) in enumerate(karisim):
+            yeni_kit_no[baslangiclar[i] + j] = kit
+            yeni_set_sayisi[baslangiclar[i] + j] = sayi
+    return yeni_kit_no, yeni_set_sayisi, satir_kodu[kaynak]
+
+
+def siparis_satirlarini_hesapla(satirlar, kit_tablosu, apply_min_roundup, sayaclar=None, kit_optimizasyonu=False):
+    """
+    (test_adi, ihtiyac) çiftlerinden sipariş satırlarını sütun bazlı (vektörel) olarak hesaplar.
+
+    Test adları bir kez faktörize edilir; kırpma ve hastanenin çözüm tablosundaki (hastane_kit_tablosu;
+    birebir, bulunamazsa normalize edilmiş ad) arama yalnızca benzersiz adlar için yapılır ve sonuç satırlara dizi indekslemeyle
+    dağıtılır (hash join).
+    Set sayısı ve TEST miktarı dizi işlemleriyle, OZELALAN1 ("xK + ySET") ve miktar metinleri
+    benzersiz değer başına bir kez üretilir. Eski satır satır döngüyle birebir aynı satırları
+    aynı sırada döndürür.
+
+    Dönen DataFrame sütunları: test_adi, stok_map_key, sayısal ihtiyac / set_sayisi / test_miktari /
+    set_per_kutu ve generate_xml_content'in beklediği 9 alan (XML_SATIR_ALANLARI).
+
+    sayaclar (sözlük) verilirse taranan/eşleşen/üretilen satır sayıları, atlanan satırların
+    nedene göre dağılımı (ATLAMA_NEDENLERI) ve hiçbir kitle eşleşmeyen adların Excel satır
+    numaraları ("eslesmeyen_satirlar") bu sözlüğe eklenir.
+
+    kit_optimizasyonu=True ise birden fazla boyu olan kitlerin satırları, sabitlenmiş boyu yukarı
+    yuvarlamak yerine en az fazla testli boy karışımına bölünür (kit_karisimlarini_uygula).
+    """
+    df = pd.DataFrame.from_records(satirlar, columns=["test_adi", "ihtiyac"])
+    tablo = KIT_KATALOGU.sutunlar
+
+    # 1-2. Test adı -> kit kaydı (hastaneye özel eşleşme dahil); boş adların kodu -1'dir
+    test_kodlari, test_adlari = pd.factorize(df["test_adi"].to_numpy(dtype=object))
+    kirpilmis = [str(ad).strip() for ad in test_adlari]
+    kitler = [kit_tablosu.get(ad) for ad in kirpilmis]
+    kit_no = np.array([kit.sira if kit is not None else -1 for kit in kitler] + [-1],
+                      dtype="int64")[test_kodlari]
+
+    # 3. İhtiyaç miktarı: boş veya tamsayıya çevrilemeyen satırlar atlanır
+    ihtiyac = _ihtiyaclari_tamsayiya_cevir(df["ihtiyac"])
+
+    # 4. Yuvarlama kuralı: pozitifler yukarı yuvarlanır, 0 yalnızca kural aktifse 1 set olur
+    gecerli = (kit_no >= 0) & ((ihtiyac > 0) | ((ihtiyac == 0) & bool(apply_min_roundup)))
+
+    if sayaclar is not None:
+        bos_ad = np.array([ad == "" for ad in kirpilmis] + [True], dtype=bool)[test_kodlari]
+        _atlanan_satirlari_say(sayaclar, bos_ad, kit_no, df["ihtiyac"].isna().to_numpy(),
+                               ihtiyac, gecerli, apply_min_roundup)
+
+        # Hiçbir kitle eşleşmeyen adlar ve Excel satır numaraları (1. satır başlıktır)
+        eslesmeyen = sayaclar.setdefault("eslesmeyen_satirlar", {})
+        maske = ~bos_ad & (kit_no < 0)
+        for kod, satir_no in zip(test_kodlari[maske], np.flatnonzero(maske) + 2):
+            eslesmeyen.setdefault(kirpilmis[kod], []).append(int(satir_no))
+
+    satir_kodu = test_kodlari[gecerli]
+    kit_no = kit_no[gecerli]
+    ihtiyac = ihtiyac[gecerli]
+
+    test_per_set = tablo["test_per_set"][kit_no]
+    set_per_kutu = tablo["set_per_kutu"][kit_no]
+
+    set_sayisi = np.where(ihtiyac > 0, np.ceil(ihtiyac / test_per_set), 1).astype("int64")
+
+    if kit_optimizasyonu:
+        kit_no, set_sayisi, kaynak = kit_karisimlarini_uygula(kit_no, ihtiyac, set_sayisi,
+                                                              np.arange(len(kit_no)), sayaclar)
+        satir_kodu = satir_kodu[kaynak]
+        test_per_set = tablo["test_per_set"][kit_no]
+        set_per_kutu = tablo["set_per_kutu"][kit_no]
+        # Bölünen satırın ihtiyacı boylara sırayla dağıtılır; boyların ihtiyaç toplamı Excel satırına eşittir
+        kapasite = set_sayisi * test_per_set
+        oncesi = np.cumsum(kapasite) - kapasite
+        oncesi -= oncesi[np.searchsorted(kaynak, kaynak)]
+        ihtiyac = np.clip(ihtiyac[kaynak] - oncesi, 0, kapasite)
+
+    # --- XML ÇIKTI DEĞERLERİ ---
+    test_miktari = np.trunc(set_sayisi * test_per_set).astype("int64")
+
+    sutunlar = {
+        "test_adi": np.array(kirpilmis, dtype=object)[satir_kodu] if len(kirpilmis) else np.array([], dtype=object),
+        "stok_map_key": tablo["anahtar"][kit_no],
+        "ihtiyac": ihtiyac.astype("int64"),
+        "set_sayisi": set_sayisi,
+        "test_miktari": test_miktari,
+        "set_per_kutu": set_per_kutu,
+    }
+    for alan in KitKatalogu.SABIT_ALANLAR:
+        sutunlar[alan] = tablo[alan][kit_no]
+    sutunlar["miktar"] = _benzersiz_metinler(str, test_miktari)
+    sutunlar["birim_kod"] = np.full(len(kit_no), "TEST", dtype=object)
+    sutunlar["ozelalan1"] = _benzersiz_metinler(_ozelalan1_bicimle, set_sayisi, set_per_kutu)
+
+    return pd.DataFrame(sutunlar)
+
+
+def xml_satirlarina_cevir(siparis):
+    """siparis_satirlarini_hesapla sonucunu generate_xml_content'in beklediği 9'lu tuple listesine çevirir."""
+    return list(zip(*(siparis[alan].to_numpy(dtype=object) for alan in XML_SATIR_ALANLARI)))
+
+
 # DEPO PROGRAMI FORMATINA UYGUN XML OLUŞTURMA FONKSİYONU
-def generate_xml_content(lines, cari_id, cari_adi):
+
+# Tek bir <Satir> elementinin şablonu (satır başına 17 ayrı f-string yerine tek format çağrısı)
+SATIR_SABLONU = "\n".join([
+    '<Satir>',
+    '<SIRANO>{sirano}</SIRANO>',
+    '<KARTTIPI>S</KARTTIPI>',
+    '<STOKKOD>{stok_kodu}</STOKKOD>',
+    '<STOKADI>{stok_adi}</STOKADI>',
+    '<MIKTAR>{miktar}</MIKTAR>',  # TEST Miktarı
+    '<BIRIMKOD>{birim_kod}</BIRIMKOD>',  # TEST Birimi
+    '<SEMBOL>TL</SEMBOL>',
+    '<KUR_YEREL>1</KUR_YEREL>',
+    '<VADE_TARIHI>{vade_tarihi}</VADE_TARIHI>',  # D.M.YYYY formatında
+    '<KDVORANI>{kdv_orani}</KDVORANI>',
+    '<DEPOKOD>{depo_kod}</DEPOKOD>',
+    '<ID>{id_kodu}</ID>',
+    '<OZELALAN1>{ozelalan1}</OZELALAN1>',  # DİNAMİK OZELALAN1 (Kutu+Set Bilgisi)
+    '<ERP_LOT_CIKIS_GIRIS_HARID>-1</ERP_LOT_CIKIS_GIRIS_HARID>',
+    '<SIPHARID>-1</SIPHARID>',
+    '</Satir>',
+]) + "\n"
+
+
+def xml_parcalari(lines, cari_id, cari_adi, kacis=False, fisno=None, saat=None):
     """
-    Verilen satırları kullanarak DEPO PROGRAMI formatına uygun (element tabanlı) XML içeriğini oluşturur.
+    DEPO PROGRAMI formatındaki XML'i parça parça üreten generator.
+    Önce başlık (header), sonra her <Satir> için bir parça, en son kapanış etiketleri üretilir;
+    parçalar art arda yazıldığında generate_xml_content ile bayt bayt aynı metin elde edilir.
+    kacis=True ise tüm değişken metin alanları XML kaçışından geçirilir.
+    fisno / saat verilmezse FISNO rastgele, FISSAAT/SEVKSAAT o anki saattir (bkz. fis_kimligi).
     """
-    # ... (Fonksiyonun İçeriği Aynı Kaldı) ...
+    if kacis:
+        from xml.sax.saxutils import escape as kac  # urllib'i de yüklediği için yalnızca gerektiğinde
+    else:
+        kac = str
+
     OWNERID = "12600"
-    FISNO = str(random.randint(90000000, 99999999))
+    FISNO = str(fisno) if fisno is not None else str(random.randint(90000000, 99999999))
 
     # SEHIR/ULKE: Cari ID'ye göre tahmin.
     SEHIR = "BİLİNMİYOR"
@@ -468,80 +1678,219 @@ def generate_xml_content(lines, cari_id, cari_adi):
 
     # Tarih ve Saatler
     bugunun_tarihi_obj = datetime.datetime.today().date()
-    xml_saat_str = datetime.datetime.now().strftime("%H:%M:%S")
+    xml_saat_str = saat or datetime.datetime.now().strftime("%H:%M:%S")
 
     # Kritik: OLE Automation Date formatına çevir (Örn: 45938)
     fistar_ole = date_to_ole_format(bugunun_tarihi_obj)
 
-    xml_lines = [
+    # HEADER (<Fis> altında alt elementler olarak)
+    yield "\n".join([
         '<?xml version="1.0" encoding="utf-8"?>',
-        '<Fis>'
-    ]
-
-    # HEADER (Şimdi <Fis> altında alt elementler olarak)
-    xml_lines.append(f'<OWNERID>{OWNERID}</OWNERID>')
-    xml_lines.append(f'<FISNO>{FISNO}</FISNO>')
-    xml_lines.append(f'<CARIID>{cari_id}</CARIID>')
-    xml_lines.append(f'<CARIADI>{cari_adi}</CARIADI>')
-    xml_lines.append(f'<SEHIR>{SEHIR}</SEHIR>')
-    xml_lines.append(f'<ULKE>{ULKE}</ULKE>')
-    xml_lines.append(f'<FISTAR>{fistar_ole}</FISTAR>')  # OLE Tarih formatı
-    xml_lines.append(f'<FISSAAT>{xml_saat_str}</FISSAAT>')
-    xml_lines.append(f'<SEVKTAR>{fistar_ole}</SEVKTAR>')  # OLE Tarih formatı
-    xml_lines.append(f'<SEVKSAAT>{xml_saat_str}</SEVKSAAT>')
-    xml_lines.append(f'<SevkPlakalari/>')  # Boş etiket
-
-    # İSTENEN NOTLAR ETİKETİ BURAYA EKLENDİ
-    xml_lines.append(f'<Notlar>{NOTLAR}</Notlar>')
-
-    xml_lines.append('<Satirlar>')
+        '<Fis>',
+        f'<OWNERID>{OWNERID}</OWNERID>',
+        f'<FISNO>{FISNO}</FISNO>',
+        f'<CARIID>{kac(cari_id)}</CARIID>',
+        f'<CARIADI>{kac(cari_adi)}</CARIADI>',
+        f'<SEHIR>{SEHIR}</SEHIR>',
+        f'<ULKE>{ULKE}</ULKE>',
+        f'<FISTAR>{fistar_ole}</FISTAR>',  # OLE Tarih formatı
+        f'<FISSAAT>{xml_saat_str}</FISSAAT>',
+        f'<SEVKTAR>{fistar_ole}</SEVKTAR>',  # OLE Tarih formatı
+        f'<SEVKSAAT>{xml_saat_str}</SEVKSAAT>',
+        '<SevkPlakalari/>',  # Boş etiket
+        f'<Notlar>{kac(NOTLAR)}</Notlar>',
+        '<Satirlar>',
+    ]) + "\n"
+
+    # VADE_TARIHI dönüşümü (D.M.YYYY) tüm satırlarda genelde aynı tarih olduğu için bir kez yapılır
+    vade_tarihleri = {}
 
     # LINE Loop
     for index, item in enumerate(lines):
-        line_number = index + 1
         # Tuple Eşleşmesi:
         # 0:STOK KODU, 1:STOK ADI, 2:MİKTAR (TEST), 3:BİRİM KOD (TEST), 4:VADE TARİHİ, 5:KDV ORANI, 6:DEPO KOD, 7:OZELALAN1, 8:ID
         stok_kodu, stok_adi, miktar, birim_kod, vade_tarihi_str, kdv_orani, depo_kod, ozelalan1, id_kodu = item
 
-        # VADE_TARIHI formatını depo programının istediği şekilde düzenle (D.M.YYYY)
-        vade_tarihi_formatli = format_date_d_m_yyyy_manual(vade_tarihi_str)
-
-        # Sabit Satır Bilgileri
-        KARTTIPI = "S"
-        SEMBOL = "TL"
-        KUR_YEREL = "1"
-        ERP_LOT_CIKIS_GIRIS_HARID = "-1"
-        SIPHARID = "-1"
-
-        # XML Satırı (Elementler olarak)
-        xml_lines.append('<Satir>')
-        xml_lines.append(f'<SIRANO>{line_number}</SIRANO>')
-        xml_lines.append(f'<KARTTIPI>{KARTTIPI}</KARTTIPI>')
-        xml_lines.append(f'<STOKKOD>{stok_kodu}</STOKKOD>')
-        xml_lines.append(f'<STOKADI>{stok_adi}</STOKADI>')
-        xml_lines.append(f'<MIKTAR>{miktar}</MIKTAR>')  # TEST Miktarı
-        xml_lines.append(f'<BIRIMKOD>{birim_kod}</BIRIMKOD>')  # TEST Birimi
-        xml_lines.append(f'<SEMBOL>{SEMBOL}</SEMBOL>')
-        xml_lines.append(f'<KUR_YEREL>{KUR_YEREL}</KUR_YEREL>')
-        xml_lines.append(f'<VADE_TARIHI>{vade_tarihi_formatli}</VADE_TARIHI>')  # D.M.YYYY formatında
-        xml_lines.append(f'<KDVORANI>{kdv_orani}</KDVORANI>')
-        xml_lines.append(f'<DEPOKOD>{depo_kod}</DEPOKOD>')
-        xml_lines.append(f'<ID>{id_kodu}</ID>')
-        # DİNAMİK OZELALAN1 (Kutu+Set Bilgisi)
-        xml_lines.append(f'<OZELALAN1>{ozelalan1}</OZELALAN1>')
-        xml_lines.append(f'<ERP_LOT_CIKIS_GIRIS_HARID>{ERP_LOT_CIKIS_GIRIS_HARID}</ERP_LOT_CIKIS_GIRIS_HARID>')
-        xml_lines.append(f'<SIPHARID>{SIPHARID}</SIPHARID>')
-        xml_lines.append('</Satir>')
-
-    xml_lines.append('</Satirlar>')
-    xml_lines.append('</Fis>')
-    return "\n".join(xml_lines)
-
-
-def process_hospital_data(config):
-    """Belirtilen Excel dosyasını okur, veriyi işler ve XML çıktısı oluşturur."""
+        vade_tarihi_formatli = vade_tarihleri.get(vade_tarihi_str)
+        if vade_tarihi_formatli is None:
+            vade_tarihi_formatli = format_date_d_m_yyyy_manual(vade_tarihi_str)
+            vade_tarihleri[vade_tarihi_str] = vade_tarihi_formatli
+
+        yield SATIR_SABLONU.format(
+            sirano=index + 1,
+            stok_kodu=kac(stok_kodu),
+            stok_adi=kac(stok_adi),
+            miktar=kac(miktar),
+            birim_kod=kac(birim_kod),
+            vade_tarihi=kac(vade_tarihi_formatli),
+            kdv_orani=kac(kdv_orani),
+            depo_kod=kac(depo_kod),
+            id_kodu=kac(id_kodu),
+            ozelalan1=kac(ozelalan1),
+        )
+
+    yield '</Satirlar>\n</Fis>'
+
+
+def generate_xml_content(lines, cari_id, cari_adi, kacis=False, fisno=None, saat=None):
+    """
+    Verilen satırları kullanarak DEPO PROGRAMI formatına uygun (element tabanlı) XML içeriğini oluşturur.
+    Tüm metni bellekte birleştirir; büyük fişler için xml_dosyasina_yaz tercih edilmelidir.
+    """
+    return "".join(xml_parcalari(lines, cari_id, cari_adi, kacis=kacis, fisno=fisno, saat=saat))
+
+
+def xml_dosyasina_yaz(output_path, lines, cari_id, cari_adi, kacis=False, sureler=None, fisno=None, saat=None):
+    """
+    XML'i tek bir büyük string oluşturmadan, parçalar halinde tamponlu dosyaya yazar.
+    Bellek kullanımı fişteki satır sayısından bağımsızdır. Yazılan bayt sayısını döndürür.
+    sureler (sözlük) verilirse parçaların üretimi "xml", dosyaya yazma "yazma" fazına eklenir.
+    """
+    parcalar = xml_parcalari(lines, cari_id, cari_adi, kacis=kacis, fisno=fisno, saat=saat)
+    if sureler is None:
+        with open(output_path, 'w', encoding='utf-8', buffering=1 << 16) as f:
+            for parca in parcalar:
+                f.write(parca)
+        return os.path.getsize(output_path)
+
+    uretim = 0.0
+    baslangic = time.perf_counter()
+    with open(output_path, 'w', encoding='utf-8', buffering=1 << 16) as f:
+        while True:
+            once = time.perf_counter()
+            parca = next(parcalar, None)
+            uretim += time.perf_counter() - once
+            if parca is None:
+                break
+            f.write(parca)
+    toplam = time.perf_counter() - baslangic
+    sureler["xml"] = sureler.get("xml", 0.0) + uretim
+    sureler["yazma"] = sureler.get("yazma", 0.0) + toplam - uretim
+    return os.path.getsize(output_path)
+
+
+# DETERMİNİSTİK FİŞLER: Aynı hastane ve aynı satırlar her zaman aynı FISNO'lu, aynı baytlı fişi üretir.
+
+# Deterministik modda FISSAAT/SEVKSAAT (saat içerikten türetilemez, sabitlenir)
+DETERMINISTIK_SAAT = "00:00:00"
+
+
+def fis_kimligi(cari_id, cari_adi, lines, kacis=False):
+    """
+    Fişin içerik özetini (SHA-256, hex) ve bundan türetilen FISNO'yu döndürür.
+    Özete cari bilgileri, fiş tarihi (FISTAR, yani çalıştırmanın yapıldığı gün), kaçış ayarı ve tüm
+    satırlar girer. Bu yüzden "aynı içerikli fiş daha önce üretildi" yalnızca aynı gün içinde geçerlidir;
+    ertesi gün aynı satırlar yeni bir fiş (yeni özet ve FISNO) üretir. FISNO rastgele üretilenlerle aynı
+    aralıktadır (90000000-99999999) ve özetin yalnızca bir kısmından türediği için farklı iki fişte
+    aynı çıkabilir; depoda kullanılacak numara fisno_ayir ile kesinleşir.
+    """
+    h = hashlib.sha256()
+    # Satır şablonu da özete girer: XML biçimi değişirse eski fişler "aynı" sayılmaz
+    h.update(json.dumps([SATIR_SABLONU, cari_id, cari_adi, date_to_ole_format(datetime.datetime.today().date()),
+                         bool(kacis)], ensure_ascii=False).encode('utf-8'))
+    for satir in lines:
+        h.update(json.dumps([str(alan) for alan in satir], ensure_ascii=False).encode('utf-8'))
+    ozet = h.hexdigest()
+    return ozet, 90000000 + int(ozet[:15], 16) % 10000000
+
+
+# İçerik deposunda her FISNO'nun hangi içerik özetine ayrıldığı: FISNO/<fisno> dosyası özeti içerir
+FISNO_KLASORU = "FISNO"
+_FISNO_TABANI = 90000000
+_FISNO_ARALIGI = 10000000
+
+
+def fisno_ayir(icerik_ozeti, fisno):
+    """
+    FISNO'yu içerik deposunda (ICERIK_DEPOSU/FISNO) bu içerik özetine ayırır ve kullanılacak numarayı
+    döndürür. Numara başka bir özete ayrılmışsa (iki farklı fişin FISNO'su çakışmışsa) sıradaki numara
+    denenir; 99999999'dan sonra 90000000'a dönülür. Ayırma dosyası özel olarak (O_EXCL) oluşturulduğu için
+    paralel işçiler aynı numarayı alamaz; aynı özet her çalıştırmada aynı numarayı bulur.
+    Depoya yazılamıyorsa uyarı verilir ve türetilen numara olduğu gibi kullanılır.
+    """
+    klasor = os.path.join(ICERIK_DEPOSU, FISNO_KLASORU)
+    try:
+        os.makedirs(klasor, exist_ok=True)
+        for deneme in range(_FISNO_ARALIGI):
+            aday = _FISNO_TABANI + (fisno - _FISNO_TABANI + deneme) % _FISNO_ARALIGI
+            yol = os.path.join(klasor, str(aday))
+            try:
+                fd = os.open(yol, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+            except FileExistsError:
+                with open(yol, 'r', encoding='ascii') as f:
+                    if f.read().strip() == icerik_ozeti:
+                        return aday
+                continue
+            with os.fdopen(fd, 'w', encoding='ascii') as f:
+                f.write(icerik_ozeti)
+            if aday != fisno:
+                GUNLUK.warning("UYARI: FISNO %s başka bir fişe ait; bu fiş için %s kullanıldı.", fisno, aday)
+            return aday
+    except OSError as e:
+        GUNLUK.warning("UYARI: FISNO içerik deposunda ayrılamadı, çakışma denetlenmedi: %s", e)
+    return fisno
+
+
+def icerik_deposuna_ekle(output_path, depo_yolu):
+    """
+    Yazılmış fişi içerik deposuna ekler. Mümkünse sabit bağlantı (hard link) kullanılır ve dosya
+    ikinci kez yazılmaz; desteklenmiyorsa kopyalanır. Depo dosyası atomik olarak yerine konur.
+    """
+    os.makedirs(os.path.dirname(depo_yolu), exist_ok=True)
+    gecici = f"{depo_yolu}.{os.getpid()}.tmp"
+    try:
+        os.link(output_path, gecici)
+    except OSError:
+        shutil.copyfile(output_path, gecici)
+    os.replace(gecici, depo_yolu)
+
+
+def _xml_yazma_gorevi(output_path, lines, cari_id, cari_adi, kacis, metrik, fisno=None, saat=None, depo_yolu=None):
+    """
+    XML'i yazar, metriğe işler, deterministik modda içerik deposuna ekler ve dosya yolunu döndürür.
+    Boru hattında yazıcı iş parçacığında çalışır.
+    """
+    metrik["yazilan_bayt"] += xml_dosyasina_yaz(output_path, lines, cari_id, cari_adi, kacis=kacis,
+                                                sureler=metrik["sureler_s"], fisno=fisno, saat=saat)
+    if depo_yolu:
+        try:
+            icerik_deposuna_ekle(output_path, depo_yolu)
+        except OSError as e:
+            GUNLUK.warning("UYARI: Fiş içerik deposuna eklenemedi (sonraki çalıştırmada yeniden yazılır): %s", e)
+    return output_path
+
+
+@contextlib.contextmanager
+def faz_suresi(metrik, faz):
+    """with bloğunun süresini metrik["sureler_s"][faz] değerine ekler (saniye)."""
+    baslangic = time.perf_counter()
+    try:
+        yield
+    finally:
+        sureler = metrik["sureler_s"]
+        sureler[faz] = sureler.get(faz, 0.0) + time.perf_counter() - baslangic
+
+
+def process_hospital_data(config, metrik=None, on_yukleme=None, yazici=None, siparis_kaydi=None, yaz=True):
+    """
+    Belirtilen Excel dosyasını okur, veriyi işler ve XML çıktısı oluşturur.
+    Başarılı olursa kaydedilen XML dosyasının yolunu, aksi halde None döndürür.
+    metrik (yeni_metrik ile oluşturulmuş kayıt) verilirse faz süreleri, satır sayıları,
+    atlama nedenleri ve yazılan bayt sayısı bu kayda işlenir.
+
+    Boru hattı (hastaneleri_isle) için:
+    - on_yukleme: Excel baytlarını veren Future (excel_on_yukle); dosya diskten yeniden okunmaz.
+    - yazici: tek iş parçacıklı ThreadPoolExecutor; verilirse XML arka planda yazılır ve dosya
+      yolu yerine, yazma bitince dosya yolunu veren bir Future döndürülür.
+    siparis_kaydi (liste) verilirse hesaplanan sipariş satırları (siparis_satirlarini_hesapla
+    DataFrame'i) bu listeye eklenir; konsolide satın alma özeti bunlardan hesaplanır.
+    yaz=False ise satırlar hesaplanır ama XML yazılmaz ve None döner (--diff-against).
+    """
     global TUM_CIKTILAR_YOLU
 
+    if metrik is None:
+        metrik = yeni_metrik(config)
+
     cari_adi = config["CARI_ADI"]
     input_path = config["input_path"]
     output_prefix = config["output_prefix"]
@@ -550,175 +1899,2148 @@ def process_hospital_data(config):
     override_month_name = config.get("override_month_name")
     ihtiyac_sutunu = config["ihtiyac_sutunu"]
     apply_min_roundup = config["apply_min_roundup"]
-    # YENİ: Hastaneye özel kit eşleştirme haritasını al
-    hospital_kit_map = config.get("kit_eslestirme", {})
 
-    print(f"\n--- {cari_adi} ({cari_id}) İşleniyor ---")
-    print(f"Excel Yolu: {input_path}")
-    print(f"İhtiyaç Sütunu: {ihtiyac_sutunu}")
-    print(f"Minimum Yuvarlama Kuralı (0 -> 1 Set/Kutu): {'Aktif' if apply_min_roundup else 'Pasif'}")
+    GUNLUK.info("\n--- %s (%s)%s İşleniyor ---", cari_adi, cari_id, ay_etiketi(config))
+    GUNLUK.info("Excel Yolu: %s", input_path)
+    GUNLUK.info("İhtiyaç Sütunu: %s", ihtiyac_sutunu)
+    GUNLUK.info("Minimum Yuvarlama Kuralı (0 -> 1 Set/Kutu): %s", "Aktif" if apply_min_roundup else "Pasif")
 
     try:
-        # Dinamik sayfa adını bulmaya çalış
-        dynamic_sheet_name, current_month_name = get_dynamic_sheet_name(sheet_prefix, override_month_name)
-
-        # Excel dosyasını oku
+        # Hastaneye özel kit eşleştirmeleri dahil derlenmiş "test adı -> kit" tablosu
+        kit_tablosu = hastane_kit_tablosu(config)
+
+        with faz_suresi(metrik, "okuma"):
+            icerik = on_yukleme.result() if on_yukleme is not None else None
+
+        # Dinamik sayfa adını tahmin et ve dosyanın sayfa listesinde (yalnızca workbook.xml) ara
+        with faz_suresi(metrik, "sayfa_adi"):
+            beklenen_sayfa_adi, current_month_name = get_dynamic_sheet_name(sheet_prefix, override_month_name)
+            sayfa_adlari = sayfa_adlarini_oku(input_path, icerik)
+            dynamic_sheet_name = sayfa_adini_coz(sayfa_adlari, sheet_prefix,
+                                                 override_month_name or current_month_name)
+
+        if dynamic_sheet_name is None:
+            GUNLUK.warning("HATA: Excel dosyasında beklenen sayfa adı bulunamadı. Beklenen ad: '%s'. "
+                           "Lütfen sayfa adını kontrol edin. Dosyadaki sayfalar: %s",
+                           beklenen_sayfa_adi, sayfa_adlari)
+            return None
+        if dynamic_sheet_name != beklenen_sayfa_adi:
+            GUNLUK.info("(Bilgi) '%s' yerine '%s' sayfası eşleştirildi.", beklenen_sayfa_adi, dynamic_sheet_name)
+        metrik["sayfa"] = dynamic_sheet_name
+
+        # Excel dosyasını aç (yalnızca TEST ADI ve ihtiyaç sütunları okunur; değişmediyse önbellekten gelir).
+        # Okuma süresinin hesaplamaya karışmaması için satırlar bu fazda listeye alınır.
         try:
-            df = pd.read_excel(input_path, sheet_name=dynamic_sheet_name)
+            with faz_suresi(metrik, "okuma"):
+                if config.get("ay"):
+                    # Çok aylı çalışma: grubun bulunabilen tüm aylık sayfaları tek açılışta okunur
+                    grup_sayfalari = [ad for ad in (sayfa_adini_coz(sayfa_adlari, sheet_prefix, ay)
+                                                    for ay in config["grup_aylari"]) if ad]
+                    satirlar = ay_sayfasini_oku(input_path, dynamic_sheet_name, grup_sayfalari,
+                                                ihtiyac_sutunu, icerik=icerik)
+                else:
+                    satirlar = list(onbellekli_satirlari_oku(input_path, dynamic_sheet_name, ihtiyac_sutunu,
+                                                             icerik=icerik))
+                del icerik
         except ValueError as e:
-            if f"Worksheet named '{dynamic_sheet_name}' not found" in str(e):
-                print(f"HATA: Excel dosyasında beklenen sayfa adı bulunamadı. "
-                      f"Beklenen ad: '{dynamic_sheet_name}'. Lütfen sayfa adını kontrol edin.")
-            else:
-                print(f"HATA: Excel dosyası okunurken bilinmeyen bir hata oluştu: {e}")
-            return
+            GUNLUK.warning("HATA: Excel dosyası okunurken bir hata oluştu: %s", e)
+            return None
+
+        GUNLUK.info("Sayfa: '%s' başarıyla açıldı.", dynamic_sheet_name)
+
+        # Tüm satırlar tek seferde, sütun bazlı hesaplanır
+        with faz_suresi(metrik, "hesaplama"):
+            siparis = siparis_satirlarini_hesapla(satirlar, kit_tablosu, apply_min_roundup, sayaclar=metrik,
+                                                  kit_optimizasyonu=CALISMA_AYARLARI["kit_optimizasyonu"])
+            xml_lines_data = xml_satirlarina_cevir(siparis)
+
+        # Debug çıktısı: Hangi kitin seçildiğini göster (satır başına bir kayıt; yalnızca --verbose ile)
+        if GUNLUK.isEnabledFor(logging.DEBUG):
+            for test_adi, stok_map_key, ozelalan1_str, miktar_str in zip(
+                    siparis["test_adi"], siparis["stok_map_key"], siparis["ozelalan1"], siparis["miktar"]):
+                GUNLUK.debug("-> XML: %s -> Kit ID: %s -> Sipariş: %s (%s TEST)",
+                             test_adi, stok_map_key, ozelalan1_str, miktar_str)
+
+        optimizasyon = metrik["kit_optimizasyonu"]
+        if optimizasyon and optimizasyon["satir"]:
+            GUNLUK.info("(Kit optimizasyonu) %s satır boy karışımıyla hesaplandı; fazla test %s -> %s.",
+                        optimizasyon["satir"], optimizasyon["fazla_test_once"], optimizasyon["fazla_test_sonra"])
+
+        eslesmeyen = metrik["eslesmeyen_satirlar"]
+        if eslesmeyen:
+            ayrinti = []
+            for test_adi, satir_nolari in sorted(eslesmeyen.items()):
+                satirlar_str = ", ".join(map(str, satir_nolari[:10])) + (" ..." if len(satir_nolari) > 10 else "")
+                ayrinti.append(f"   - '{test_adi}' (satır {satirlar_str})")
+            GUNLUK.warning("UYARI: '%s' sayfasında %d satır hiçbir kitle eşleşmedi (STOK_MAP veya "
+                           "kit_eslestirme'ye eklenmesi gerekebilir):\n%s",
+                           dynamic_sheet_name, sum(map(len, eslesmeyen.values())), "\n".join(ayrinti))
+
+        if siparis_kaydi is not None:
+            siparis_kaydi.append(siparis)
+        if not yaz:
+            return None
 
-        print(f"Sayfa: '{dynamic_sheet_name}' başarıyla okundu.")
+        # XML Oluşturma ve Kaydetme
+        if not xml_lines_data:
+            GUNLUK.warning("UYARI: '%s' için XML oluşturulmadı. Eklenecek satır bulunamadı.", cari_adi)
+            return None
 
-        xml_lines_data = []
+        # Çok aylı çalışmada her ayın fişi ayrı dosyadır: önek_AY_zaman.xml
+        ay_eki = f"_{config['ay']}" if config.get("ay") else ""
+        output_filename = f"{output_prefix}{ay_eki}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.xml"
 
-        # Her satırı döngüye al
-        for index, row in df.iterrows():
+        # Merkezi klasör yolunu kullan (modülü içe aktaran araçlarda ilk yazılan fişle belirlenir)
+        if TUM_CIKTILAR_YOLU is None:
+            yeni_calisma_klasoru()
+        output_path = os.path.join(TUM_CIKTILAR_YOLU, output_filename)
 
-            test_adi_raw = row.get(TEST_ADI_SUTUNU)
-            if pd.isna(test_adi_raw):
-                continue
+        # Deterministik mod: FISNO içerikten türetilir; aynı içerikli fiş daha önce üretildiyse
+        # yeniden yazılmaz (depo programına ikinci kez aktarılmasın diye çalıştırma klasörüne de konmaz).
+        yazma = {}
+        if CALISMA_AYARLARI["deterministik"]:
+            icerik_ozeti, fisno = fis_kimligi(cari_id, cari_adi, xml_lines_data, CALISMA_AYARLARI["xml_kacis"])
+            fisno = fisno_ayir(icerik_ozeti, fisno)
+            depo_yolu = os.path.join(ICERIK_DEPOSU, f"{icerik_ozeti}.xml")
+            metrik.update(icerik_ozeti=icerik_ozeti, fisno=fisno, yeni_fis=not os.path.exists(depo_yolu))
+            if not metrik["yeni_fis"]:
+                GUNLUK.info("[DEĞİŞMEDİ] Aynı içerikli fiş (FISNO %s) daha önce üretildi, yeniden yazılmadı: %s",
+                            fisno, depo_yolu)
+                return depo_yolu
+            yazma = {"fisno": fisno, "saat": DETERMINISTIK_SAAT, "depo_yolu": depo_yolu}
+
+        if yazici is not None:
+            GUNLUK.info("[KUYRUK] XML dosyası arka planda yazılıyor: %s", output_path)
+            return yazici.submit(_xml_yazma_gorevi, output_path, xml_lines_data, cari_id, cari_adi,
+                                 CALISMA_AYARLARI["xml_kacis"], metrik, **yazma)
+
+        # XML, bellekte tek bir string oluşturulmadan doğrudan dosyaya akıtılır.
+        _xml_yazma_gorevi(output_path, xml_lines_data, cari_id, cari_adi, CALISMA_AYARLARI["xml_kacis"],
+                          metrik, **yazma)
+
+        GUNLUK.info("[BAŞARILI] XML dosyası kaydedildi: %s", output_path)
+        return output_path
 
-            test_adi = str(test_adi_raw).strip()  # Excel'deki test adı (Örn: "TSH")
+    except Exception as e:
+        # Hata detayları (traceback) da yazılır
+        GUNLUK.error("KRİTİK HATA: '%s' verisi işlenirken bir hata oluştu: %s", cari_adi, e, exc_info=True)
+        return None
 
-            # --- KRİTİK ADIM: STOK KODUNU HASTANEYE ÖZEL BULMA ---
-            # 1. Hastaneye özel bir kit eşleşmesi var mı kontrol et
-            # Eğer map'te "TSH" varsa TSH_2000'i döner. Yoksa, orijinal test_adi'ni ("Serbest T3") döner.
-            stok_map_key = hospital_kit_map.get(test_adi, test_adi)
 
-            # 2. Filtre: Bulunan anahtar (stok_map_key), STOK_MAP'te tanımlı mı?
-            if stok_map_key not in STOK_MAP:
-                continue
+# =========================================================================
+# 5. ARTIMLI ÇALIŞTIRMA (MANIFEST)
+# =========================================================================
 
-            # 3. İlgili kitin bilgilerini al
-            stok_bilgisi = STOK_MAP[stok_map_key]
+# Her hastanenin son başarılı çıktısının hangi girdilerle üretildiğini tutan dosya
+MANIFEST_DOSYASI = os.path.join(MERKEZI_KLASOR_ADI, "manifest.json")
 
-            # Set bazlı hesaplama için gerekli bilgileri al
-            TEST_PER_KUTU = stok_bilgisi[9]
-            SET_PER_KUTU = stok_bilgisi[10]
+# Çıktı içeriğini değiştiren çalışma ayarları (değişirlerse hastane yeniden işlenir)
+CIKTIYI_ETKILEYEN_AYARLAR = ("xml_kacis", "deterministik", "kit_optimizasyonu")
 
-            # Set başına düşen Test miktarı
-            if SET_PER_KUTU <= 0:
-                TEST_PER_SET = TEST_PER_KUTU
-                if TEST_PER_SET == 0:
-                    TEST_PER_SET = 1
-            else:
-                TEST_PER_SET = TEST_PER_KUTU / SET_PER_KUTU
 
-            ihtiyac_miktari_raw = row.get(ihtiyac_sutunu)
+def _ozet(veri):
+    """JSON'a çevrilebilen bir yapının kararlı SHA-256 özeti."""
+    metin = json.dumps(veri, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(metin.encode('utf-8')).hexdigest()
 
-            # --- MİKTAR KONTROLÜ ---
-            if pd.isna(ihtiyac_miktari_raw):
-                continue
 
+def manifest_oku():
+    """Manifest dosyasını okur; yoksa veya bozuksa boş bir manifest döndürür."""
+    try:
+        with open(MANIFEST_DOSYASI, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if isinstance(manifest.get("hastaneler"), dict):
+            return manifest
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, AttributeError) as e:
+        GUNLUK.warning("UYARI: Manifest okunamadı, tüm hastaneler yeniden işlenecek: %s", e)
+    return {"hastaneler": {}}
+
+
+def manifest_yaz(manifest):
+    """Manifest dosyasını geçici dosya üzerinden atomik olarak yazar."""
+    gecici_yol = f"{MANIFEST_DOSYASI}.tmp"
+    with open(gecici_yol, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(gecici_yol, MANIFEST_DOSYASI)
+
+
+def manifest_anahtari(config):
+    """Manifest içinde hastaneyi (çok aylı çalışmada hastane + ayı) tanımlayan anahtar."""
+    if config.get("ay"):
+        return f"{config['output_prefix']}:{config['ay']}"
+    return config["output_prefix"]
+
+
+def manifest_kaydi_olustur(config):
+    """
+    Hastanenin şu anki girdilerinin kaydını oluşturur: Excel parmak izi, konfigürasyon özeti
+    (çıktıyı etkileyen ayarlar dahil), STOK_MAP özeti ve okunacak sayfa adı.
+    STOK_MAP bugünün vade tarihini içerdiği için gün değişince tüm hastaneler yeniden işlenir.
+    Excel dosyasına erişilemiyorsa None döndürür.
+    """
+    try:
+        girdi = dosya_parmak_izi(config["input_path"])
+    except OSError:
+        return None
+
+    sayfa_adi, _ = get_dynamic_sheet_name(config["sheet_prefix"], config.get("override_month_name"))
+    ayarlar = {ad: CALISMA_AYARLARI[ad] for ad in CIKTIYI_ETKILEYEN_AYARLAR}
+    return {
+        "girdi": girdi,
+        "sayfa": sayfa_adi,
+        # Birlikte istenen aylar çıktıyı etkilemez; ay listesi değişince hastane yeniden işlenmesin
+        "konfig_ozeti": _ozet([{k: v for k, v in config.items() if k != "grup_aylari"}, ayarlar]),
+        "stok_map_ozeti": _ozet(STOK_MAP),
+    }
+
+
+def _degismedi_mi(kayit, onceki_kayit):
+    """Girdiler aynıysa ve önceki çıktı dosyası hâlâ duruyorsa True döndürür."""
+    if not kayit or not onceki_kayit:
+        return False
+    alanlar = ("girdi", "sayfa", "konfig_ozeti", "stok_map_ozeti")
+    return (all(kayit[a] == onceki_kayit.get(a) for a in alanlar)
+            and bool(onceki_kayit.get("cikti")) and os.path.exists(onceki_kayit["cikti"]))
+
+
+# =========================================================================
+# 6. PARALEL ÇALIŞTIRMA VE ÖZET
+# =========================================================================
+
+def _basariyi_isle(sonuc, cikti, kayit):
+    """Yazılmış XML'i sonuca ve manifest kaydına işler."""
+    sonuc.update(durum="BAŞARILI", cikti=cikti)
+    if kayit:
+        kayit["cikti"] = cikti
+        kayit["zaman"] = CALISMA_ZAMANI
+        sonuc["manifest"] = kayit
+    sonuc["metrik"].update(durum=sonuc["durum"], cikti=cikti)
+
+
+def hastane_calistir(config, artimli=False, onceki_kayit=None, on_yukleme=None, yazici=None):
+    """
+    Tek bir hastaneyi çalıştırır ve sonuç sözlüğü döndürür.
+    artimli=True ise ve girdiler manifestteki kayıtla aynıysa hastane işlenmez (ATLANDI).
+    Sonuçtaki "manifest" alanı, başarılı veya atlanan hastanenin güncel manifest kaydıdır;
+    "metrik" alanı hastanenin yapılandırılmış metrik kaydı (yeni_metrik), "siparis" alanı ise XML'i
+    üretilen hastanenin sipariş satırlarıdır (konsolide_siparis_ozeti için; yoksa None).
+    yazici verilmişse XML'i henüz yazılmakta olan hastanenin sonucunda "yazma" (Future) alanı
+    bulunur; sonuç yazma_tamamla ile kesinleşir.
+    """
+    sonuc = {
+        "cari_adi": config["CARI_ADI"],
+        "output_prefix": config["output_prefix"],
+        "ay": config.get("ay"),
+        "durum": "BAŞARISIZ",
+        "cikti": None,
+        "manifest": None,
+        "siparis": None,
+    }
+
+    metrik = sonuc["metrik"] = yeni_metrik(config)
+
+    with faz_suresi(metrik, "toplam"):
+        # Ön yükleme bitmeden parmak izi hesaplanırsa dosya ikinci kez okunur
+        if on_yukleme is not None:
+            wait([on_yukleme])
+        kayit = manifest_kaydi_olustur(config)
+
+        if artimli and _degismedi_mi(kayit, onceki_kayit):
+            GUNLUK.info("\n--- %s (%s)%s ATLANDI: Excel ve ayarlar değişmedi. Son çıktı: %s",
+                        config["CARI_ADI"], config["cari_id"], ay_etiketi(config), onceki_kayit["cikti"])
+            sonuc.update(durum="ATLANDI", cikti=onceki_kayit["cikti"], manifest=onceki_kayit)
+        else:
+            siparisler = []
+            cikti = process_hospital_data(config, metrik, on_yukleme, yazici, siparis_kaydi=siparisler)
+            if cikti and siparisler:
+                sonuc["siparis"] = siparisler[0].assign(
+                    cari_id=config["cari_id"], output_prefix=config["output_prefix"], ay=config.get("ay"))
+            if isinstance(cikti, Future):
+                sonuc["yazma"] = (cikti, kayit)
+            elif cikti:
+                _basariyi_isle(sonuc, cikti, kayit)
+
+    metrik.update(durum=sonuc["durum"], cikti=sonuc["cikti"])
+    return sonuc
+
+
+def yazma_tamamla(sonuc):
+    """Arka planda yazılan XML'in bitmesini bekler ve hastanenin sonucunu kesinleştirir."""
+    gorev, kayit = sonuc.pop("yazma")
+    try:
+        cikti = gorev.result()
+    except Exception as e:
+        GUNLUK.error("KRİTİK HATA: '%s' XML dosyası yazılamadı: %s", sonuc["cari_adi"], e)
+        sonuc["siparis"] = None
+        return
+    GUNLUK.info("[BAŞARILI] XML dosyası kaydedildi: %s", cikti)
+    _basariyi_isle(sonuc, cikti, kayit)
+
+
+def _hastane_isci(configs, cikti_yolu, ayarlar, artimli, onceki_kayitlar):
+    """
+    ProcessPoolExecutor içinde bir hastanenin konfigürasyonlarını (çok aylı çalışmada her ay için
+    bir tane; aynı Excel'in tek açılışta okunabilmesi için aynı süreçte) sırayla işler.
+    Windows'ta alt süreç modülü yeniden içe aktardığı için CALISMA_ZAMANI farklı hesaplanır;
+    bu yüzden çıktı klasörü ve çalışma ayarları ana süreçten gelen değerlerle sabitlenir.
+    Alt sürecin günlük kayıtları (ana süreçteki seviyeyle) biriktirilir ve ana sürecin günlüğüne
+    sırayla aktarılmak üzere döndürülür; işçiler konsola veya günlük dosyasına doğrudan yazmaz.
+    """
+    global TUM_CIKTILAR_YOLU, CALISMA_ZAMANI
+    TUM_CIKTILAR_YOLU = cikti_yolu
+    CALISMA_ZAMANI = os.path.basename(cikti_yolu)
+    CALISMA_AYARLARI.update(ayarlar)
+    agir_modulleri_yukle()
+
+    # fork ile başlayan süreç ana sürecin kuyruğunu miras alır ama dinleyicisi burada çalışmaz
+    GUNLUK.setLevel(gunluk_seviyesi())
+    with gunluk_kayitlarini_topla() as kayitlar:
+        sonuclar = [hastane_calistir(config, artimli, onceki_kayit)
+                    for config, onceki_kayit in zip(configs, onceki_kayitlar)]
+
+    return {"sonuclar": sonuclar, "kayitlar": kayitlar}
+
+
+def _hastane_gruplari(configs):
+    """Art arda gelen aynı hastaneye (output_prefix) ait konfigürasyonları gruplar."""
+    gruplar = []
+    for config in configs:
+        if gruplar and gruplar[-1][0]["output_prefix"] == config["output_prefix"]:
+            gruplar[-1].append(config)
+        else:
+            gruplar.append([config])
+    return gruplar
+
+
+def _boru_hattinda_isle(configs, artimli, onceki, derinlik):
+    """
+    Hastaneleri sırayla, üç aşamalı bir boru hattıyla işler: okuyucu iş parçacıkları sıradaki
+    en fazla `derinlik` hastanenin Excel'ini belleğe alır (excel_on_yukle), ana iş parçacığı
+    hesaplamayı yapar, tek bir yazıcı iş parçacığı bitmiş XML'leri diske yazar.
+    Bellekte en fazla `derinlik` ön yüklenmiş dosya ve `derinlik` yazılmayı bekleyen fiş bulunur.
+    """
+    sonuclar = []
+    on_yuklemeler = deque()
+    bekleyen_yazmalar = deque()
+    sira = iter(configs)
+
+    with ThreadPoolExecutor(max_workers=derinlik, thread_name_prefix="excel_okuyucu") as okuyucular, \
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="xml_yazici") as yazici:
+
+        def on_yuklemeyi_doldur():
+            while len(on_yuklemeler) < derinlik:
+                config = next(sira, None)
+                if config is None:
+                    break
+                # Çok aylı çalışmada art arda gelen aynı Excel bir kez yüklenir
+                if on_yuklemeler and on_yuklemeler[-1][0] == config["input_path"]:
+                    on_yuklemeler.append(on_yuklemeler[-1])
+                else:
+                    on_yuklemeler.append((config["input_path"],
+                                          okuyucular.submit(excel_on_yukle, config["input_path"])))
+
+        on_yuklemeyi_doldur()
+        for config in configs:
+            _, on_yukleme = on_yuklemeler.popleft()
+            on_yuklemeyi_doldur()
+
+            sonuc = hastane_calistir(config, artimli, onceki.get(manifest_anahtari(config)),
+                                     on_yukleme=on_yukleme, yazici=yazici)
+            del on_yukleme  # Excel baytları bir sonraki hastaneden önce serbest kalsın
+            sonuclar.append(sonuc)
+
+            if "yazma" in sonuc:
+                bekleyen_yazmalar.append(sonuc)
+            while len(bekleyen_yazmalar) > derinlik:
+                yazma_tamamla(bekleyen_yazmalar.popleft())
+
+        while bekleyen_yazmalar:
+            yazma_tamamla(bekleyen_yazmalar.popleft())
+
+    return sonuclar
+
+
+def hastaneleri_isle(configs, workers=1, artimli=False, manifest=None, on_yukleme=0):
+    """
+    Verilen konfigürasyonları işler ve her hastane için bir sonuç sözlüğü listesi döndürür.
+    workers > 1 ise hastaneler bir süreç havuzuna dağıtılır; her işçinin günlük kayıtları,
+    konfigürasyon sırası korunarak tek parça halinde yazılır.
+    Sıralı çalışmada on_yukleme > 0 ise okuma, hesaplama ve yazma boru hattıyla örtüştürülür
+    (_boru_hattinda_isle); on_yukleme, önceden belleğe alınacak Excel sayısıdır.
+    artimli=True ise manifestteki kayıtla girdileri aynı olan hastaneler atlanır.
+    """
+    onceki = (manifest or {}).get("hastaneler", {})
+    sonuclar = []
+
+    if workers <= 1:
+        if on_yukleme > 0:
+            return _boru_hattinda_isle(configs, artimli, onceki, on_yukleme)
+        for config in configs:
+            sonuclar.append(hastane_calistir(config, artimli, onceki.get(manifest_anahtari(config))))
+        return sonuclar
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    gruplar = _hastane_gruplari(configs)
+    with ProcessPoolExecutor(max_workers=workers) as havuz:
+        gorevler = [havuz.submit(_hastane_isci, grup, TUM_CIKTILAR_YOLU, CALISMA_AYARLARI,
+                                 artimli, [onceki.get(manifest_anahtari(config)) for config in grup])
+                    for grup in gruplar]
+
+        # Sonuçlar tamamlanma sırasına göre değil, konfigürasyon sırasına göre toplanır.
+        for grup, gorev in zip(gruplar, gorevler):
             try:
-                ihtiyac_miktari = int(ihtiyac_miktari_raw)
-            except (ValueError, TypeError):
+                cevap = gorev.result()
+            except Exception as e:
+                # Alt süreç çökerse (BrokenProcessPool vb.) hastane başarısız sayılır.
+                cevap = {
+                    "sonuclar": [{
+                        "cari_adi": config["CARI_ADI"],
+                        "output_prefix": config["output_prefix"],
+                        "ay": config.get("ay"),
+                        "durum": "BAŞARISIZ",
+                        "cikti": None,
+                        "manifest": None,
+                        "siparis": None,
+                        "metrik": yeni_metrik(config),
+                    } for config in grup],
+                    "kayitlar": [],
+                }
+                GUNLUK.error("\nKRİTİK HATA: '%s' işçi süreci başarısız oldu: %s", grup[0]["CARI_ADI"], e)
+            for kayit in cevap["kayitlar"]:
+                GUNLUK.handle(kayit)
+            sonuclar.extend(cevap["sonuclar"])
+
+    return sonuclar
+
+
+def manifesti_guncelle(manifest, configs, sonuclar):
+    """Başarılı ve atlanan hastanelerin kayıtlarını manifeste işler (başarısızların eski kaydı korunur)."""
+    for config, sonuc in zip(configs, sonuclar):
+        if sonuc.get("manifest"):
+            manifest["hastaneler"][manifest_anahtari(config)] = sonuc["manifest"]
+    return manifest
+
+
+def ozet_yazdir(sonuclar):
+    """Her hastane için başarılı/atlandı/başarısız durumunu ve genel toplamı yazdırır."""
+    sayilar = {"BAŞARILI": 0, "ATLANDI": 0, "BAŞARISIZ": 0}
+
+    satirlar = ["\n[ÖZET] Hastane bazında sonuçlar:"]
+    for sonuc in sonuclar:
+        sayilar[sonuc["durum"]] += 1
+        etiket = f"[{sonuc['durum']}]"
+        satir = f"  {etiket:<12} {sonuc['cari_adi']} ({sonuc['output_prefix']}){ay_etiketi(sonuc)}"
+        if sonuc["metrik"].get("yeni_fis") is False:
+            satir += " (fiş değişmedi)"
+        if sonuc["cikti"]:
+            satir += f" -> {sonuc['cikti']}"
+        satirlar.append(satir)
+    satirlar.append(f"Toplam: {len(sonuclar)} hastane, {sayilar['BAŞARILI']} başarılı, "
+                    f"{sayilar['ATLANDI']} atlandı, {sayilar['BAŞARISIZ']} başarısız.")
+    GUNLUK.info("\n".join(satirlar))
+
+
+# YAPILANDIRILMIŞ METRİKLER: her hastane için faz süreleri, satır sayıları ve atlama nedenleri.
+# Her çalıştırmanın klasörüne bir JSON Lines dosyası (hastane başına bir satır) yazılır;
+# istenirse aynı değerler Prometheus metin biçiminde de yazılır (node_exporter textfile collector).
+
+METRIK_DOSYASI_ADI = "metrikler.jsonl"
+PROMETHEUS_DOSYASI_ADI = "metrikler.prom"
+
+# Kayıttaki faz süreleri (saniye); "toplam", manifest kontrolü dahil hastanenin tüm süresidir.
+METRIK_FAZLARI = ("sayfa_adi", "okuma", "hesaplama", "xml", "yazma", "toplam")
+
+
+def yeni_metrik(config):
+    """Bir hastane için boş (sıfırlanmış) metrik kaydı oluşturur."""
+    return {
+        "calisma": CALISMA_ZAMANI,
+        "cari_adi": config["CARI_ADI"],
+        "cari_id": config["cari_id"],
+        "output_prefix": config["output_prefix"],
+        "ay": config.get("ay"),
+        "durum": "BAŞARISIZ",
+        "sayfa": None,
+        "cikti": None,
+        "sureler_s": dict.fromkeys(METRIK_FAZLARI, 0.0),
+        "taranan_satir": 0,
+        "eslesen_satir": 0,
+        "uretilen_satir": 0,
+        "atlanan": dict.fromkeys(ATLAMA_NEDENLERI, 0),
+        "eslesmeyen_satirlar": {},
+        # Yalnızca --optimize-kits ile dolar: bölünen satır sayısı ve fazla test toplamı (önce / sonra)
+        "kit_optimizasyonu": None,
+        "yazilan_bayt": 0,
+        # Yalnızca deterministik modda dolar; yeni_fis=False ise fiş daha önce üretilmiştir
+        "icerik_ozeti": None,
+        "fisno": None,
+        "yeni_fis": None,
+    }
+
+
+def metrikleri_yaz(sonuclar, yol=None):
+    """Hastanelerin metrik kayıtlarını JSON Lines olarak yazar (varsayılan: çalıştırma klasörü)."""
+    yol = yol or os.path.join(TUM_CIKTILAR_YOLU, METRIK_DOSYASI_ADI)
+    with open(yol, 'w', encoding='utf-8') as f:
+        for sonuc in sonuclar:
+            metrik = dict(sonuc["metrik"])
+            metrik["sureler_s"] = {faz: round(sure, 6) for faz, sure in metrik["sureler_s"].items()}
+            f.write(json.dumps(metrik, ensure_ascii=False) + "\n")
+    return yol
+
+
+def _prometheus_etiketi(deger):
+    """Prometheus etiket değerindeki ters bölü, tırnak ve satır sonlarını kaçırır."""
+    return str(deger).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_metni(sonuclar):
+    """Metrik kayıtlarını Prometheus metin biçimine (exposition format) çevirir."""
+    tanimlar = [
+        ("lost_xml_faz_suresi_saniye", "Hastane ve faz bazında geçen süre (saniye).",
+         lambda m: [({"faz": faz}, sure) for faz, sure in m["sureler_s"].items()]),
+        ("lost_xml_satir_sayisi", "Taranan, STOK_MAP ile eşleşen ve XML'e yazılan satır sayıları.",
+         lambda m: [({"tur": tur}, m[f"{tur}_satir"]) for tur in ("taranan", "eslesen", "uretilen")]),
+        ("lost_xml_atlanan_satir_sayisi", "Nedene göre atlanan satır sayısı.",
+         lambda m: [({"neden": neden}, sayi) for neden, sayi in m["atlanan"].items()]),
+        ("lost_xml_yazilan_bayt", "Yazılan XML dosyasının boyutu (bayt).",
+         lambda m: [({}, m["yazilan_bayt"])]),
+        ("lost_xml_hastane_durumu", "Hastanenin son çalıştırmadaki durumu (1 = bu durumda).",
+         lambda m: [({"durum": durum}, int(m["durum"] == durum))
+                    for durum in ("BAŞARILI", "ATLANDI", "BAŞARISIZ")]),
+    ]
+
+    satirlar = []
+    for ad, aciklama, degerler in tanimlar:
+        satirlar.append(f"# HELP {ad} {aciklama}")
+        satirlar.append(f"# TYPE {ad} gauge")
+        for sonuc in sonuclar:
+            metrik = sonuc["metrik"]
+            for etiketler, deger in degerler(metrik):
+                etiketler = {"hastane": metrik["output_prefix"],
+                             **({"ay": metrik["ay"]} if metrik.get("ay") else {}), **etiketler}
+                etiket_metni = ",".join(f'{k}="{_prometheus_etiketi(v)}"' for k, v in etiketler.items())
+                satirlar.append(f"{ad}{{{etiket_metni}}} {deger:g}" if isinstance(deger, float)
+                                else f"{ad}{{{etiket_metni}}} {deger}")
+    return "\n".join(satirlar) + "\n"
+
+
+def prometheus_yaz(sonuclar, yol):
+    """
+    Prometheus metin dosyasını yazar. Toplayıcı yarım dosya okumasın diye önce geçici
+    dosyaya yazılır, sonra tek adımda yerine taşınır.
+    """
+    gecici = f"{yol}.tmp"
+    with open(gecici, 'w', encoding='utf-8', newline='\n') as f:
+        f.write(prometheus_metni(sonuclar))
+    os.replace(gecici, yol)
+    return yol
+
+
+# KONSOLİDE SATIN ALMA ÖZETİ: tüm hastanelerin bellekteki sipariş satırları, üretilen XML'ler
+# yeniden okunmadan, tek bir group-by ile STOKKOD ve ID bazında toplanır.
+
+KONSOLIDE_DOSYA_ADI = "konsolide_siparis"
+
+# Toplu XML fişinin cari bilgileri (depo programında tek bir satın alma fişi olarak açılır)
+KONSOLIDE_CARI_ID = "KONSOLİDE"
+KONSOLIDE_CARI_ADI = "KONSOLİDE SATIN ALMA"
+
+
+def konsolide_siparis_ozeti(sonuclar):
+    """
+    Başarılı hastanelerin sipariş satırlarını STOKKOD ve ID bazında (çok aylı çalışmada ay bazında da)
+    toplar: toplam TEST, toplam set, toplam setin kaç tam kutu ve kaç artan set ettiği, kaç satır ve
+    kaç hastaneden geldiği. Aynı STOKKOD + ID farklı ürün adlarıyla geçiyorsa adlar " / " ile birleştirilir.
+    Hiç satır yoksa None döndürür.
+    """
+    tablolar = [sonuc["siparis"] for sonuc in sonuclar if sonuc.get("siparis") is not None]
+    if not tablolar:
+        return None
+
+    satirlar = pd.concat(tablolar, ignore_index=True)
+    anahtarlar = ["stok_kodu", "id_kodu"]
+    if satirlar["ay"].notna().any():
+        # Aylar alfabetik değil takvim sırasıyla dizilsin
+        satirlar["ay"] = pd.Categorical(satirlar["ay"], categories=list(TURKISH_MONTHS.values()), ordered=True)
+        anahtarlar.insert(0, "ay")
+    ozet = satirlar.groupby(anahtarlar, sort=True, observed=True, as_index=False).agg(
+        stok_adi=("stok_adi", lambda adlar: " / ".join(pd.unique(adlar))),
+        toplam_test=("test_miktari", "sum"),
+        toplam_set=("set_sayisi", "sum"),
+        set_per_kutu=("set_per_kutu", "max"),
+        satir_sayisi=("set_sayisi", "size"),
+        hastane_sayisi=("output_prefix", "nunique"),
+        vade_tarihi=("vade_tarihi", "first"),
+        kdv_orani=("kdv_orani", "first"),
+        depo_kod=("depo_kod", "first"),
+    )
+
+    kutulu = ozet["set_per_kutu"] > 0
+    ozet["tam_kutu"] = np.where(kutulu, ozet["toplam_set"] // ozet["set_per_kutu"].where(kutulu, 1), 0)
+    ozet["kalan_set"] = ozet["toplam_set"] - ozet["tam_kutu"] * ozet["set_per_kutu"].where(kutulu, 0)
+    return ozet
+
+
+def konsolide_ozeti_yaz(ozet, bicim="csv", klasor=None):
+    """
+    Konsolide özeti çalıştırma klasörüne yazar ve dosya yolunu döndürür.
+    CSV, Türkçe Excel'de doğrudan açılsın diye ';' ayraçlı ve UTF-8 BOM'ludur.
+    Parquet için pyarrow (veya fastparquet) gerekir; yüklü değilse CSV yazılır.
+    """
+    klasor = klasor or TUM_CIKTILAR_YOLU
+    sutunlar = [s for s in ("ay", "stok_kodu", "id_kodu", "stok_adi", "toplam_test", "toplam_set",
+                            "set_per_kutu", "tam_kutu", "kalan_set", "satir_sayisi", "hastane_sayisi")
+                if s in ozet.columns]
+
+    if bicim == "parquet":
+        yol = os.path.join(klasor, f"{KONSOLIDE_DOSYA_ADI}.parquet")
+        try:
+            ozet[sutunlar].to_parquet(yol, index=False)
+            return yol
+        except ImportError as e:
+            GUNLUK.warning("UYARI: Parquet yazılamadı, CSV yazılıyor: %s", e)
+
+    yol = os.path.join(klasor, f"{KONSOLIDE_DOSYA_ADI}.csv")
+    ozet[sutunlar].to_csv(yol, sep=";", index=False, encoding="utf-8-sig")
+    return yol
+
+
+def konsolideyi_yaz(sonuclar, bicim="csv", xml=False):
+    """
+    Çalıştırmanın (veya birleştirilen parçaların) konsolide özetini --konsolide / --konsolide-xml
+    seçeneklerine göre çalıştırma klasörüne yazar. İşlenmeyen (ATLANDI) hastaneler için uyarı verir.
+    """
+    atlanan = sum(sonuc["durum"] == "ATLANDI" for sonuc in sonuclar)
+    if atlanan:
+        GUNLUK.warning("UYARI: %d hastane bu çalıştırmada işlenmediği (ATLANDI) için konsolide özete "
+                       "dahil değil.", atlanan)
+    ozet = konsolide_siparis_ozeti(sonuclar)
+    if ozet is None:
+        GUNLUK.warning("UYARI: Konsolide özet oluşturulmadı; sipariş satırı üreten hastane yok.")
+        return
+    try:
+        if bicim != "yok":
+            GUNLUK.info("[INFO] Konsolide sipariş özeti yazıldı: %s", konsolide_ozeti_yaz(ozet, bicim))
+        if xml:
+            for yol in konsolide_xml_yaz(ozet):
+                GUNLUK.info("[INFO] Konsolide XML yazıldı: %s", yol)
+    except OSError as e:
+        GUNLUK.warning("UYARI: Konsolide özet kaydedilemedi: %s", e)
+
+
+def konsolide_argumanlarini_ekle(parser):
+    """--konsolide ve --konsolide-xml seçeneklerini (run ve merge için) ayrıştırıcıya ekler."""
+    parser.add_argument("--konsolide", choices=("csv", "parquet", "yok"), default="csv",
+                        help="Tüm hastanelerin STOKKOD/ID bazında toplam siparişini çalıştırma klasörüne yazar "
+                             f"({KONSOLIDE_DOSYA_ADI}.csv veya .parquet). Varsayılan: csv.")
+    parser.add_argument("--konsolide-xml", action="store_true",
+                        help="Konsolide siparişi ayrıca depo programı biçiminde toplu bir XML fişi olarak yazar.")
+
+
+def konsolide_xml_yaz(ozet, klasor=None):
+    """
+    Konsolide özeti, depo programı biçiminde toplu XML fiş(ler)i olarak yazar (çok aylı çalışmada
+    her ay için bir fiş). MIKTAR toplam TEST, OZELALAN1 toplam setin kutu/set dağılımıdır.
+    Yazılan dosya yollarını döndürür.
+    """
+    klasor = klasor or TUM_CIKTILAR_YOLU
+    gruplar = ozet.groupby("ay", sort=True, observed=True) if "ay" in ozet.columns else [(None, ozet)]
+
+    yollar = []
+    for ay, grup in gruplar:
+        lines = list(zip(
+            grup["stok_kodu"], grup["stok_adi"], grup["toplam_test"].astype(str),
+            ["TEST"] * len(grup), grup["vade_tarihi"], grup["kdv_orani"], grup["depo_kod"],
+            [_ozelalan1_bicimle(set_sayisi, set_per_kutu)
+             for set_sayisi, set_per_kutu in zip(grup["toplam_set"], grup["set_per_kutu"])],
+            grup["id_kodu"],
+        ))
+        ay_eki = f"_{ay}" if ay else ""
+        yol = os.path.join(klasor, f"{KONSOLIDE_DOSYA_ADI}{ay_eki}_{CALISMA_ZAMANI}.xml")
+        fis = {}
+        if CALISMA_AYARLARI["deterministik"]:
+            fis = {"fisno": fisno_ayir(*fis_kimligi(KONSOLIDE_CARI_ID, KONSOLIDE_CARI_ADI, lines,
+                                                    CALISMA_AYARLARI["xml_kacis"])),
+                   "saat": DETERMINISTIK_SAAT}
+        xml_dosyasina_yaz(yol, lines, KONSOLIDE_CARI_ID, KONSOLIDE_CARI_ADI, kacis=CALISMA_AYARLARI["xml_kacis"], **fis)
+        yollar.append(yol)
+    return yollar
+
+
+# TOPLU AKTARIM PAKETİ (--bundle): çalıştırmanın hastane fişleri, depo programının toplu aktarımı ve ağ
+# üzerinden tek dosya kopyalamak için tek bir pakette toplanır: fişleri <Fisler> altında art arda içeren
+# bir XML ya da her fişin ayrı üye olduğu bir ZIP. Fişler diskten tampon tampon okunup pakete akıtılır;
+# bellekte fişin tamamı değil yalnızca bir okuma tamponu tutulur. Aynı geçişte her fişin SHA-256 özeti
+# alınır ve CARIID, FISNO ve satır sayısı paketin indeksine yazılır. Ayrıştırılamayan bir fiş (ör. kaçışsız
+# yazılmış '&') paketlemeyi durdurmaz: XML pakete alınmaz, ZIP pakette üye olarak kalır ve indekste işaretlenir.
+
+PAKET_DOSYA_ADI = "fis_paketi"
+# ZIP paketinde indeksin üye adı (XML pakette indeks, fişlerden sonra gelen <Indeks> elemanıdır)
+PAKET_INDEKS_ADI = "indeks.json"
+_PAKET_TAMPONU = 1 << 16
+_XML_BILDIRIMI = b'<?xml version="1.0" encoding="utf-8"?>\n'
+
+
+def paket_fisleri(sonuclar):
+    """Pakete girecek fişler: bu çalıştırmanın klasörüne yazılmış başarılı hastane fişleri (sonuç sırasıyla)."""
+    return [sonuc["cikti"] for sonuc in sonuclar
+            if sonuc["durum"] == "BAŞARILI" and sonuc["cikti"]
+            and os.path.dirname(sonuc["cikti"]) == TUM_CIKTILAR_YOLU]
+
+
+def _fisi_akit(yol, yaz, bildirimsiz=False):
+    """
+    Fiş dosyasını tampon tampon okuyup yaz(bayt) ile iletir (bildirimsiz=True ise baştaki XML bildirimi
+    atlanır). Aynı geçişte dosyanın SHA-256 özetini alır ve XML'i akış halinde ayrıştırarak CARIID,
+    FISNO ve <Satir> sayısını bulur; bunları paket indeksi kaydı olarak döndürür.
+    Fiş ayrıştırılamazsa baytlar yine eksiksiz iletilir ve özeti alınır; kayda ayrıştırma hatası
+    ("hata") yazılır ve satir_sayisi None olur.
+    """
+    ozet = hashlib.sha256()
+    ayristirici = ET.XMLPullParser(events=("end",))
+    kayit = {"dosya": os.path.basename(yol), "cari_id": None, "fisno": None, "satir_sayisi": 0, "bayt": 0}
+
+    def ayristir(parca=None):
+        if parca is None:
+            ayristirici.close()
+        else:
+            ayristirici.feed(parca)
+        for _, eleman in ayristirici.read_events():
+            if eleman.tag == "Satir":
+                kayit["satir_sayisi"] += 1
+                eleman.clear()
+            elif eleman.tag in ("CARIID", "FISNO"):
+                kayit["cari_id" if eleman.tag == "CARIID" else "fisno"] = (eleman.text or "").strip()
+
+    with open(yol, 'rb') as f:
+        ilk = True
+        while parca := f.read(_PAKET_TAMPONU):
+            ozet.update(parca)
+            kayit["bayt"] += len(parca)
+            if "hata" not in kayit:
+                try:
+                    ayristir(parca)
+                except ET.ParseError as e:
+                    kayit["hata"] = str(e)
+            if ilk and bildirimsiz and parca.startswith(_XML_BILDIRIMI):
+                parca = parca[len(_XML_BILDIRIMI):]
+            ilk = False
+            yaz(parca)
+    if "hata" not in kayit:
+        try:
+            ayristir()
+        except ET.ParseError as e:
+            kayit["hata"] = str(e)
+    if "hata" in kayit:
+        kayit["satir_sayisi"] = None
+    kayit["sha256"] = ozet.hexdigest()
+    return kayit
+
+
+def _xml_paketi_yaz(yol, fisler):
+    """
+    Fişleri tek bir <Fisler> belgesine akıtır; en sona her fiş için bir <Kayit> içeren <Indeks> eklenir.
+    Ayrıştırılamayan fişin yazılan baytları geri alınır (paket geçerli XML kalır); fiş indekse girmez,
+    döndürülen kayıtlarda "hata" ile yer alır.
+    """
+    from xml.sax.saxutils import escape
+
+    kayitlar = []
+    with open(yol, 'wb', buffering=_PAKET_TAMPONU) as f:
+        f.write(_XML_BILDIRIMI + b"<Fisler>\n")
+        for fis in fisler:
+            baslangic = f.tell()
+            kayit = _fisi_akit(fis, f.write, bildirimsiz=True)
+            kayitlar.append(kayit)
+            if "hata" in kayit:
+                f.seek(baslangic)
+                f.truncate()
                 continue
-            # --- MİKTAR KONTROLÜ BİTİŞ ---
+            f.write(b"\n")
+        indeks = ["<Indeks>"]
+        for sira, kayit in enumerate((kayit for kayit in kayitlar if "hata" not in kayit), 1):
+            indeks += ["<Kayit>",
+                       f"<SIRANO>{sira}</SIRANO>",
+                       f"<DOSYA>{escape(kayit['dosya'])}</DOSYA>",
+                       f"<CARIID>{escape(kayit['cari_id'] or '')}</CARIID>",
+                       f"<FISNO>{escape(kayit['fisno'] or '')}</FISNO>",
+                       f"<SATIRSAYISI>{kayit['satir_sayisi']}</SATIRSAYISI>",
+                       f"<BAYT>{kayit['bayt']}</BAYT>",
+                       f"<SHA256>{kayit['sha256']}</SHA256>",
+                       "</Kayit>"]
+        indeks += ["</Indeks>", "</Fisler>"]
+        f.write("\n".join(indeks).encode("utf-8"))
+    return kayitlar
+
+
+def _zip_paketi_yaz(yol, fisler, sikistir):
+    """
+    Her fişi ZIP'e ayrı bir üye olarak akıtır (sikistir=True ise deflate); en sona indeks.json eklenir.
+    Ayrıştırılamayan fiş de birebir üye olarak yazılır; indeks kaydında "hata" bulunur.
+    """
+    sikistirma = zipfile.ZIP_DEFLATED if sikistir else zipfile.ZIP_STORED
+    kayitlar = []
+    with zipfile.ZipFile(yol, 'w', compression=sikistirma) as arsiv:
+        for fis in fisler:
+            # Üyenin tarihi fiş dosyasınınkidir (aynı fişlerden aynı arşiv üyeleri)
+            uye = zipfile.ZipInfo(os.path.basename(fis), date_time=time.localtime(os.path.getmtime(fis))[:6])
+            uye.compress_type = sikistirma
+            with arsiv.open(uye, 'w') as hedef:
+                kayitlar.append(_fisi_akit(fis, hedef.write))
+        arsiv.writestr(PAKET_INDEKS_ADI, json.dumps(kayitlar, ensure_ascii=False, indent=2))
+    return kayitlar
+
+
+def paket_yaz(fisler, bicim="zip", sikistir=False, klasor=None):
+    """
+    Fişleri çalıştırma klasöründe tek bir pakete (fis_paketi_ZAMAN.xml veya .zip) yazar ve
+    (paket yolu, indeks kayıtları) döndürür. Paket geçici dosyaya yazılıp yerine konur; yarım kalmış
+    bir paket kopyalanmaya hazır görünmez. sikistir yalnızca ZIP paketinde geçerlidir.
+    """
+    klasor = klasor or TUM_CIKTILAR_YOLU
+    yol = os.path.join(klasor, f"{PAKET_DOSYA_ADI}_{CALISMA_ZAMANI}.{bicim}")
+    gecici = f"{yol}.tmp"
+    try:
+        if bicim == "xml":
+            kayitlar = _xml_paketi_yaz(gecici, fisler)
+        else:
+            kayitlar = _zip_paketi_yaz(gecici, fisler, sikistir)
+        os.replace(gecici, yol)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(gecici)
+        raise
+    return yol, kayitlar
+
+
+def paketi_olustur(sonuclar, bicim, sikistir=False):
+    """Çalıştırmanın fişlerinden paketi yazar ve sonucu günlüğe yazar (hata çalıştırmayı durdurmaz)."""
+    fisler = paket_fisleri(sonuclar)
+    if not fisler:
+        GUNLUK.warning("UYARI: Toplu aktarım paketi oluşturulmadı; bu çalıştırmada yazılmış fiş yok.")
+        return None
+    try:
+        yol, kayitlar = paket_yaz(fisler, bicim, sikistir)
+    except (OSError, zipfile.BadZipFile) as e:
+        GUNLUK.warning("UYARI: Toplu aktarım paketi yazılamadı: %s", e)
+        return None
+    for kayit in kayitlar:
+        if "hata" in kayit:
+            GUNLUK.warning("UYARI: '%s' ayrıştırılamadı, %s: %s", kayit["dosya"],
+                           "pakete alınmadı" if bicim == "xml" else "indekste hatalı olarak işaretlendi",
+                           kayit["hata"])
+    paketteki = [kayit for kayit in kayitlar if bicim != "xml" or "hata" not in kayit]
+    GUNLUK.info("[INFO] Toplu aktarım paketi yazıldı: %s (%d fiş, %d satır, %d bayt)", yol, len(paketteki),
+                sum(kayit["satir_sayisi"] or 0 for kayit in paketteki), os.path.getsize(yol))
+    return yol
+
+
+def paket_argumanlarini_ekle(parser):
+    """--bundle ve --bundle-deflate seçeneklerini (run ve merge için) ayrıştırıcıya ekler."""
+    parser.add_argument("--bundle", "--paket", dest="paket", choices=("xml", "zip"),
+                        help=f"Hastane fişlerini ayrıca tek bir pakete ({PAKET_DOSYA_ADI}_ZAMAN.xml / .zip) yazar: "
+                             "xml, fişleri <Fisler> altında art arda içerir; zip, her fişi ayrı üye olarak içerir. "
+                             f"Her fiş için CARIID, FISNO, satır sayısı ve SHA-256 indekse yazılır "
+                             f"(xml: <Indeks>, zip: {PAKET_INDEKS_ADI}).")
+    parser.add_argument("--bundle-deflate", "--paket-sikistir", dest="paket_sikistir", action="store_true",
+                        help="ZIP paketindeki fişleri deflate ile sıkıştırır (varsayılan: sıkıştırmasız).")
+
+
+# TALEP GEÇMİŞİ: her çalıştırmanın hesapladığı sipariş satırları yerel bir SQLite veritabanına eklenir;
+# geçmiş aylar için eski XML'ler veya Excel'ler yeniden açılmadan "history" alt komutuyla raporlanır.
+# Aynı hastane ve dönem (ör. izleme modunda) yeniden işlenirse eski fiş silinmez, raporlar o dönemin
+# en son eklenen fişini kullanır.
+
+TALEP_GECMISI_DOSYASI = os.path.join(MERKEZI_KLASOR_ADI, "talep_gecmisi.sqlite")
+
+# Şema değişirse artırılır (PRAGMA user_version)
+TALEP_GECMISI_SURUMU = 1
+
+_TALEP_GECMISI_SEMASI = """
+CREATE TABLE IF NOT EXISTS fisler (
+    fis_id        INTEGER PRIMARY KEY,
+    calisma       TEXT NOT NULL,
+    output_prefix TEXT NOT NULL,
+    cari_id       TEXT NOT NULL,
+    cari_adi      TEXT NOT NULL,
+    ay            TEXT NOT NULL,
+    donem         TEXT NOT NULL,
+    cikti         TEXT
+);
+CREATE INDEX IF NOT EXISTS fisler_hastane_donem ON fisler (output_prefix, donem);
+
+CREATE TABLE IF NOT EXISTS satirlar (
+    fis_id        INTEGER NOT NULL REFERENCES fisler (fis_id),
+    cari_id       TEXT NOT NULL,
+    donem         TEXT NOT NULL,
+    test_adi      TEXT NOT NULL,
+    kit_anahtari  TEXT NOT NULL,
+    stok_kodu     TEXT NOT NULL,
+    ihtiyac       INTEGER NOT NULL,
+    set_sayisi    INTEGER NOT NULL,
+    test_miktari  INTEGER NOT NULL,
+    ozelalan1     TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS satirlar_cari_stok_donem ON satirlar (cari_id, stok_kodu, donem);
+"""
+
+# Her (hastane, dönem) için en son eklenen fiş
+_GUNCEL_FISLER = "SELECT MAX(fis_id) FROM fisler GROUP BY output_prefix, donem"
+
+
+def talep_gecmisini_ac(yol=None):
+    """Talep geçmişi veritabanını açar; yoksa şemasıyla oluşturur."""
+    yol = yol or TALEP_GECMISI_DOSYASI
+    os.makedirs(os.path.dirname(yol) or ".", exist_ok=True)
+    baglanti = sqlite3.connect(yol)
+    surum = baglanti.execute("PRAGMA user_version").fetchone()[0]
+    if surum > TALEP_GECMISI_SURUMU:
+        baglanti.close()
+        raise sqlite3.DatabaseError(f"{yol} daha yeni bir sürümle oluşturulmuş (şema {surum}).")
+    if surum < TALEP_GECMISI_SURUMU:
+        baglanti.executescript(_TALEP_GECMISI_SEMASI)
+        baglanti.execute(f"PRAGMA user_version = {TALEP_GECMISI_SURUMU}")
+    return baglanti
+
+
+def ay_donemi(ay_adi, zaman):
+    """
+    Sayım ayını çalıştırma zamanına göre "YYYY-AA" dönemine çevirir. Sayfalar yılsız adlandırıldığı
+    için çalıştırma ayından sonraki bir ay, geçen yılın sayımı kabul edilir (Ocak'ta ARALIK -> geçen yıl).
+    """
+    ay_no = {ad: no for no, ad in TURKISH_MONTHS.items()}[ay_adi]
+    yil = zaman.year if ay_no <= zaman.month else zaman.year - 1
+    return f"{yil}-{ay_no:02d}"
+
+
+def talep_gecmisine_ekle(configs, sonuclar, yol=None):
+    """
+    XML'i üretilen hastanelerin sipariş satırlarını talep geçmişine tek bir işlemde (transaction) ekler
+    ve eklenen satır sayısını döndürür. Atlanan (ATLANDI) hastanelerin satırları önceki çalıştırmada
+    eklenmiştir.
+    """
+    zaman = datetime.datetime.strptime(CALISMA_ZAMANI, "%Y%m%d_%H%M%S")
+    baglanti = talep_gecmisini_ac(yol)
+    eklenen = 0
+    try:
+        with baglanti:
+            for config, sonuc in zip(configs, sonuclar):
+                siparis = sonuc.get("siparis")
+                if siparis is None:
+                    continue
+                ay = (config.get("ay") or ay_adini_bul(config.get("override_month_name") or "")
+                      or TURKISH_MONTHS[zaman.month])
+                donem = ay_donemi(ay, zaman)
+                fis_id = baglanti.execute(
+                    "INSERT INTO fisler (calisma, output_prefix, cari_id, cari_adi, ay, donem, cikti) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (CALISMA_ZAMANI, config["output_prefix"], config["cari_id"], config["CARI_ADI"], ay, donem,
+                     sonuc["cikti"])).lastrowid
+                baglanti.executemany(
+                    "INSERT INTO satirlar (fis_id, cari_id, donem, test_adi, kit_anahtari, stok_kodu, ihtiyac, "
+                    "set_sayisi, test_miktari, ozelalan1) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    ((fis_id, config["cari_id"], donem, *satir) for satir in zip(
+                        siparis["test_adi"].tolist(), siparis["stok_map_key"].tolist(),
+                        siparis["stok_kodu"].tolist(), siparis["ihtiyac"].tolist(),
+                        siparis["set_sayisi"].tolist(), siparis["test_miktari"].tolist(),
+                        siparis["ozelalan1"].tolist())))
+                eklenen += len(siparis)
+    finally:
+        baglanti.close()
+    return eklenen
+
+
+def _gecmis_hastaneleri(baglanti, aranan):
+    """
+    Aranan metne (cari_id, output_prefix veya CARI_ADI'nın bir parçası; Türkçe harf ve büyük/küçük harf
+    farkı gözetilmez) uyan cari_id'leri döndürür. Tam eşleşme varsa yalnızca o alınır.
+    """
+    hedef = turkce_normalize(aranan)
+    hastaneler = baglanti.execute("SELECT DISTINCT cari_id, output_prefix, cari_adi FROM fisler").fetchall()
+    tam = {cari_id for cari_id, onek, _ in hastaneler
+           if hedef in (turkce_normalize(cari_id), turkce_normalize(onek))}
+    if tam:
+        return sorted(tam)
+    return sorted({cari_id for cari_id, _, cari_adi in hastaneler
+                   if hedef in turkce_normalize(cari_id) or hedef in turkce_normalize(cari_adi)})
+
+
+def _gecmis_stok_kodlari(aranan):
+    """Aranan metne (KitKatalogu.ara) uyan kitlerin STOKKOD'ları."""
+    return sorted({kit.stok_kodu for kit in KIT_KATALOGU.ara(aranan)})
+
+
+def gecmis_raporu(rapor, cari=None, stok=None, son_ay=6, yol=None):
+    """
+    Talep geçmişinden rapor yazdırır. rapor="toplam": hastane ve STOKKOD bazında son_ay aydaki toplam
+    ihtiyaç / set / TEST; rapor="trend": aynı toplamların ay ay dökümü. son_ay=0 tüm geçmiştir.
+    Başarılıysa 0, geçmiş yoksa veya filtre hiçbir hastaneye / kite uymuyorsa 1 döndürür.
+    """
+    yol = yol or TALEP_GECMISI_DOSYASI
+    if not os.path.isfile(yol):
+        GUNLUK.error("KRİTİK HATA: Talep geçmişi bulunamadı: %s", yol)
+        return 1
+
+    baslangic = time.perf_counter()
+    baglanti = talep_gecmisini_ac(yol)
+    try:
+        kosullar = [f"fis_id IN ({_GUNCEL_FISLER})"]
+        parametreler = []
+        if cari:
+            cari_idler = _gecmis_hastaneleri(baglanti, cari)
+            if not cari_idler:
+                GUNLUK.error("KRİTİK HATA: Geçmişte '%s' ile eşleşen hastane yok.", cari)
+                return 1
+            kosullar.append(f"cari_id IN ({', '.join('?' * len(cari_idler))})")
+            parametreler += cari_idler
+        if stok:
+            stok_kodlari = _gecmis_stok_kodlari(stok)
+            if not stok_kodlari:
+                GUNLUK.error("KRİTİK HATA: Kit kataloğunda '%s' ile eşleşen kit yok.", stok)
+                return 1
+            kosullar.append(f"stok_kodu IN ({', '.join('?' * len(stok_kodlari))})")
+            parametreler += stok_kodlari
+        if son_ay:
+            simdi = datetime.datetime.now()
+            ay_sirasi = simdi.year * 12 + simdi.month - son_ay
+            kosullar.append("donem >= ?")
+            parametreler.append(f"{ay_sirasi // 12}-{ay_sirasi % 12 + 1:02d}")
+
+        gruplar = "cari_id, stok_kodu, donem" if rapor == "trend" else "cari_id, stok_kodu"
+        satirlar = baglanti.execute(
+            f"SELECT {gruplar}, COUNT(DISTINCT donem), MIN(donem), MAX(donem), SUM(ihtiyac), SUM(set_sayisi), "
+            f"SUM(test_miktari) FROM satirlar WHERE {' AND '.join(kosullar)} GROUP BY {gruplar} ORDER BY {gruplar}",
+            parametreler).fetchall()
+    finally:
+        baglanti.close()
+    sure_ms = (time.perf_counter() - baslangic) * 1000
+
+    def stok_adi(stok_kodu):
+        kitler = KIT_KATALOGU.stok_koduna_gore(stok_kodu)
+        return kitler[0].stok_adi if kitler else ""
+
+    kapsam = f"son {son_ay} ay" if son_ay else "tüm geçmiş"
+    cikti = [f"\n[GEÇMİŞ] {'Aylık döküm' if rapor == 'trend' else 'Toplam'} ({kapsam}): {yol}"]
+    cikti.append(f"  {'CARIID':<20} {'STOKKOD':<10} {'DÖNEM':<20} {'İHTİYAÇ':>9} {'SET':>7} {'TEST':>9}  STOK ADI")
+    toplamlar = {}
+    for satir in satirlar:
+        if rapor == "trend":
+            cari_id, stok_kodu, donem, _, _, _, ihtiyac, set_sayisi, test_miktari = satir
+        else:
+            cari_id, stok_kodu, ay_sayisi, ilk, son, ihtiyac, set_sayisi, test_miktari = satir
+            donem = f"{ilk}..{son} ({ay_sayisi})" if ilk != son else ilk
+        cikti.append(f"  {cari_id:<20} {stok_kodu:<10} {donem:<20} {ihtiyac:>9} {set_sayisi:>7} {test_miktari:>9}  "
+                     f"{stok_adi(stok_kodu)}")
+        toplam = toplamlar.setdefault(cari_id, [0, 0])
+        toplam[0] += ihtiyac
+        toplam[1] += test_miktari
+    # Bir hastanede birden fazla STOKKOD varsa (ör. TSH'nin iki boyu) hastane toplamı da yazılır
+    if len(satirlar) > len(toplamlar):
+        for cari_id, (ihtiyac, test_miktari) in toplamlar.items():
+            cikti.append(f"  {cari_id:<20} {'TOPLAM':<10} {'':<20} {ihtiyac:>9} {'':>7} {test_miktari:>9}")
+    cikti.append(f"{len(satirlar)} satır ({sure_ms:.1f} ms).")
+    GUNLUK.info("\n".join(cikti))
+    return 0
+
+
+def gecmis_argumanlari_oku(argv=None):
+    """history alt komutunun argümanlarını okur."""
+    parser = argparse.ArgumentParser(
+        prog=f"{os.path.basename(sys.argv[0])} history",
+        description=f"Talep geçmişinden ({TALEP_GECMISI_DOSYASI}) hastane ve kit bazında toplam veya aylık "
+                    "sipariş raporu verir.")
+    parser.add_argument("rapor", nargs="?", choices=("toplam", "trend"), default="toplam",
+                        help="toplam: dönemdeki toplam; trend: ay ay döküm. Varsayılan: toplam.")
+    parser.add_argument("--cari", metavar="HASTANE",
+                        help="cari_id, output_prefix veya hastane adının bir parçası (ör. 'rize eğitim').")
+    parser.add_argument("--stok", "--kit", dest="stok", metavar="KIT",
+                        help="Kit anahtarı (TSH_2000), boy eki olmadan tüm boylar (TSH) veya STOKKOD.")
+    parser.add_argument("--son", "--last", dest="son", type=int, default=6, metavar="AY",
+                        help="Bu ay dahil son kaç ay. 0: tüm geçmiş. Varsayılan: 6.")
+    parser.add_argument("--db", default=TALEP_GECMISI_DOSYASI, help="Talep geçmişi veritabanı.")
+    return parser.parse_args(argv)
+
+
+# ÖNCEKİ ÇALIŞTIRMAYLA FARK (--diff-against): hiçbir dosya yazılmadan, yeni hesaplanan satırlar
+# önceki çalıştırma klasöründeki fişlerle (CARIID, STOKKOD) bazında karşılaştırılır.
+
+# Hastane fişleri: önek_islenmis_veri[_AY]_YYYYMMDD_HHMMSS.xml (konsolide fişler hariç)
+_FIS_DOSYA_ADI = re.compile(r"_islenmis_veri(?:_(?P<ay>[^\W\d_]+))?_\d{8}_\d{6}\.xml$")
+
+# Fişten okunan alanlar; diğer tüm etiketler yok sayılır
+_FARK_ALANLARI = ("STOKKOD", "MIKTAR", "OZELALAN1")
+
+
+def fis_satirlarini_oku(yol):
+    """
+    Bir fiş XML'ini iterparse ile akış halinde okur: yalnızca CARIID ve her <Satir>'ın STOKKOD,
+    MIKTAR ve OZELALAN1 alanları alınır, biten <Satir> elemanları bellekten temizlenir.
+    (cari_id, [(stok_kodu, miktar, ozelalan1), ...]) döndürür.
+    """
+    cari_id = ""
+    satirlar = []
+    alanlar = {}
+    for _, eleman in ET.iterparse(yol, events=("end",)):
+        etiket = eleman.tag
+        if etiket in _FARK_ALANLARI:
+            alanlar[etiket] = eleman.text or ""
+        elif etiket == "Satir":
+            satirlar.append((alanlar.get("STOKKOD", ""), alanlar.get("MIKTAR", ""), alanlar.get("OZELALAN1", "")))
+            alanlar = {}
+            eleman.clear()
+        elif etiket == "CARIID":
+            cari_id = eleman.text or ""
+    return cari_id, satirlar
+
+
+def _fark_indeksine_ekle(indeks, cari_id, ay, stok_kodu, miktar, ozelalan1):
+    """Aynı fişte aynı STOKKOD birden fazla satırda geçerse miktarlar toplanır, OZELALAN1'ler birleştirilir."""
+    kayit = indeks.setdefault((cari_id, ay or "", stok_kodu), [0, []])
+    kayit[0] += _tamsayiya_cevir(miktar) or 0
+    kayit[1].append(str(ozelalan1))
+
+
+def onceki_calistirmayi_oku(klasor):
+    """
+    Klasördeki hastane fişlerini okuyup {(cari_id, ay, stok_kodu): [toplam_miktar, [ozelalan1, ...]]}
+    indeksini, okunan fiş sayısını ve okunamayan fişlerin adlarını döndürür. Ayrıştırılamayan fişler
+    (ör. kaçışsız yazılmış STOKADI/CARIADI'deki '&') uyarıyla atlanır; biri diğerlerini etkilemez.
+    """
+    indeks = {}
+    fis_sayisi = 0
+    okunamayanlar = []
+    for ad in sorted(os.listdir(klasor)):
+        eslesme = _FIS_DOSYA_ADI.search(ad)
+        if not eslesme:
+            continue
+        try:
+            cari_id, satirlar = fis_satirlarini_oku(os.path.join(klasor, ad))
+        except (ET.ParseError, OSError) as e:
+            GUNLUK.warning("UYARI: '%s' okunamadı, karşılaştırmaya dahil edilmedi: %s", ad, e)
+            okunamayanlar.append(ad)
+            continue
+        fis_sayisi += 1
+        for stok_kodu, miktar, ozelalan1 in satirlar:
+            _fark_indeksine_ekle(indeks, cari_id, eslesme.group("ay"), stok_kodu, miktar, ozelalan1)
+    return indeks, fis_sayisi, okunamayanlar
+
+
+def fark_raporu(configs, onceki_klasor):
+    """
+    Konfigürasyonların satırlarını hesaplar (XML yazmadan) ve önceki çalıştırmanın fişleriyle
+    karşılaştırır; eklenen, silinen ve miktarı/OZELALAN1'i değişen satırları CARIID bazında yazdırır.
+    Hastanelerin ayrıntılı çıktısı yalnızca hesaplama başarısız olursa gösterilir.
+    Okunamayan önceki fişler özette ayrıca listelenir ve sayilar["okunamayan"] içinde sayılır.
+    """
+    eski, fis_sayisi, okunamayanlar = onceki_calistirmayi_oku(onceki_klasor)
+
+    yeni = {}
+    basarisizlar = []
+    for config in configs:
+        siparisler = []
+        with gunluk_kayitlarini_topla() as kayitlar:
+            process_hospital_data(config, siparis_kaydi=siparisler, yaz=False)
+        if not siparisler:
+            for kayit in kayitlar:
+                GUNLUK.handle(kayit)
+            basarisizlar.append(f"{config['CARI_ADI']}{ay_etiketi(config)}")
+            continue
+        siparis = siparisler[0]
+        for stok_kodu, miktar, ozelalan1 in zip(siparis["stok_kodu"], siparis["test_miktari"], siparis["ozelalan1"]):
+            _fark_indeksine_ekle(yeni, config["cari_id"], config.get("ay"), stok_kodu, miktar, ozelalan1)
+
+    # Satır sırası fark sayılmaz: aynı STOKKOD'un OZELALAN1'leri sıralı karşılaştırılır
+    for indeks in (eski, yeni):
+        for kayit in indeks.values():
+            kayit[1].sort()
+
+    def bicimle(kayit):
+        return f"{kayit[0]} TEST ({' | '.join(kayit[1])})"
+
+    def stok_adi(stok_kodu):
+        kitler = KIT_KATALOGU.stok_koduna_gore(stok_kodu)
+        return kitler[0].stok_adi if kitler else ""
+
+    sayilar = {"+": 0, "-": 0, "~": 0, "=": 0}
+    GUNLUK.info("\n[FARK] Önceki çalıştırma: %s (%d fiş)", onceki_klasor, fis_sayisi)
+    onceki_grup = None
+    for anahtar in sorted(eski.keys() | yeni.keys()):
+        cari_id, ay, stok_kodu = anahtar
+        if anahtar not in eski:
+            isaret, aciklama = "+", f"{bicimle(yeni[anahtar])} eklendi"
+        elif anahtar not in yeni:
+            isaret, aciklama = "-", f"{bicimle(eski[anahtar])} kaldırıldı"
+        elif eski[anahtar] != yeni[anahtar]:
+            degisim = yeni[anahtar][0] - eski[anahtar][0]
+            isaret, aciklama = "~", f"{bicimle(eski[anahtar])} -> {bicimle(yeni[anahtar])} ({degisim:+d} TEST)"
+        else:
+            sayilar["="] += 1
+            continue
+        sayilar[isaret] += 1
+        if (cari_id, ay) != onceki_grup:
+            GUNLUK.info("\n--- %s%s ---", cari_id, f" [{ay}]" if ay else "")
+            onceki_grup = (cari_id, ay)
+        GUNLUK.info("  %s %-10s %s: %s", isaret, stok_kodu, stok_adi(stok_kodu), aciklama)
+
+    if basarisizlar:
+        GUNLUK.warning("\nUYARI: Şu hastanelerin satırları hesaplanamadı; eski satırları 'kaldırıldı' "
+                       "görünebilir: %s", ", ".join(basarisizlar))
+    if okunamayanlar:
+        GUNLUK.warning("\nUYARI: Şu önceki fişler okunamadı; satırları 'eklendi' görünebilir: %s",
+                       ", ".join(okunamayanlar))
+    sayilar["okunamayan"] = len(okunamayanlar)
+    GUNLUK.info("\n[FARK ÖZETİ] %d eklendi, %d kaldırıldı, %d değişti, %d aynı. Hiçbir dosya yazılmadı.",
+                sayilar["+"], sayilar["-"], sayilar["~"], sayilar["="])
+    return sayilar
+
+
+def calistirma_yap(configs, args, manifest):
+    """
+    Tek bir çalıştırmanın tamamı: çıktı klasörünü (TUM_CIKTILAR_YOLU) oluşturur, hastaneleri işler,
+    özeti yazdırır; konsolide özeti, metrikleri ve güncellenen manifesti yazar.
+    --log-file verilmişse çalıştırmanın günlüğü ayrıca klasördeki GUNLUK_DOSYASI_ADI dosyasına yazılır.
+    Deterministik modda hiçbir fiş değişmediyse (fisler_degismedi_mi) çalıştırma klasörü kaldırılır.
+    Sonuç listesini döndürür; çıktı klasörü oluşturulamazsa None döndürür.
+    """
+    if not klasor_olustur(TUM_CIKTILAR_YOLU):
+        return None
+    agir_modulleri_yukle()
+
+    if not CALISMA_AYARLARI["gunluk_dosyasi"]:
+        sonuclar = _calistirma_adimlari(configs, args, manifest)
+    else:
+        gunlugu_ayarla(TUM_CIKTILAR_YOLU)
+        try:
+            sonuclar = _calistirma_adimlari(configs, args, manifest)
+        finally:
+            # Dosya kapatılır; izleme modunda sonraki çalıştırma kendi klasörüne yazar
+            gunlugu_ayarla()
+
+    if fisler_degismedi_mi(sonuclar, args):
+        bos_calisma_klasorunu_kaldir()
+    return sonuclar
+
+
+def fisler_degismedi_mi(sonuclar, args):
+    """
+    Deterministik modda her fiş daha önce aynı içerikle üretilmişse (yeni_fis=False) veya hastane
+    atlandıysa (ATLANDI) True döner: çalıştırma yeni bir şey üretmemiştir. Parça çalıştırmalarında
+    klasör merge için gerektiğinden her zaman False'tur.
+    """
+    if not CALISMA_AYARLARI["deterministik"] or args.parca or not sonuclar:
+        return False
+    return all(sonuc["durum"] == "ATLANDI"
+               or (sonuc["durum"] == "BAŞARILI" and sonuc["metrik"].get("yeni_fis") is False)
+               for sonuc in sonuclar)
+
 
-            # 2. Yuvarlama Mantığı (SET Bazlı)
-            istenilen_set_miktari = 0
+def bos_calisma_klasorunu_kaldir():
+    """
+    Yeni fiş üretmeyen çalıştırmanın klasörünü (varsa günlük dosyalarıyla birlikte) kaldırır.
+    Klasörde başka bir dosya varsa dokunulmaz.
+    """
+    try:
+        for ad in os.listdir(TUM_CIKTILAR_YOLU):
+            if ad == GUNLUK_DOSYASI_ADI or ad.startswith(f"{GUNLUK_DOSYASI_ADI}."):
+                os.remove(os.path.join(TUM_CIKTILAR_YOLU, ad))
+        os.rmdir(TUM_CIKTILAR_YOLU)
+    except OSError as e:
+        GUNLUK.warning("UYARI: Değişmeyen çalıştırmanın klasörü kaldırılamadı (%s): %s", TUM_CIKTILAR_YOLU, e)
+
+
+def _calistirma_adimlari(configs, args, manifest):
+    GUNLUK.info("\n[BAŞLANGIÇ] Excel verileri okunuyor ve XML'ler oluşturuluyor...")
+    sonuclar = hastaneleri_isle(configs, workers=args.workers, artimli=args.artimli, manifest=manifest,
+                                 on_yukleme=args.on_yukleme)
+    ozet_yazdir(sonuclar)
+
+    # Hiçbir fiş değişmediyse konsolide özet, paket, metrikler ve talep geçmişi önceki çalıştırmadakiyle
+    # aynıdır; yeniden yazılmaz (klasör calistirma_yap'ta kaldırılır).
+    if fisler_degismedi_mi(sonuclar, args):
+        try:
+            manifest_yaz(manifesti_guncelle(manifest, configs, sonuclar))
+        except OSError as e:
+            GUNLUK.warning("UYARI: Manifest kaydedilemedi (%s): %s", MANIFEST_DOSYASI, e)
+        GUNLUK.info("\n[DEĞİŞMEDİ] Tüm fişler daha önce aynı içerikle üretildi; yeni çalıştırma klasörü, "
+                    "konsolide özet, paket, metrikler ve talep geçmişi yazılmadı.")
+        return sonuclar
+
+    if args.konsolide != "yok" or args.konsolide_xml:
+        konsolideyi_yaz(sonuclar, args.konsolide, args.konsolide_xml)
+
+    if args.paket:
+        paketi_olustur(sonuclar, args.paket, args.paket_sikistir)
+
+    try:
+        GUNLUK.info("[INFO] Metrikler yazıldı: %s", metrikleri_yaz(sonuclar))
+        if args.prometheus is not None:
+            prometheus_yolu = args.prometheus or os.path.join(TUM_CIKTILAR_YOLU, PROMETHEUS_DOSYASI_ADI)
+            GUNLUK.info("[INFO] Prometheus metrikleri yazıldı: %s", prometheus_yaz(sonuclar, prometheus_yolu))
+    except OSError as e:
+        GUNLUK.warning("UYARI: Metrikler kaydedilemedi: %s", e)
+
+    if args.talep_gecmisi:
+        try:
+            eklenen = talep_gecmisine_ekle(configs, sonuclar)
+            if eklenen:
+                GUNLUK.info("[INFO] Talep geçmişine %d satır eklendi: %s", eklenen, TALEP_GECMISI_DOSYASI)
+        except (sqlite3.Error, OSError) as e:
+            GUNLUK.warning("UYARI: Talep geçmişi kaydedilemedi (%s): %s", TALEP_GECMISI_DOSYASI, e)
+
+    try:
+        manifest_yaz(manifesti_guncelle(manifest, configs, sonuclar))
+    except OSError as e:
+        GUNLUK.warning("UYARI: Manifest kaydedilemedi (%s): %s", MANIFEST_DOSYASI, e)
+
+    GUNLUK.info("\n[BİTİŞ] Tüm işlemler tamamlandı. Çıktılar: %s", TUM_CIKTILAR_YOLU)
+    return sonuclar
+
+
+# İZLEME MODU (--watch): süreç açık kalır; pandas, STOK_MAP, kit tabloları ve önbellekler bellekte
+# sıcak tutulur. Excel'ler periyodik olarak yoklanır (os.stat) ve kaydedilen Excel'in yalnızca kendi
+# hastaneleri yeniden işlenir. Yalnızca konfigürasyondaki input_path dosyalarına bakıldığı için Excel'in
+# açıkken oluşturduğu "~$..." kilit dosyaları ve kayıt sırasındaki geçici dosyalar hiçbir işlem başlatmaz.
+
+def dosya_durumu(yol):
+    """Dosyanın (boyut, mtime_ns) ikilisini döndürür; dosya yoksa veya erişilemiyorsa None."""
+    try:
+        bilgi = os.stat(yol)
+    except OSError:
+        return None
+    return bilgi.st_size, bilgi.st_mtime_ns
+
+
+def excel_hazir_mi(yol):
+    """
+    Yazılması bitmiş bir XLSX mi? Zip'in merkezi dizini dosyanın sonunda olduğu için yarım kalmış
+    bir kayıt açılamaz (BadZipFile); Excel dosyayı kilitliyse açma izin hatası verir.
+    """
+    try:
+        with zipfile.ZipFile(yol) as arsiv:
+            return "xl/workbook.xml" in arsiv.namelist()
+    except (OSError, zipfile.BadZipFile):
+        return False
+
+
+def vade_tarihini_yenile():
+    """
+    Gün değiştiyse STOK_MAP'teki vade tarihini bugüne taşır, kit kataloğunu yeniden kurar ve
+    derlenmiş kit tablolarını siler. Uzun süre açık kalan izleme modunda her turdan önce çağrılır.
+    """
+    global BUGUNUN_TARIHI, DINAMIK_VADE_TARIHI_STR, KIT_KATALOGU
+
+    bugun = datetime.datetime.today().date()
+    if bugun == BUGUNUN_TARIHI:
+        return False
+
+    eski_vade = DINAMIK_VADE_TARIHI_STR
+    BUGUNUN_TARIHI = bugun
+    DINAMIK_VADE_TARIHI_STR = bugun.strftime("%d.%m.%Y")
+    for anahtar, stok_bilgisi in STOK_MAP.items():
+        if stok_bilgisi[4] == eski_vade:
+            STOK_MAP[anahtar] = stok_bilgisi[:4] + (DINAMIK_VADE_TARIHI_STR,) + stok_bilgisi[5:]
+    KIT_KATALOGU = _TembelKatalog()
+    _KIT_TABLOLARI.clear()
+    GUNLUK.info("[İZLEME] Gün değişti; vade tarihi %s olarak güncellendi.", DINAMIK_VADE_TARIHI_STR)
+    return True
+
+
+def izleme_turu(configs, args, manifest):
+    """
+    Verilen (aynı Excel'lerden gelen) temel konfigürasyonları aylara genişletir, manifest kaydı
+    değişmeyenleri eler ve kalanları yeni bir çalıştırma klasöründe işler (calistirma_yap).
+    """
+    vade_tarihini_yenile()
+    # Önceki turdan yarım kalmış ay sayfaları yeni Excel içeriğiyle karışmasın
+    _OKUNMUS_AY_SAYFALARI.clear()
+
+    if args.aylar or args.tum_aylar:
+        configs = aylara_genislet(configs, aylar=args.aylar, tum_aylar=args.tum_aylar)
+
+    onceki = manifest["hastaneler"]
+    degisenler = [config for config in configs
+                  if not _degismedi_mi(manifest_kaydi_olustur(config), onceki.get(manifest_anahtari(config)))]
+    if not degisenler:
+        GUNLUK.info("[İZLEME] Excel içeriği ve ayarlar son çıktıyla aynı; yeni fiş üretilmedi.")
+        return
+
+    yeni_calisma_klasoru()
+    calistirma_yap(degisenler, args, manifest)
+
+
+def izle(configs, args, manifest):
+    """
+    Ctrl+C'ye kadar çalışır. Önce son çıktısından beri değişen hastaneleri işler, sonra her
+    args.izle_aralik saniyede Excel'leri yoklar. Değişen bir Excel, boyutu ve değişiklik zamanı
+    args.sakinlik saniye boyunca sabit kaldıktan ve zip olarak açılabildikten sonra işlenir;
+    böylece yarım kaydedilmiş veya ağdan kopyalanmakta olan dosya okunmaz.
+    """
+    agir_modulleri_yukle()
+    yollar = list(dict.fromkeys(config["input_path"] for config in configs))
+    gorulen = {yol: dosya_durumu(yol) for yol in yollar}
+    # yol -> son değişikliğin görüldüğü an (time.monotonic)
+    bekleyenler = {}
 
-            if ihtiyac_miktari <= 0:
-                if ihtiyac_miktari == 0 and apply_min_roundup:
-                    istenilen_set_miktari = 1  # 0 ise 1 Set/Kutuya yuvarla
+    GUNLUK.info("\n[İZLEME] Başlangıçta son çıktısından beri değişen hastaneler kontrol ediliyor...")
+    izleme_turu(configs, args, manifest)
+    GUNLUK.info("\n[İZLEME] %d Excel dosyası her %g saniyede kontrol ediliyor. Durdurmak için Ctrl+C.",
+                len(yollar), args.izle_aralik)
+
+    try:
+        while True:
+            time.sleep(args.izle_aralik)
+            simdi = time.monotonic()
+            for yol in yollar:
+                durum = dosya_durumu(yol)
+                if durum != gorulen[yol]:
+                    gorulen[yol] = durum
+                    if durum is None:
+                        bekleyenler.pop(yol, None)  # Dosya silindi/taşındı; geri gelince yeniden algılanır
+                    else:
+                        bekleyenler[yol] = simdi
+
+            hazirlar = []
+            for yol, zaman in list(bekleyenler.items()):
+                if simdi - zaman < args.sakinlik:
+                    continue
+                if excel_hazir_mi(yol):
+                    hazirlar.append(yol)
+                    del bekleyenler[yol]
                 else:
-                    continue  # Negatif veya 0 (yuvarlama pasifse) atla
-
-            elif ihtiyac_miktari > 0:
-                set_miktari_float = ihtiyac_miktari / TEST_PER_SET
-                # Her zaman yukarı yuvarla
-                istenilen_set_miktari = math.ceil(set_miktari_float)
-
-            # --- XML ÇIKTI DEĞERLERİNİN HESAPLANMASI ---
-            xml_test_miktari = istenilen_set_miktari * TEST_PER_SET
-            miktar_str = str(int(xml_test_miktari))
-            birim_kod_yeni = "TEST"
-
-            # --- OZELALAN1 HESAPLAMASI (Kutu + Set Bilgisi) ---
-            ozelalan1_str = ""
-
-            if SET_PER_KUTU > 0 and istenilen_set_miktari > 0:
-                tam_kutu_sayisi = istenilen_set_miktari // SET_PER_KUTU
-                kalan_set_sayisi = istenilen_set_miktari % SET_PER_KUTU
-
-                if tam_kutu_sayisi > 0:
-                    ozelalan1_str += f"{tam_kutu_sayisi}K"
-
-                if kalan_set_sayisi > 0:
-                    if ozelalan1_str:
-                        ozelalan1_str += " + "
-                    ozelalan1_str += f"{kalan_set_sayisi}SET"
-
-                # Eğer tam kutu sipariş edilmişse ve ozelalan1_str boşsa (Örn: 4 set = 1K)
-                if not ozelalan1_str and istenilen_set_miktari > 0 and tam_kutu_sayisi > 0:
-                    ozelalan1_str = f"{tam_kutu_sayisi}K"
-
-            elif istenilen_set_miktari > 0:
-                # Kutu bilgisi yoksa (SET_PER_KUTU=0 veya 1 ise) sadece set sayısını yaz
-                ozelalan1_str = f"{istenilen_set_miktari}SET"
-
-            # --- XML ÇIKTI VERİSİNİN OLUŞTURULMASI ---
-
-            # Yeni tuple'ı oluştur (stok kodu ve stok adı da artık seçilen kitle ait)
-            new_stok_bilgisi = (
-                stok_bilgisi[0],  # 0: STOK KODU (Seçilen kitin kodu)
-                stok_bilgisi[1],  # 1: STOK ADI (Seçilen kitin adı)
-                miktar_str,  # 2: MİKTAR (TEST Cinsinden)
-                birim_kod_yeni,  # 3: BİRİM KOD (TEST)
-                stok_bilgisi[4],  # 4: VADE TARİHİ
-                stok_bilgisi[5],  # 5: KDV ORANI
-                stok_bilgisi[6],  # 6: DEPO KOD
-                ozelalan1_str,  # 7: OZELALAN1 (Kutu+Set Bilgisi)
-                stok_bilgisi[8]  # 8: ID
-            )
-            xml_lines_data.append(new_stok_bilgisi)
-
-            # Debug çıktısı: Hangi kitin seçildiğini göster
-            print(
-                f"-> XML: {test_adi} -> Kit ID: {stok_map_key} -> Sipariş: {ozelalan1_str} ({miktar_str} TEST)")
+                    bekleyenler[yol] = simdi  # Hâlâ yazılıyor veya kilitli; bir sakinlik süresi daha beklenir
 
-        # XML Oluşturma ve Kaydetme
-        if not xml_lines_data:
-            print(
-                f"UYARI: '{cari_adi}' için XML oluşturulmadı. Eklenecek satır bulunamadı.")
-            return
+            if not hazirlar:
+                continue
+            for yol in hazirlar:
+                GUNLUK.info("\n[İZLEME] %s Değişiklik algılandı: %s", f"{datetime.datetime.now():%H:%M:%S}", yol)
+            try:
+                izleme_turu([config for config in configs if config["input_path"] in hazirlar], args, manifest)
+            except Exception as e:
+                # Beklenmeyen bir hata izlemeyi durdurmaz; dosya bir sonraki kayıtta yeniden denenir
+                GUNLUK.error("KRİTİK HATA: İzleme turu tamamlanamadı: %s", e, exc_info=True)
+            GUNLUK.info("\n[İZLEME] Değişiklikler bekleniyor...")
+    except KeyboardInterrupt:
+        GUNLUK.info("\n[BİTİŞ] İzleme durduruldu.")
 
-        # generate_xml_content fonksiyonu burada çağrılır.
-        xml_output = generate_xml_content(xml_lines_data, cari_id, cari_adi)
 
-        output_filename = f"{output_prefix}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.xml"
+# ÇOK MAKİNELİ ÇALIŞMA (--shard K/N ve merge): hastaneler makineler arasında kararlı biçimde bölünür,
+# her makine kendi çalıştırma klasörüne fişlerini ve bir parça manifesti yazar; merge bu klasörleri
+# tek bir çalıştırma klasöründe birleştirir.
 
-        # Merkezi klasör yolunu kullan
-        output_path = os.path.join(TUM_CIKTILAR_YOLU, output_filename)
+PARCA_MANIFESTI_ADI = "parca_manifesti.json"
 
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(xml_output)
+# Parçanın sipariş satırları: merge, konsolide özeti bunlardan (parçaların özet dosyalarından değil)
+# yeniden hesaplar; böylece hastane sayısı ve XML alanları tek makinedeki çalıştırmayla aynı olur.
+PARCA_SIPARISI_ADI = "parca_siparisi.csv"
+_PARCA_SIPARIS_SUTUNLARI = ("anahtar", "cari_id", "output_prefix", "ay", "stok_kodu", "id_kodu", "stok_adi",
+                            "test_miktari", "set_sayisi", "set_per_kutu", "vade_tarihi", "kdv_orani", "depo_kod")
+_PARCA_SIPARIS_SAYILARI = ("test_miktari", "set_sayisi", "set_per_kutu")
 
-        print(f"[BAŞARILI] XML dosyası kaydedildi: {output_path}")
 
-    except Exception as e:
-        print(f"KRİTİK HATA: '{cari_adi}' verisi işlenirken bir hata oluştu: {e}")
-        import traceback
-        print(traceback.format_exc())  # Hata detaylarını da yazdır
+def parca_argumani(metin):
+    """--shard değerini ("2/3") (parça, parça sayısı) ikilisine çevirir."""
+    try:
+        parca, sayi = (int(deger) for deger in metin.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{metin}' geçersiz; K/N biçiminde olmalı (ör. 2/3).")
+    if not 1 <= parca <= sayi:
+        raise argparse.ArgumentTypeError(f"'{metin}' geçersiz; 1 <= K <= N olmalı.")
+    return parca, sayi
 
 
-# =========================================================================
-# 5. ANA ÇALIŞTIRMA BLOĞU
-# =========================================================================
+def parcalara_bol(configs, parca_sayisi, dengeli=False):
+    """
+    Hastaneleri (output_prefix) parçalara dağıtır ve {output_prefix: parça no (1..N)} döndürür.
+    Varsayılan: output_prefix'in SHA-256 özetine göre; hastane eklenip çıkarılınca diğerlerinin
+    parçası değişmez. dengeli=True ise hastaneler Excel boyutuna göre büyükten küçüğe, o an en az
+    yüklü parçaya verilir; tüm makinelerin aynı dosyaları (aynı boyutlarla) görmesi gerekir.
+    """
+    if not dengeli:
+        return {config["output_prefix"]: int(hashlib.sha256(config["output_prefix"].encode('utf-8')).hexdigest(), 16)
+                % parca_sayisi + 1 for config in configs}
 
-if __name__ == "__main__":
+    boyutlar = {}
+    for config in configs:
+        try:
+            boyut = os.path.getsize(config["input_path"])
+        except OSError:
+            boyut = 0
+        boyutlar[config["output_prefix"]] = boyutlar.get(config["output_prefix"], 0) + boyut
+
+    yukler = [0] * parca_sayisi
+    atama = {}
+    for onek, boyut in sorted(boyutlar.items(), key=lambda oge: (-oge[1], oge[0])):
+        parca = min(range(parca_sayisi), key=lambda i: (yukler[i], i))
+        yukler[parca] += boyut
+        atama[onek] = parca + 1
+    return atama
+
+
+def parca_manifestini_yaz(parca, parca_sayisi, dengeli, tum_configs, configs, sonuclar):
+    """
+    Parçanın çalıştırma klasörüne, merge'ün ihtiyaç duyduğu kaydı yazar: bölmenin dayandığı
+    hastane listesi, bu parçaya düşen hastaneler ve her fişin sonucu ile manifest kaydı.
+    """
+    kayit = {
+        "parca": parca,
+        "parca_sayisi": parca_sayisi,
+        "dengeli": dengeli,
+        "calisma": CALISMA_ZAMANI,
+        "makine": platform.node(),
+        "tum_hastaneler": sorted({config["output_prefix"] for config in tum_configs}),
+        "atanan": sorted({config["output_prefix"] for config in configs}),
+        "fisler": [{
+            "anahtar": manifest_anahtari(config),
+            "cari_adi": sonuc["cari_adi"],
+            "output_prefix": sonuc["output_prefix"],
+            "ay": sonuc["ay"],
+            "durum": sonuc["durum"],
+            "cikti": sonuc["cikti"],
+            "yeni_fis": sonuc["metrik"].get("yeni_fis"),
+            "manifest": sonuc["manifest"],
+        } for config, sonuc in zip(configs, sonuclar)],
+    }
+    yol = os.path.join(TUM_CIKTILAR_YOLU, PARCA_MANIFESTI_ADI)
+    with open(yol, 'w', encoding='utf-8') as f:
+        json.dump(kayit, f, ensure_ascii=False, indent=2)
+    return yol
+
+
+def parca_siparisini_yaz(configs, sonuclar):
+    """
+    Parçanın hesapladığı sipariş satırlarını, her satırın manifest anahtarıyla birlikte çalıştırma
+    klasörüne yazar (merge'ün konsolide özeti için). Sipariş satırı yoksa None döndürür.
+    """
+    tablolar = [sonuc["siparis"].assign(anahtar=manifest_anahtari(config))
+                for config, sonuc in zip(configs, sonuclar) if sonuc.get("siparis") is not None]
+    if not tablolar:
+        return None
+    yol = os.path.join(TUM_CIKTILAR_YOLU, PARCA_SIPARISI_ADI)
+    pd.concat(tablolar, ignore_index=True)[list(_PARCA_SIPARIS_SUTUNLARI)].to_csv(
+        yol, sep=";", index=False, encoding="utf-8-sig")
+    return yol
+
+
+def parca_siparisini_oku(klasor):
+    """
+    Parça klasöründeki sipariş satırlarını {manifest anahtarı: tablo} olarak okur.
+    Dosya yoksa (sipariş satırı üretmeyen parça) boş sözlük döndürür.
+    """
+    yol = os.path.join(klasor, PARCA_SIPARISI_ADI)
+    if not os.path.isfile(yol):
+        return {}
+    tablo = pd.read_csv(yol, sep=";", encoding="utf-8-sig", keep_default_na=False,
+                        dtype={sutun: (int if sutun in _PARCA_SIPARIS_SAYILARI else str)
+                               for sutun in _PARCA_SIPARIS_SUTUNLARI})
+    tablo["ay"] = tablo["ay"].replace("", None)
+    return {anahtar: grup.drop(columns="anahtar") for anahtar, grup in tablo.groupby("anahtar", sort=False)}
+
+
+def fis_numarasini_oku(yol):
+    """Fişin FISNO'sunu okur; dosyanın yalnızca başlığı ayrıştırılır. Bulunamazsa None."""
+    for _, eleman in ET.iterparse(yol, events=("end",)):
+        if eleman.tag == "FISNO":
+            return (eleman.text or "").strip()
+        if eleman.tag == "Satir":
+            break
+    return None
+
+
+def parcalari_birlestir(klasorler, paket=None, paket_sikistir=False, konsolide="csv", konsolide_xml=False):
+    """
+    Parça çalıştırma klasörlerini tek bir çalıştırma klasöründe (TUM_CIKTILAR_YOLU) birleştirir.
+    Önce tüm kontroller yapılır: parçalar aynı hastane listesinden ve aynı N ile bölünmüş mü, bir
+    parça iki kez mi verilmiş, bir hastane iki parçada mı işlenmiş, iki fişin FISNO'su çakışıyor mu.
+    Hata varsa hiçbir şey yazılmaz ve 1 döner. Aksi halde fişler kopyalanır, metrikler tek dosyada
+    toplanır, manifest güncellenir, birleşik özet yazdırılır ve 0 döner. Konsolide özet, parçaların
+    sipariş satırlarından (PARCA_SIPARISI_ADI) run ile aynı seçeneklerle (konsolide, konsolide_xml) yeniden
+    hesaplanır. paket ("xml" / "zip") verilirse birleşik fişler ayrıca bir toplu aktarım paketine yazılır
+    (paketi_olustur).
+    """
+    parcalar = []
+    hatalar = []
+    for klasor in klasorler:
+        try:
+            with open(os.path.join(klasor, PARCA_MANIFESTI_ADI), 'r', encoding='utf-8') as f:
+                parcalar.append((klasor, json.load(f)))
+        except (OSError, ValueError) as e:
+            hatalar.append(f"'{klasor}' parça manifesti okunamadı: {e}")
+    if hatalar:
+        GUNLUK.error("KRİTİK HATA: Birleştirme yapılamadı:\n  - %s", "\n  - ".join(hatalar))
+        return 1
+
+    ilk = parcalar[0][1]
+    gorulen_parcalar = {}
+    fis_sahipleri = {}
+    fisnolar = {}
+    for klasor, kayit in parcalar:
+        if (kayit["parca_sayisi"], kayit["tum_hastaneler"]) != (ilk["parca_sayisi"], ilk["tum_hastaneler"]):
+            hatalar.append(f"'{klasor}' farklı bir bölmeden geliyor (parça sayısı veya hastane listesi farklı).")
+        if kayit["parca"] in gorulen_parcalar:
+            hatalar.append(f"{kayit['parca']}/{kayit['parca_sayisi']} parçası iki kez verildi: "
+                           f"'{gorulen_parcalar[kayit['parca']]}' ve '{klasor}'.")
+            continue
+        gorulen_parcalar[kayit["parca"]] = klasor
+
+        for fis in kayit["fisler"]:
+            if fis["anahtar"] in fis_sahipleri:
+                hatalar.append(f"'{fis['anahtar']}' iki parçada işlenmiş: '{fis_sahipleri[fis['anahtar']]}' ve '{klasor}'.")
+            fis_sahipleri[fis["anahtar"]] = klasor
+
+            fis["kaynak"] = None
+            if fis["cikti"]:
+                kaynak = os.path.join(klasor, os.path.basename(fis["cikti"]))
+                if os.path.isfile(kaynak):
+                    fis["kaynak"] = kaynak
+            if fis["kaynak"]:
+                try:
+                    fisno = fis_numarasini_oku(fis["kaynak"])
+                except (ET.ParseError, OSError) as e:
+                    hatalar.append(f"'{fis['kaynak']}' okunamadı: {e}")
+                    continue
+                if fisno in fisnolar:
+                    hatalar.append(f"FISNO {fisno} çakışıyor: '{fisnolar[fisno]}' ve '{fis['kaynak']}'.")
+                fisnolar[fisno] = fis["kaynak"]
+
+    if hatalar:
+        GUNLUK.error("KRİTİK HATA: Birleştirme yapılamadı:\n  - %s", "\n  - ".join(hatalar))
+        return 1
+
+    parca_sayisi = ilk["parca_sayisi"]
+    eksik_parcalar = sorted(set(range(1, parca_sayisi + 1)) - set(gorulen_parcalar))
+    if eksik_parcalar:
+        GUNLUK.warning("UYARI: Eksik parçalar: %s", ", ".join(f"{parca}/{parca_sayisi}" for parca in eksik_parcalar))
+    kapsanmayan = sorted(set(ilk["tum_hastaneler"]) - {onek for _, kayit in parcalar for onek in kayit["atanan"]})
+    if kapsanmayan:
+        GUNLUK.warning("UYARI: Hiçbir parçada işlenmeyen hastaneler: %s", ", ".join(kapsanmayan))
+
+    yeni_calisma_klasoru()
     if not klasor_olustur(TUM_CIKTILAR_YOLU):
-        sys.exit(1)
+        return 1
 
-    print("\n[BAŞLANGIÇ] Excel verileri okunuyor ve XML'ler oluşturuluyor...")
+    konsolide_gerekli = konsolide != "yok" or konsolide_xml
+    manifest = manifest_oku()
+    sonuclar = []
+    with open(os.path.join(TUM_CIKTILAR_YOLU, METRIK_DOSYASI_ADI), 'w', encoding='utf-8') as metrikler:
+        for klasor, kayit in sorted(parcalar, key=lambda oge: oge[1]["parca"]):
+            try:
+                with open(os.path.join(klasor, METRIK_DOSYASI_ADI), 'r', encoding='utf-8') as f:
+                    shutil.copyfileobj(f, metrikler)
+            except OSError as e:
+                GUNLUK.warning("UYARI: '%s' metrikleri eklenemedi: %s", klasor, e)
+
+            siparisler = {}
+            if konsolide_gerekli:
+                try:
+                    siparisler = parca_siparisini_oku(klasor)
+                except (OSError, ValueError) as e:
+                    GUNLUK.warning("UYARI: '%s' sipariş satırları okunamadı, konsolide özete dahil değil: %s",
+                                   klasor, e)
+
+            for fis in kayit["fisler"]:
+                cikti = fis["cikti"]
+                if fis["kaynak"]:
+                    cikti = os.path.join(TUM_CIKTILAR_YOLU, os.path.basename(fis["kaynak"]))
+                    shutil.copy2(fis["kaynak"], cikti)
+                elif cikti:
+                    GUNLUK.warning("UYARI: '%s' fişi parça klasöründe yok (%s), kopyalanmadı: %s",
+                                   fis["anahtar"], fis["durum"], cikti)
+                if fis["manifest"]:
+                    manifest["hastaneler"][fis["anahtar"]] = dict(fis["manifest"], cikti=cikti, zaman=CALISMA_ZAMANI)
+                sonuclar.append({"cari_adi": fis["cari_adi"], "output_prefix": fis["output_prefix"], "ay": fis["ay"],
+                                 "durum": fis["durum"], "cikti": cikti, "metrik": {"yeni_fis": fis["yeni_fis"]},
+                                 "siparis": siparisler.get(fis["anahtar"])})
+
+    kaynaklar = ", ".join(f"{kayit['parca']}/{parca_sayisi} {kayit['makine']}" for _, kayit in parcalar)
+    GUNLUK.info("\n[BİRLEŞTİRME] %d parça birleştirildi (%s); %d fiş, FISNO çakışması yok.",
+                len(parcalar), kaynaklar, len(fisnolar))
+    ozet_yazdir(sonuclar)
+    if konsolide_gerekli:
+        konsolideyi_yaz(sonuclar, konsolide, konsolide_xml)
+    if paket:
+        paketi_olustur(sonuclar, paket, paket_sikistir)
+
+    try:
+        manifest_yaz(manifest)
+    except OSError as e:
+        GUNLUK.warning("UYARI: Manifest kaydedilemedi (%s): %s", MANIFEST_DOSYASI, e)
+    GUNLUK.info("\n[BİTİŞ] Birleştirme tamamlandı. Çıktılar: %s", TUM_CIKTILAR_YOLU)
+    return 0
+
+
+def birlestirme_argumanlari_oku(argv=None):
+    """merge alt komutunun argümanlarını okur."""
+    parser = argparse.ArgumentParser(
+        prog=f"{os.path.basename(sys.argv[0])} merge",
+        description="--shard ile farklı makinelerde üretilen parça çalıştırma klasörlerini tek bir "
+                    f"çalıştırma klasöründe ({MERKEZI_KLASOR_ADI} altında) birleştirir.")
+    parser.add_argument("klasorler", nargs="+", metavar="PARCA_KLASORU",
+                        help=f"İçinde {PARCA_MANIFESTI_ADI} bulunan parça çalıştırma klasörleri.")
+    konsolide_argumanlarini_ekle(parser)
+    paket_argumanlarini_ekle(parser)
+    return parser.parse_args(argv)
+
+
+def argumanlari_oku(argv=None):
+    """Komut satırı argümanlarını okur."""
+    parser = argparse.ArgumentParser(
+        description="Hastane sayım Excel'lerinden depo programı XML'leri oluşturur.",
+        epilog="Alt komutlar: run (varsayılan), list, validate-config, show-kit KIT, dry-run CARI_ID, "
+               "merge KLASOR..., history. Ayrıntı için: <komut> --help.")
+    parser.add_argument("--workers", type=int, default=1, metavar="N",
+                        help="Aynı anda işlenecek hastane sayısı (süreç havuzu). Varsayılan: 1 (sıralı).")
+    parser.add_argument("--prefetch", "--on-yukleme", dest="on_yukleme", type=int, default=2, metavar="N",
+                        help="Sıralı çalışmada, işlenen hastane hesaplanırken sıradaki N hastanenin Excel'i arka "
+                             "planda belleğe alınır ve XML'ler ayrı bir iş parçacığında yazılır. "
+                             "0: boru hattı kapalı. Varsayılan: 2.")
+    aylar = parser.add_mutually_exclusive_group()
+    aylar.add_argument("--months", "--aylar", dest="aylar", metavar="AY,AY,...",
+                       help="Konfigürasyondaki ay yerine verilen ayların sayfalarını işler (ör. EYLÜL,EKİM). "
+                            "Her Excel bir kez açılır; her hastane ve ay için ayrı XML yazılır.")
+    aylar.add_argument("--all-months", "--tum-aylar", dest="tum_aylar", action="store_true",
+                       help="Her Excel'de sayfası bulunan tüm ayları işler.")
+    parser.add_argument("--shard", "--parca", dest="parca", type=parca_argumani, metavar="K/N",
+                        help="Hastaneleri N makineye böler ve yalnızca K. parçayı işler (output_prefix özetine göre, "
+                             f"kararlı). Çalıştırma klasörüne {PARCA_MANIFESTI_ADI} yazılır; parçalar "
+                             "'merge' alt komutuyla birleştirilir. --watch ile kullanılamaz.")
+    parser.add_argument("--shard-balance", "--parca-dengeli", dest="parca_dengeli", action="store_true",
+                        help="--shard bölmesini Excel boyutlarına göre dengeler (tüm makineler aynı dosyaları görmeli).")
+    parser.add_argument("--incremental", "--artimli", dest="artimli", action="store_true",
+                        help=f"Excel'i, konfigürasyonu ve STOK_MAP'i {MANIFEST_DOSYASI} kaydıyla aynı olan "
+                             f"hastaneleri yeniden işlemez.")
+    parser.add_argument("--onbellek-yok", action="store_true",
+                        help=f"Excel önbelleğini ({ONBELLEK_KLASOR_ADI}) kullanmaz; her dosya yeniden okunur.")
+    parser.add_argument("--onbellek-mb", type=int, default=CALISMA_AYARLARI["onbellek_mb"], metavar="MB",
+                        help="Önbelleğin en büyük boyutu; aşılırsa en eski kullanılan girdiler silinir.")
+    parser.add_argument("--xml-kacis", action="store_true",
+                        help="STOKADI, CARIADI gibi metin alanlarını XML kaçışından geçirir (& -> &amp;).")
+    parser.add_argument("--deterministik", action="store_true",
+                        help="FISNO'yu hastane, fiş tarihi ve satır içeriğinden türetir, FISSAAT/SEVKSAAT'i sabitler. "
+                             "Aynı gün içinde aynı içerikli fiş ikinci kez yazılmaz ve daha önce üretilmiş sayılır "
+                             f"({ICERIK_DEPOSU}); hiçbir fiş değişmediyse çalıştırma klasörü ve talep geçmişi kaydı "
+                             "oluşturulmaz.")
+    parser.add_argument("--optimize-kits", "--kit-optimizasyonu", dest="kit_optimizasyonu", action="store_true",
+                        help="Birden fazla boyu olan kitlerde (TSH_100 / TSH_2000, ALT_1200 / ALT_3960 ...) ihtiyacı "
+                             "en az fazla testle karşılayan boy karışımını sipariş eder; kit_eslestirme'deki boy "
+                             "sabitlemesi yerine geçer.")
+    parser.add_argument("--diff-against", "--fark", dest="fark", metavar="KLASOR",
+                        help="XML yazmadan, hesaplanan satırları verilen önceki çalıştırma klasöründeki fişlerle "
+                             "karşılaştırır (eklenen / kaldırılan / değişen satırlar).")
+    parser.add_argument("--watch", "--izle", dest="izle", action="store_true",
+                        help="Açık kalır ve Excel'leri izler: kaydedilen bir Excel'in hastaneleri birkaç saniye "
+                             "içinde yeniden işlenip yeni bir çalıştırma klasörüne yazılır. Ctrl+C ile durur.")
+    parser.add_argument("--poll-interval", "--izle-aralik", dest="izle_aralik", type=float, default=2.0,
+                        metavar="SN", help="İzleme modunda Excel'lerin kontrol aralığı (saniye). Varsayılan: 2.")
+    parser.add_argument("--debounce", "--sakinlik", dest="sakinlik", type=float, default=3.0, metavar="SN",
+                        help="İzleme modunda değişen Excel'in işlenmeden önce değişmeden kalması gereken süre "
+                             "(saniye). Varsayılan: 3.")
+    konsolide_argumanlarini_ekle(parser)
+    paket_argumanlarini_ekle(parser)
+    parser.add_argument("--prometheus", nargs="?", const="", metavar="DOSYA",
+                        help=f"Metrikleri Prometheus metin biçiminde de yazar. Dosya verilmezse "
+                             f"çalıştırma klasörüne {PROMETHEUS_DOSYASI_ADI} yazılır.")
+    parser.add_argument("--no-history", "--gecmis-yok", dest="talep_gecmisi", action="store_false",
+                        help=f"Hesaplanan sipariş satırlarını talep geçmişine ({TALEP_GECMISI_DOSYASI}) eklemez. "
+                             "Geçmiş 'history' alt komutuyla raporlanır.")
+    gunluk = parser.add_mutually_exclusive_group()
+    gunluk.add_argument("--quiet", "-q", "--sessiz", dest="sessiz", action="store_true",
+                        help="Konsola yalnızca uyarı ve hataları yazar (zamanlanmış görevler için).")
+    gunluk.add_argument("--verbose", "-v", "--ayrintili", dest="ayrintili", action="store_true",
+                        help="Satır bazlı ayrıntıları da yazar (her satır için seçilen kit, sayfa adı tahmini, "
+                             "önbellekten okunan sayfalar).")
+    parser.add_argument("--log-file", "--gunluk-dosyasi", dest="gunluk_dosyasi", action="store_true",
+                        help=f"Günlüğü her çalıştırma klasörüne {GUNLUK_DOSYASI_ADI} olarak da yazar "
+                             f"({GUNLUK_DOSYASI_BAYT // (1024 * 1024)} MB'ta döner, {GUNLUK_DOSYASI_YEDEK} yedek). "
+                             "--quiet ile de dosyaya bilgi mesajları yazılır.")
+    args = parser.parse_args(argv)
+
+    # İzleme modu parça manifestini ve sipariş satırlarını yazmaz; merge bu klasörleri kullanamazdı
+    if args.izle and args.parca:
+        parser.error("--watch ile --shard birlikte kullanılamaz (izleme turları merge için parça "
+                     "manifesti yazmaz).")
+
+    if args.aylar:
+        secilen = [ay_adini_bul(ad) for ad in args.aylar.split(",") if ad.strip()]
+        if None in secilen or not secilen:
+            parser.error(f"--months: geçersiz ay adı: {args.aylar}. "
+                         f"Geçerli adlar: {', '.join(TURKISH_MONTHS.values())}")
+        # Takvim sırasına dizilir, tekrarlar atılır
+        sira = {ay: no for no, ay in TURKISH_MONTHS.items()}
+        args.aylar = sorted(set(secilen), key=sira.get)
+    return args
+
+
+# BİLGİ KOMUTLARI (list, validate-config, show-kit, dry-run): hiçbir fiş, manifest, metrik veya geçmiş
+# kaydı yazmaz ve günlük kuyruğu kurulmaz. list, validate-config ve show-kit Excel okumadığı için pandas,
+# numpy ve openpyxl'i hiç yüklemez; komut birkaç on milisaniyede döner.
+
+def hastaneleri_bul(aranan, configs=None):
+    """
+    Aranan metne (output_prefix, cari_id veya CARI_ADI'nın bir parçası; Türkçe harf ve büyük/küçük harf
+    farkı gözetilmez) uyan konfigürasyonlar. output_prefix veya cari_id tam eşleşiyorsa yalnızca onlar alınır.
+    """
+    configs = HASTANE_CONFIGS if configs is None else configs
+    hedef = turkce_normalize(aranan)
+    tam = [config for config in configs
+           if hedef in (turkce_normalize(config["output_prefix"]), turkce_normalize(config["cari_id"]))]
+    if tam:
+        return tam
+    return [config for config in configs
+            if hedef in turkce_normalize(config["cari_id"]) or hedef in turkce_normalize(config["CARI_ADI"])]
+
+
+def konfigurasyonlari_listele(aranan=None):
+    """HASTANE_CONFIGS'i (önek, cari, ay, Excel'in bulunup bulunmadığı) tablo olarak yazdırır."""
+    configs = HASTANE_CONFIGS if aranan is None else hastaneleri_bul(aranan)
+    if not configs:
+        GUNLUK.error("KRİTİK HATA: '%s' ile eşleşen hastane konfigürasyonu yok.", aranan)
+        return 1
+
+    bu_ay = TURKISH_MONTHS[datetime.datetime.now().month]
+    cikti = [f"  {'ÖNEK':<42} {'CARIID':<20} {'AY':<10} {'EXCEL':<6} CARİ ADI"]
+    eksik = 0
+    for config in configs:
+        var = os.path.isfile(config["input_path"])
+        eksik += not var
+        ay = config.get("override_month_name") or f"({bu_ay})"
+        cikti.append(f"  {config['output_prefix']:<42} {config['cari_id']:<20} {ay:<10} "
+                     f"{'var' if var else 'YOK':<6} {config['CARI_ADI']}")
+    cikti.append(f"{len(configs)} konfigürasyon, {eksik} Excel bulunamadı.")
+    GUNLUK.info("\n".join(cikti))
+    return 0
+
+
+def konfigurasyonu_denetle(configs=None):
+    """
+    Konfigürasyonu Excel'leri işlemeden denetler: kit eşleştirmeleri ve test adı çakışmaları
+    (konfigurasyonlari_dogrula), ardından bulunan her Excel'de ayın sayfası (yalnızca workbook.xml okunur).
+    Bulunamayan Excel uyarıdır (başka makinenin sürücüsü olabilir); geçersiz eşleştirme, açılamayan
+    Excel veya bulunamayan sayfa hatadır. Hata yoksa 0, varsa 1 döndürür.
+    """
+    configs = HASTANE_CONFIGS if configs is None else configs
+    hata_sayisi = 0
+    try:
+        konfigurasyonlari_dogrula(configs)
+        GUNLUK.info("[TAMAM] %d konfigürasyonun kit eşleştirmeleri geçerli (%d kit).", len(configs), len(KIT_KATALOGU))
+    except KonfigurasyonHatasi as e:
+        GUNLUK.error("KRİTİK HATA: Hastane konfigürasyonu geçersiz:\n%s", e)
+        hata_sayisi += 1
+
+    eksik = 0
+    for config in configs:
+        if not os.path.isfile(config["input_path"]):
+            GUNLUK.warning("UYARI: '%s' Excel'i bulunamadı: %s", config["output_prefix"], config["input_path"])
+            eksik += 1
+            continue
+        beklenen, bu_ay = get_dynamic_sheet_name(config["sheet_prefix"], config.get("override_month_name"))
+        try:
+            sayfa_adlari = sayfa_adlarini_oku(config["input_path"])
+        except (OSError, zipfile.BadZipFile, KeyError, ET.ParseError) as e:
+            GUNLUK.error("HATA: '%s' Excel'i açılamadı: %s", config["output_prefix"], e)
+            hata_sayisi += 1
+            continue
+        sayfa = sayfa_adini_coz(sayfa_adlari, config["sheet_prefix"], config.get("override_month_name") or bu_ay)
+        if sayfa is None:
+            GUNLUK.error("HATA: '%s' Excel'inde beklenen sayfa yok: '%s'. Dosyadaki sayfalar: %s",
+                         config["output_prefix"], beklenen, sayfa_adlari)
+            hata_sayisi += 1
+        elif sayfa != beklenen:
+            GUNLUK.info("(Bilgi) '%s': '%s' yerine '%s' sayfası kullanılacak.", config["output_prefix"], beklenen, sayfa)
+
+    GUNLUK.info("\n[DOĞRULAMA] %d konfigürasyon: %d hata, %d Excel bulunamadı.", len(configs), hata_sayisi, eksik)
+    return 1 if hata_sayisi else 0
+
+
+def kit_bilgisi_yazdir(aranan):
+    """
+    Aranan kitin (KitKatalogu.ara: anahtar, boy eki olmadan tüm boylar veya STOKKOD) katalog alanlarını,
+    aynı testin diğer boylarını ve kit_eslestirme'de bu kite yönlendiren hastaneleri yazdırır.
+    """
+    kitler = KIT_KATALOGU.ara(aranan)
+    if not kitler:
+        GUNLUK.error("KRİTİK HATA: Kit kataloğunda '%s' ile eşleşen kit yok.", aranan)
+        return 1
+
+    # Kit anahtarı -> [(hastane, Excel'deki test adı), ...]
+    yonlendirenler = {}
     for config in HASTANE_CONFIGS:
-        process_hospital_data(config)
+        try:
+            eslestirmeler = kit_eslestirmelerini_birlestir(config)
+        except KonfigurasyonHatasi:
+            continue  # Hatalı eşleştirmeler validate-config ile raporlanır
+        for test_adi, kit_anahtari in eslestirmeler.items():
+            yonlendirenler.setdefault(kit_anahtari, []).append((config["output_prefix"], test_adi))
+
+    cikti = []
+    for kit in kitler:
+        test_per_set = f"{kit.test_per_set:g}"
+        cikti += [f"\n[KİT] {kit.anahtar}",
+                  f"  STOKKOD      : {kit.stok_kodu}",
+                  f"  STOK ADI     : {kit.stok_adi}",
+                  f"  ID           : {kit.id_kodu}",
+                  f"  TEST / KUTU  : {kit.test_per_kutu}",
+                  f"  SET / KUTU   : {kit.set_per_kutu}",
+                  f"  TEST / SET   : {test_per_set}",
+                  f"  KDV / DEPO   : {kit.kdv_orani} / {kit.depo_kod}",
+                  f"  VADE TARİHİ  : {kit.vade_tarihi}"]
+        aile = KIT_KATALOGU.aile(kit.anahtar)
+        if aile:
+            cikti.append("  BOYLAR       : " + ", ".join(
+                f"{boy.anahtar} ({boy.test_per_set:g} TEST/SET)" for boy in aile))
+        ayni_stok_kodu = [diger.anahtar for diger in KIT_KATALOGU.stok_koduna_gore(kit.stok_kodu) if diger is not kit]
+        if ayni_stok_kodu:
+            cikti.append(f"  AYNI STOKKOD : {', '.join(ayni_stok_kodu)}")
+        hastaneler = yonlendirenler.get(kit.anahtar, [])
+        cikti.append(f"  EŞLEŞTİRME   : {len(hastaneler)} hastane" + ("" if hastaneler else
+                     " (yalnızca Excel'de test adı olarak birebir yazılırsa seçilir)"))
+        cikti += [f"    {onek:<42} '{test_adi}'" for onek, test_adi in hastaneler]
+    GUNLUK.info("\n".join(cikti).lstrip("\n"))
+    return 0
+
+
+def deneme_calistirmasi(aranan, ay=None, kit_optimizasyonu=False):
+    """
+    Aranan hastanenin (hastaneleri_bul) sipariş satırlarını normal çalıştırmadaki gibi hesaplar ve
+    tablo olarak yazdırır; XML, manifest, metrik ve talep geçmişi yazılmaz. ay verilirse
+    konfigürasyondaki ay yerine o ayın sayfası okunur.
+    Bütün hastaneler hesaplanabildiyse 0, aksi halde 1 döndürür.
+    """
+    configs = hastaneleri_bul(aranan)
+    if not configs:
+        GUNLUK.error("KRİTİK HATA: '%s' ile eşleşen hastane konfigürasyonu yok.", aranan)
+        return 1
+    try:
+        konfigurasyonlari_dogrula(configs)
+    except KonfigurasyonHatasi as e:
+        GUNLUK.error("KRİTİK HATA: Hastane konfigürasyonu geçersiz:\n%s", e)
+        return 1
+    if ay:
+        configs = aylara_genislet(configs, aylar=[ay])
+
+    CALISMA_AYARLARI["kit_optimizasyonu"] = kit_optimizasyonu
+    basarisiz = 0
+    for config in configs:
+        siparisler = []
+        process_hospital_data(config, siparis_kaydi=siparisler, yaz=False)
+        if not siparisler:
+            basarisiz += 1
+            continue
+
+        siparis = siparisler[0]
+        cikti = [f"\n[DENEME] {config['output_prefix']}{ay_etiketi(config)}: {len(siparis)} satır "
+                 f"(XML yazılmadı)",
+                 f"  {'TEST ADI':<32} {'KİT':<26} {'STOKKOD':<10} {'İHTİYAÇ':>9} {'SET':>7} {'TEST':>9}  OZELALAN1"]
+        for test_adi, anahtar, stok_kodu, ihtiyac, set_sayisi, test_miktari, ozelalan1 in zip(
+                siparis["test_adi"], siparis["stok_map_key"], siparis["stok_kodu"], siparis["ihtiyac"],
+                siparis["set_sayisi"], siparis["test_miktari"], siparis["ozelalan1"]):
+            cikti.append(f"  {test_adi[:32]:<32} {anahtar:<26} {stok_kodu:<10} {ihtiyac:>9} {set_sayisi:>7} "
+                         f"{test_miktari:>9}  {ozelalan1}")
+        cikti.append(f"  {'TOPLAM':<32} {'':<26} {'':<10} {int(siparis['ihtiyac'].sum()):>9} "
+                     f"{int(siparis['set_sayisi'].sum()):>7} {int(siparis['test_miktari'].sum()):>9}")
+        GUNLUK.info("\n".join(cikti))
+
+    if basarisiz:
+        GUNLUK.warning("\nUYARI: %d / %d konfigürasyon hesaplanamadı.", basarisiz, len(configs))
+    return 1 if basarisiz else 0
+
+
+def listeleme_argumanlari_oku(argv=None):
+    """list alt komutunun argümanlarını okur."""
+    parser = argparse.ArgumentParser(
+        prog=f"{os.path.basename(sys.argv[0])} list",
+        description="Hastane konfigürasyonlarını (önek, cari, ay, Excel'in bulunup bulunmadığı) listeler.")
+    parser.add_argument("hastane", nargs="?", metavar="HASTANE",
+                        help="Yalnızca bu output_prefix / cari_id'yi veya adında bu metin geçen hastaneleri listeler.")
+    return parser.parse_args(argv)
+
+
+def dogrulama_argumanlari_oku(argv=None):
+    """validate-config alt komutunun argümanlarını okur."""
+    parser = argparse.ArgumentParser(
+        prog=f"{os.path.basename(sys.argv[0])} validate-config",
+        description="Kit eşleştirmelerini ve bulunan Excel'lerde ayın sayfasını, hiçbir sayfa okunmadan denetler. "
+                    "Hata varsa 1 ile çıkar.")
+    parser.add_argument("hastane", nargs="?", metavar="HASTANE",
+                        help="Yalnızca bu output_prefix / cari_id'yi veya adında bu metin geçen hastaneleri denetler.")
+    return parser.parse_args(argv)
+
+
+def kit_argumanlari_oku(argv=None):
+    """show-kit alt komutunun argümanlarını okur."""
+    parser = argparse.ArgumentParser(
+        prog=f"{os.path.basename(sys.argv[0])} show-kit",
+        description="Kit kataloğundaki bir kitin alanlarını, diğer boylarını ve ona eşleştirilen hastaneleri gösterir.")
+    parser.add_argument("kit", metavar="KIT",
+                        help="Kit anahtarı (TSH_2000), boy eki olmadan tüm boylar (TSH) veya STOKKOD.")
+    return parser.parse_args(argv)
+
+
+def deneme_argumanlari_oku(argv=None):
+    """dry-run alt komutunun argümanlarını okur."""
+    parser = argparse.ArgumentParser(
+        prog=f"{os.path.basename(sys.argv[0])} dry-run",
+        description="Bir hastanenin sipariş satırlarını hesaplayıp gösterir; XML, manifest, metrik veya talep "
+                    "geçmişi yazmaz.")
+    parser.add_argument("hastane", metavar="CARI_ID",
+                        help="cari_id, output_prefix veya hastane adının bir parçası (ör. 'rize eğitim'). "
+                             "Cari birden fazla Excel'e sahipse hepsi hesaplanır.")
+    parser.add_argument("--month", "--ay", dest="ay", metavar="AY",
+                        help="Konfigürasyondaki ay yerine bu ayın sayfasını okur (ör. EKİM).")
+    parser.add_argument("--optimize-kits", "--kit-optimizasyonu", dest="kit_optimizasyonu", action="store_true",
+                        help="Satırları --optimize-kits ile hesaplar.")
+    parser.add_argument("--verbose", "-v", "--ayrintili", dest="ayrintili", action="store_true",
+                        help="Satır bazlı ayrıntıları da yazar.")
+    args = parser.parse_args(argv)
+
+    if args.ay:
+        ay = ay_adini_bul(args.ay)
+        if ay is None:
+            parser.error(f"--month: geçersiz ay adı: {args.ay}. Geçerli adlar: {', '.join(TURKISH_MONTHS.values())}")
+        args.ay = ay
+    return args
+
+
+# =========================================================================
+# 7. ANA ÇALIŞTIRMA BLOĞU
+# =========================================================================
+
+def calistir_komutu(argv=None):
+    """Varsayılan komut (run): hastaneleri işler ve XML'leri yeni bir çalıştırma klasörüne yazar."""
+    args = argumanlari_oku(argv)
+    CALISMA_AYARLARI["xml_kacis"] = args.xml_kacis
+    CALISMA_AYARLARI["deterministik"] = args.deterministik
+    CALISMA_AYARLARI["kit_optimizasyonu"] = args.kit_optimizasyonu
+    CALISMA_AYARLARI["onbellek"] = not args.onbellek_yok
+    CALISMA_AYARLARI["onbellek_mb"] = args.onbellek_mb
+    CALISMA_AYARLARI["gunluk_seviyesi"] = (logging.WARNING if args.sessiz else
+                                          logging.DEBUG if args.ayrintili else logging.INFO)
+    CALISMA_AYARLARI["gunluk_dosyasi"] = args.gunluk_dosyasi
+    gunlugu_ayarla()
+
+    # Kit eşleştirmeleri hiçbir Excel okunmadan önce doğrulanır
+    try:
+        konfigurasyonlari_dogrula(HASTANE_CONFIGS)
+    except KonfigurasyonHatasi as e:
+        GUNLUK.error("KRİTİK HATA: Hastane konfigürasyonu geçersiz:\n%s", e)
+        return 1
+
+    # Çok makineli çalışmada yalnızca bu parçaya düşen hastaneler (aylara genişletmeden önce) alınır
+    temel_configs = HASTANE_CONFIGS
+    if args.parca:
+        parca, parca_sayisi = args.parca
+        atama = parcalara_bol(HASTANE_CONFIGS, parca_sayisi, dengeli=args.parca_dengeli)
+        temel_configs = [config for config in HASTANE_CONFIGS if atama[config["output_prefix"]] == parca]
+        GUNLUK.info("\n[PARÇA] %d/%d: %d / %d konfigürasyon bu makinede işlenecek: %s", parca, parca_sayisi,
+                    len(temel_configs), len(HASTANE_CONFIGS),
+                    ", ".join(config["output_prefix"] for config in temel_configs) or "-")
+
+    configs = temel_configs
+    if args.aylar or args.tum_aylar:
+        configs = aylara_genislet(temel_configs, aylar=args.aylar, tum_aylar=args.tum_aylar)
+
+    # Fark modunda çıktı klasörü, manifest ve metrikler oluşturulmaz
+    if args.fark:
+        if not os.path.isdir(args.fark):
+            GUNLUK.error("KRİTİK HATA: Karşılaştırılacak klasör bulunamadı: %s", args.fark)
+            return 1
+        fark_raporu(configs, args.fark)
+        return 0
+
+    manifest = manifest_oku()
+
+    # İzleme modunda süreç açık kalır; aylar her değişiklikte Excel'in güncel sayfa listesinden genişletilir
+    if args.izle:
+        izle(temel_configs, args, manifest)
+        return 0
+
+    yeni_calisma_klasoru()
+    sonuclar = calistirma_yap(configs, args, manifest)
+    if sonuclar is None:
+        return 1
+
+    if args.parca:
+        try:
+            GUNLUK.info("[INFO] Parça manifesti yazıldı: %s", parca_manifestini_yaz(
+                parca, parca_sayisi, args.parca_dengeli, HASTANE_CONFIGS, configs, sonuclar))
+        except OSError as e:
+            GUNLUK.warning("UYARI: Parça manifesti kaydedilemedi: %s", e)
+        try:
+            yol = parca_siparisini_yaz(configs, sonuclar)
+            if yol:
+                GUNLUK.info("[INFO] Parça sipariş satırları yazıldı: %s", yol)
+        except OSError as e:
+            GUNLUK.warning("UYARI: Parça sipariş satırları kaydedilemedi (merge konsolide özeti eksik "
+                           "kalır): %s", e)
+    return 0
+
+
+def birlestir_komutu(argv=None):
+    """merge: parça çalıştırma klasörlerini birleştirir."""
+    args = birlestirme_argumanlari_oku(argv)
+    return parcalari_birlestir(args.klasorler, paket=args.paket, paket_sikistir=args.paket_sikistir,
+                               konsolide=args.konsolide, konsolide_xml=args.konsolide_xml)
+
+
+def gecmis_komutu(argv=None):
+    """history: talep geçmişi raporu."""
+    args = gecmis_argumanlari_oku(argv)
+    return gecmis_raporu(args.rapor, args.cari, args.stok, args.son, args.db)
+
+
+def listele_komutu(argv=None):
+    """list: hastane konfigürasyonları."""
+    return konfigurasyonlari_listele(listeleme_argumanlari_oku(argv).hastane)
+
+
+def dogrula_komutu(argv=None):
+    """validate-config: konfigürasyon ve sayfa adı denetimi."""
+    aranan = dogrulama_argumanlari_oku(argv).hastane
+    configs = HASTANE_CONFIGS if aranan is None else hastaneleri_bul(aranan)
+    if not configs:
+        GUNLUK.error("KRİTİK HATA: '%s' ile eşleşen hastane konfigürasyonu yok.", aranan)
+        return 1
+    return konfigurasyonu_denetle(configs)
+
+
+def kit_goster_komutu(argv=None):
+    """show-kit: kit kataloğu kaydı."""
+    return kit_bilgisi_yazdir(kit_argumanlari_oku(argv).kit)
+
+
+def deneme_komutu(argv=None):
+    """dry-run: tek hastanenin sipariş satırları, dosya yazmadan."""
+    args = deneme_argumanlari_oku(argv)
+    if args.ayrintili:
+        GUNLUK.setLevel(logging.DEBUG)
+    return deneme_calistirmasi(args.hastane, ay=args.ay, kit_optimizasyonu=args.kit_optimizasyonu)
+
+
+# Alt komut adı (İngilizce ve Türkçe) -> komut fonksiyonu. İlk argüman bunlardan biri değilse
+# (python xml_olusturucu.py --workers 4 gibi) varsayılan komut run'dır.
+ALT_KOMUTLAR = {
+    "run": calistir_komutu, "calistir": calistir_komutu,
+    "list": listele_komutu, "listele": listele_komutu,
+    "validate-config": dogrula_komutu, "dogrula": dogrula_komutu,
+    "show-kit": kit_goster_komutu, "kit-goster": kit_goster_komutu,
+    "dry-run": deneme_komutu, "deneme": deneme_komutu,
+    "merge": birlestir_komutu, "birlestir": birlestir_komutu,
+    "history": gecmis_komutu, "gecmis": gecmis_komutu,
+}
+
 
-    print(f"\n[BİTİŞ] Tüm işlemler tamamlandı. Çıktılar: {TUM_CIKTILAR_YOLU}")
\ No newline at end of file
+def ana(argv=None):
+    """Komut satırı giriş noktası; alt komutu seçer ve çıkış kodunu döndürür."""
+    argv = sys.argv[1:] if argv is None else argv
+    # Alt komutlar konsola doğrudan yazar; run, ayarlarını okuduktan sonra kuyruklu günlüğe geçer
+    gunlugu_ayarla(dogrudan=True)
+    if argv and argv[0] in ALT_KOMUTLAR:
+        return ALT_KOMUTLAR[argv[0]](argv[1:])
+    return calistir_komutu(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(ana())
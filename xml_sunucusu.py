@@ -0,0 +1,361 @@
+import argparse
+import contextlib
+import datetime
+import http.server
+import io
+import json
+import sys
+import threading
+import traceback
+import xml.etree.ElementTree as ET
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, quote, urlsplit
+
+import xml_olusturucu as xo
+
+# =========================================================================
+# YEREL HTTP SERVİSİ: SAYIM EXCEL'İNDEN İSTEK ÜZERİNE DEPO XML'İ
+# =========================================================================
+# Tek bir sayım Excel'i yükleyip depo programı XML'ini geri almak için küçük bir HTTP servisi.
+# Süreç bir kez başlar; pandas, STOK_MAP kataloğu ve hastanelerin kit tabloları bellekte kalır ve
+# istekler sabit boyutlu bir iş parçacığı havuzunda işlenir. Diske hiçbir fiş yazılmaz.
+#
+# Uç noktalar:
+#   GET  /saglik                          -> servis durumu
+#   GET  /hastaneler                      -> HASTANE_CONFIGS özeti (config adı = output_prefix)
+#   POST /fis?config=ONEK|cari_id=ID      -> gövde boşsa konfigürasyondaki Excel, doluysa gövdedeki
+#        [&ay=EKİM][&bicim=xml|json]         .xlsx işlenir; XML (varsayılan) veya JSON satırlar döner
+#
+# Örnek:
+#   python xml_sunucusu.py --port 8765 --isci 4
+#   curl -X POST "http://127.0.0.1:8765/fis?cari_id=POSOF&ay=EKİM" --data-binary @posof.xlsx -o posof.xml
+#   curl -X POST "http://127.0.0.1:8765/fis?config=ardahanEliza_islenmis_veri&bicim=json"
+
+# İstek başına izin verilen en büyük Excel boyutu (MB)
+EN_BUYUK_GOVDE_MB = 50
+
+
+class IstekHatasi(Exception):
+    """İstemciye HTTP hata kodu ve açıklamayla döndürülecek hata."""
+
+    def __init__(self, kod, mesaj, log=""):
+        super().__init__(mesaj)
+        self.kod = kod
+        self.log = log
+
+
+class IsParcacigiCiktisi(io.TextIOBase):
+    """
+    sys.stdout yerine geçer: yakala() içindeki iş parçacığının print ve xo.GUNLUK çıktıları kendi tamponuna,
+    diğer tüm çıktılar asıl stdout'a gider. contextlib.redirect_stdout süreç genelinde olduğu için
+    eşzamanlı isteklerin günlükleri bu şekilde birbirinden ayrılır.
+    """
+
+    def __init__(self, asil):
+        self.asil = asil
+        self.yerel = threading.local()
+
+    def write(self, metin):
+        tampon = getattr(self.yerel, "tampon", None)
+        return (tampon if tampon is not None else self.asil).write(metin)
+
+    def flush(self):
+        self.asil.flush()
+
+    @contextlib.contextmanager
+    def yakala(self):
+        self.yerel.tampon = io.StringIO()
+        try:
+            yield self.yerel.tampon
+        finally:
+            self.yerel.tampon = None
+
+
+def konfigurasyon_bul(config_adi=None, cari_id=None):
+    """
+    İstekteki config (output_prefix) veya cari_id ile HASTANE_CONFIGS'ten konfigürasyonu bulur.
+    cari_id birden fazla hastanede geçiyorsa (ör. ARDAHAN) config adı istenir.
+    """
+    if config_adi:
+        adaylar = [c for c in xo.HASTANE_CONFIGS if c["output_prefix"] == config_adi]
+        if not adaylar:
+            raise IstekHatasi(404, f"Konfigürasyon bulunamadı: '{config_adi}'. Bkz. GET /hastaneler")
+        if cari_id and xo.turkce_normalize(cari_id) != xo.turkce_normalize(adaylar[0]["cari_id"]):
+            raise IstekHatasi(400, f"'{config_adi}' konfigürasyonunun cari_id'si '{adaylar[0]['cari_id']}', "
+                                   f"istekteki '{cari_id}' değil.")
+        return adaylar[0]
+
+    if not cari_id:
+        raise IstekHatasi(400, "config veya cari_id parametresi gerekli.")
+    adaylar = [c for c in xo.HASTANE_CONFIGS if xo.turkce_normalize(c["cari_id"]) == xo.turkce_normalize(cari_id)]
+    if not adaylar:
+        raise IstekHatasi(404, f"'{cari_id}' cari_id'li konfigürasyon yok. Bkz. GET /hastaneler")
+    if len(adaylar) > 1:
+        secenekler = ", ".join(c["output_prefix"] for c in adaylar)
+        raise IstekHatasi(400, f"'{cari_id}' birden fazla hastanede kullanılıyor; config parametresiyle "
+                               f"birini seçin: {secenekler}")
+    return adaylar[0]
+
+
+def yuklenen_exceli_hesapla(config, icerik, metrik):
+    """
+    Gövdede gelen Excel'i (bayt) diske yazmadan işler: sayfa adını workbook.xml'den çözer, yalnızca
+    TEST ADI ve ihtiyaç sütunlarını okur ve sipariş satırlarını hesaplar. Yüklenen dosyalar
+    önbelleğe alınmaz (her yükleme farklı bir dosyadır).
+    """
+    try:
+        sayfa_adlari = xo.sayfa_adlarini_ayikla(io.BytesIO(icerik))
+    except (zipfile.BadZipFile, KeyError, ET.ParseError) as e:
+        raise IstekHatasi(422, f"Gövde geçerli bir .xlsx dosyası değil: {e}")
+
+    beklenen, bu_ay = xo.get_dynamic_sheet_name(config["sheet_prefix"], config.get("override_month_name"))
+    sayfa = xo.sayfa_adini_coz(sayfa_adlari, config["sheet_prefix"], config.get("override_month_name") or bu_ay)
+    if sayfa is None:
+        raise IstekHatasi(422, f"Excel dosyasında beklenen sayfa adı bulunamadı. Beklenen ad: '{beklenen}'. "
+                               f"Dosyadaki sayfalar: {sayfa_adlari}")
+    metrik["sayfa"] = sayfa
+
+    try:
+        with xo.faz_suresi(metrik, "okuma"):
+            satirlar = list(xo.excel_satirlarini_oku(io.BytesIO(icerik), sayfa, config["ihtiyac_sutunu"]))
+    except ValueError as e:
+        raise IstekHatasi(422, f"Excel dosyası okunurken bir hata oluştu: {e}")
+
+    with xo.faz_suresi(metrik, "hesaplama"):
+        return xo.siparis_satirlarini_hesapla(satirlar, xo.hastane_kit_tablosu(config),
+                                              config["apply_min_roundup"], sayaclar=metrik,
+                                              kit_optimizasyonu=xo.CALISMA_AYARLARI["kit_optimizasyonu"])
+
+
+def fis_olustur(config, icerik, bicim, cikti):
+    """
+    Bir POST /fis isteğini işler ve (HTTP kodu, içerik türü, gövde, ek başlıklar) döndürür.
+    icerik boşsa konfigürasyondaki Excel process_hospital_data ile (önbellek dahil) işlenir.
+    cikti, isteğin yakalanan print çıktısıdır (JSON cevapta ve hatalarda "log" olarak döner).
+    """
+    metrik = xo.yeni_metrik(config)
+    with xo.faz_suresi(metrik, "toplam"):
+        if icerik:
+            siparis = yuklenen_exceli_hesapla(config, icerik, metrik)
+        else:
+            siparisler = []
+            xo.process_hospital_data(config, metrik, siparis_kaydi=siparisler, yaz=False)
+            if not siparisler:
+                raise IstekHatasi(422, f"'{config['CARI_ADI']}' işlenemedi.", cikti.getvalue())
+            siparis = siparisler[0]
+        lines = xo.xml_satirlarina_cevir(siparis)
+
+    cari_id, cari_adi = config["cari_id"], config["CARI_ADI"]
+    if not lines:
+        raise IstekHatasi(422, f"'{cari_adi}' için XML oluşturulmadı. Eklenecek satır bulunamadı.", cikti.getvalue())
+
+    kacis = xo.CALISMA_AYARLARI["xml_kacis"]
+    fisno = saat = None
+    if xo.CALISMA_AYARLARI["deterministik"]:
+        metrik["icerik_ozeti"], fisno = xo.fis_kimligi(cari_id, cari_adi, lines, kacis)
+        metrik["fisno"], saat = fisno, xo.DETERMINISTIK_SAAT
+
+    if bicim == "json":
+        govde = {
+            "cari_id": cari_id,
+            "cari_adi": cari_adi,
+            "config": config["output_prefix"],
+            "sayfa": metrik["sayfa"],
+            "satirlar": [dict(zip(xo.XML_SATIR_ALANLARI, satir)) for satir in lines],
+            "metrik": {alan: metrik[alan] for alan in ("taranan_satir", "eslesen_satir", "uretilen_satir",
+                                                       "atlanan", "eslesmeyen_satirlar", "kit_optimizasyonu",
+                                                       "sureler_s", "fisno")},
+            "log": cikti.getvalue(),
+        }
+        return 200, "application/json; charset=utf-8", json.dumps(govde, ensure_ascii=False, default=str).encode("utf-8"), {}
+
+    xml = xo.generate_xml_content(lines, cari_id, cari_adi, kacis=kacis, fisno=fisno, saat=saat)
+    ay_eki = f"_{config['override_month_name']}" if config.get("override_month_name") else ""
+    dosya_adi = f"{config['output_prefix']}{ay_eki}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.xml"
+    basliklar = {"Content-Disposition": f"attachment; filename*=UTF-8''{quote(dosya_adi)}",
+                 "X-Uretilen-Satir": str(len(lines))}
+    return 200, "application/xml; charset=utf-8", xml.encode("utf-8"), basliklar
+
+
+class FisIstekIsleyici(http.server.BaseHTTPRequestHandler):
+    """GET /saglik, GET /hastaneler ve POST /fis isteklerini karşılar."""
+
+    server_version = "LostXmlSunucusu/1.0"
+
+    def _cevap(self, kod, icerik_turu, govde, basliklar=None):
+        self.send_response(kod)
+        self.send_header("Content-Type", icerik_turu)
+        self.send_header("Content-Length", str(len(govde)))
+        for ad, deger in (basliklar or {}).items():
+            self.send_header(ad, deger)
+        self.end_headers()
+        self.wfile.write(govde)
+
+    def _json(self, kod, veri):
+        self._cevap(kod, "application/json; charset=utf-8", json.dumps(veri, ensure_ascii=False).encode("utf-8"))
+
+    def log_message(self, format, *args):
+        print(f"[SUNUCU] {self.address_string()} {format % args}")
+
+    def do_GET(self):
+        yol = urlsplit(self.path).path
+        if yol == "/saglik":
+            self._json(200, {"durum": "hazir", "isci": self.server.isci_sayisi,
+                             "hastane": len(xo.HASTANE_CONFIGS), "stok_map": len(xo.STOK_MAP)})
+        elif yol == "/hastaneler":
+            self._json(200, [{"config": c["output_prefix"], "cari_id": c["cari_id"], "cari_adi": c["CARI_ADI"],
+                              "sheet_prefix": c["sheet_prefix"], "ay": c.get("override_month_name"),
+                              "ihtiyac_sutunu": c["ihtiyac_sutunu"]} for c in xo.HASTANE_CONFIGS])
+        else:
+            self._json(404, {"hata": f"Bilinmeyen adres: {yol}"})
+
+    def do_POST(self):
+        adres = urlsplit(self.path)
+        if adres.path != "/fis":
+            self._json(404, {"hata": f"Bilinmeyen adres: {adres.path}"})
+            return
+
+        try:
+            uzunluk = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            uzunluk = -1
+        if uzunluk < 0 or uzunluk > EN_BUYUK_GOVDE_MB * 1024 * 1024:
+            # Gövde okunmadığı için bağlantı kapatılır
+            self.close_connection = True
+            self._json(413, {"hata": f"Gövde en fazla {EN_BUYUK_GOVDE_MB} MB olabilir."})
+            return
+        icerik = self.rfile.read(uzunluk) if uzunluk else b""
+
+        parametreler = {ad: degerler[-1] for ad, degerler in parse_qs(adres.query).items()}
+        bicim = parametreler.get("bicim", "xml")
+
+        # İsteğin print çıktısı yakalanır; cevap gönderilirken (erişim günlüğü) yakalama kapalıdır
+        with self.server.cikti.yakala() as cikti:
+            try:
+                if bicim not in ("xml", "json"):
+                    raise IstekHatasi(400, f"Geçersiz bicim: '{bicim}' (xml veya json).")
+                config = konfigurasyon_bul(parametreler.get("config"), parametreler.get("cari_id"))
+                if parametreler.get("ay"):
+                    ay = xo.ay_adini_bul(parametreler["ay"])
+                    if ay is None:
+                        raise IstekHatasi(400, f"Geçersiz ay adı: '{parametreler['ay']}'.")
+                    config = dict(config, override_month_name=ay)
+                cevap = fis_olustur(config, icerik, bicim, cikti)
+            except IstekHatasi as e:
+                cevap = e
+            except Exception as e:
+                print(traceback.format_exc())
+                cevap = IstekHatasi(500, f"Beklenmeyen hata: {e}", cikti.getvalue())
+
+        if isinstance(cevap, IstekHatasi):
+            self._json(cevap.kod, {"hata": str(cevap), "log": cevap.log})
+        else:
+            self._cevap(*cevap)
+
+
+class FisSunucusu(http.server.HTTPServer):
+    """
+    İstekleri, her bağlantı için yeni iş parçacığı açmak yerine isci_sayisi iş parçacıklı bir havuzda
+    işleyen HTTP sunucusu. Havuzda çalışan ve sırada bekleyen istek sayısı isci_sayisi + kuyruk ile
+    sınırlıdır; fazlası hemen 503 ile geri çevrilir.
+    İsteklerin çıktısını ayırmak için sys.stdout, sunucu kurulurken IsParcacigiCiktisi ile sarılır
+    (zaten sarılıysa o kullanılır) ve server_close'da eski haline döner; sunucu main() dışında,
+    başka bir araçtan kurulduğunda da istekler çıktılarını yakalar. xo.GUNLUK henüz yapılandırılmamışsa
+    doğrudan o anki sys.stdout'a yazacak şekilde ayarlanır; böylece fiş günlükleri de yakalanır.
+    """
+
+    def __init__(self, adres, isci_sayisi=4, kuyruk=16):
+        super().__init__(adres, FisIstekIsleyici)
+        if not isinstance(sys.stdout, IsParcacigiCiktisi):
+            sys.stdout = IsParcacigiCiktisi(sys.stdout)
+        self.cikti = sys.stdout
+        if not xo.GUNLUK.handlers:
+            xo.gunlugu_ayarla(dogrudan=True)
+        self.isci_sayisi = isci_sayisi
+        self.havuz = ThreadPoolExecutor(max_workers=isci_sayisi, thread_name_prefix="fis_iscisi")
+        self.yerler = threading.BoundedSemaphore(isci_sayisi + kuyruk)
+
+    def process_request(self, request, client_address):
+        if not self.yerler.acquire(blocking=False):
+            govde = json.dumps({"hata": "Sunucu meşgul, lütfen tekrar deneyin."}, ensure_ascii=False).encode("utf-8")
+            try:
+                request.sendall(b"HTTP/1.0 503 Service Unavailable\r\nRetry-After: 1\r\n"
+                                b"Content-Type: application/json; charset=utf-8\r\n"
+                                + f"Content-Length: {len(govde)}\r\n\r\n".encode("ascii") + govde)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        self.havuz.submit(self._istegi_isle, request, client_address)
+
+    def _istegi_isle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.yerler.release()
+
+    def server_close(self):
+        super().server_close()
+        self.havuz.shutdown(wait=True)
+        if sys.stdout is self.cikti:
+            sys.stdout = self.cikti.asil
+
+
+def argumanlari_oku(argv=None):
+    parser = argparse.ArgumentParser(description="Sayım Excel'inden istek üzerine depo XML'i üreten yerel HTTP servisi.")
+    parser.add_argument("--host", default="127.0.0.1", help="Dinlenecek adres. Varsayılan: 127.0.0.1 (yalnızca bu makine).")
+    parser.add_argument("--port", type=int, default=8765, help="Dinlenecek port. Varsayılan: 8765.")
+    parser.add_argument("--isci", type=int, default=4, metavar="N", help="Aynı anda işlenecek istek sayısı.")
+    parser.add_argument("--kuyruk", type=int, default=16, metavar="N",
+                        help="İşçiler doluyken sırada bekleyebilecek istek sayısı; fazlası 503 alır.")
+    parser.add_argument("--xml-kacis", action="store_true",
+                        help="STOKADI, CARIADI gibi metin alanlarını XML kaçışından geçirir (& -> &amp;).")
+    parser.add_argument("--deterministik", action="store_true",
+                        help="FISNO'yu hastane ve satır içeriğinden türetir, FISSAAT/SEVKSAAT'i sabitler.")
+    parser.add_argument("--optimize-kits", "--kit-optimizasyonu", dest="kit_optimizasyonu", action="store_true",
+                        help="Birden fazla boyu olan kitlerde en az fazla testli boy karışımını sipariş eder.")
+    parser.add_argument("--onbellek-yok", action="store_true",
+                        help="Konfigürasyondaki Excel'ler için önbelleği kullanmaz.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = argumanlari_oku(argv)
+    xo.CALISMA_AYARLARI["xml_kacis"] = args.xml_kacis
+    xo.CALISMA_AYARLARI["deterministik"] = args.deterministik
+    xo.CALISMA_AYARLARI["kit_optimizasyonu"] = args.kit_optimizasyonu
+    xo.CALISMA_AYARLARI["onbellek"] = not args.onbellek_yok
+
+    try:
+        xo.konfigurasyonlari_dogrula(xo.HASTANE_CONFIGS)
+    except xo.KonfigurasyonHatasi as e:
+        print(f"KRİTİK HATA: Hastane konfigürasyonu geçersiz:\n{e}")
+        return 1
+    # Kit tabloları ve pandas/numpy/openpyxl ilk isteği beklemeden, iş parçacıkları başlamadan yüklenir
+    xo.agir_modulleri_yukle()
+    for config in xo.HASTANE_CONFIGS:
+        xo.hastane_kit_tablosu(config)
+
+    try:
+        sunucu = FisSunucusu((args.host, args.port), isci_sayisi=args.isci, kuyruk=args.kuyruk)
+    except OSError as e:
+        print(f"KRİTİK HATA: {args.host}:{args.port} dinlenemedi: {e}")
+        return 1
+
+    print(f"[SUNUCU] http://{args.host}:{sunucu.server_port} dinleniyor ({args.isci} işçi). Durdurmak için Ctrl+C.")
+    try:
+        sunucu.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sunucu.server_close()
+    print("[BİTİŞ] Sunucu durduruldu.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())